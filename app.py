@@ -1,52 +1,82 @@
 import streamlit as st
-import openpyxl
-import io
-import pandas as pd
-import csv
-from openpyxl.utils.dataframe import dataframe_to_rows
+import time
 from datetime import date
 
-import daily_single_1
-import run_dailyCopy_2 
+import source_loader
+import backfill
+import template_cache
+import result_cache
+import metrics as metrics_mod
+import output_writer
+import pipeline
+import jobs
+import batch
 
 # -----------------
 # 輔助函式
 # -----------------
 def load_file(uploaded_file):
-    if uploaded_file.name.lower().endswith('.csv'):
-        bytes_data = uploaded_file.getvalue()
-        text_data = None
-        
-        try:
-            text_data = bytes_data.decode('utf-8')
-        except UnicodeDecodeError:
-            pass
-            
-        if text_data is None:
-            try:
-                text_data = bytes_data.decode('big5')
-            except UnicodeDecodeError:
-                pass
-                
-        if text_data is None:
-            try:
-                text_data = bytes_data.decode('cp950')
-            except UnicodeDecodeError:
-                text_data = bytes_data.decode('utf-8', errors='ignore')
+    """載入來源檔：xlsx 以唯讀模式開啟，CSV 串流讀入精簡的值表格"""
+    return source_loader.load_source(uploaded_file, uploaded_file.name)
 
-        f_io = io.StringIO(text_data)
-        reader = csv.reader(f_io)
-        
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        
-        for row in reader:
-            ws.append(row)
-            
-        return wb
-        
-    else:
-        return openpyxl.load_workbook(uploaded_file, data_only=True)
+@st.cache_resource
+def get_template_cache():
+    """跨 rerun / session 共用的模板快取"""
+    return template_cache.TemplateCache()
+
+def load_template(file_tpl, selective=False):
+    """
+    從快取取得模板的工作副本，回傳 (活頁簿, 快取統計文字)
+    selective=True 時只解析流程會用到的工作表 (搭配 XML 局部修補輸出)
+    """
+    return pipeline.load_template(file_tpl.getvalue(), selective=selective, cache=get_template_cache())
+
+@st.cache_resource
+def get_result_cache():
+    """跨 rerun / session 共用的結果快取 (輸入完全相同時直接回傳先前的結果)"""
+    return result_cache.ResultCache()
+
+# 輸出方式 (顯示名稱 → pipeline 的輸出引擎)
+OUTPUT_ENGINES = {
+    "openpyxl 完整存檔": pipeline.ENGINE_OPENPYXL,
+    "XML 局部修補": pipeline.ENGINE_PATCH,
+}
+
+# 壓縮等級 (顯示名稱 → output_writer 的預設名稱)
+COMPRESSION_LEVELS = {
+    "平衡 (預設)": "balanced",
+    "最快 (檔案較大)": "fast",
+    "最小 (存檔較慢)": "smallest",
+}
+
+def save_output(wb_dst, file_tpl, dirty, engine, compression=output_writer.DEFAULT_COMPRESSION):
+    """輸出結果檔並釋放活頁簿，回傳 (結果檔物件 (大檔案在暫存檔), 紀錄列表)"""
+    return pipeline.save_output(wb_dst, file_tpl.getvalue(), dirty, engine, cache=get_template_cache(),
+                                compression=compression, release=True)
+
+@st.cache_resource
+def get_job_manager():
+    """跨 session 共用的背景工作佇列"""
+    return jobs.JobManager()
+
+# 效能量測紀錄 (每次執行附加一行 JSON)
+METRICS_LOG_PATH = "metrics.jsonl"
+
+def new_metrics(enabled):
+    """開啟時回傳 Metrics，關閉時回傳不做任何事的 NULL_METRICS"""
+    return metrics_mod.Metrics() if enabled else metrics_mod.NULL_METRICS
+
+def show_metrics(metrics, **extra):
+    """在執行紀錄中顯示量測表格，並寫入 JSON lines"""
+    if not metrics.enabled:
+        return
+    st.write("⏱️ 各階段量測")
+    st.dataframe(metrics.summary(), hide_index=True)
+    st.dataframe([{"項目": k, "儲存格數": v} for k, v in metrics.counts.items()], hide_index=True)
+    try:
+        metrics.write_jsonl(METRICS_LOG_PATH, **extra)
+    except OSError as e:
+        st.warning(f"無法寫入量測紀錄: {e}")
 
 # -----------------
 # 主介面
@@ -55,6 +85,14 @@ def main():
     st.set_page_config(page_title="Excel 整合系統", layout="wide")
     st.title("📂 模組化 Excel 整合系統")
 
+    mode = st.radio("執行模式", ["單日", "多日補跑", "多分區批次"], horizontal=True)
+    if mode == "多日補跑":
+        backfill_page()
+        return
+    if mode == "多分區批次":
+        batch_page()
+        return
+
     # 介面配置
     col1, col2 = st.columns(2)
     
@@ -69,6 +107,16 @@ def main():
     # 🔑 新增：讓使用者選擇日期
     st.subheader("3. 設定")
     target_date = st.date_input("請選擇統計日期", value=date.today())
+    engine = OUTPUT_ENGINES[st.selectbox("輸出方式", list(OUTPUT_ENGINES))]
+    compression = COMPRESSION_LEVELS[st.selectbox("壓縮等級", list(COMPRESSION_LEVELS))]
+    background = st.checkbox("🧵 背景執行 (不佔用畫面，可查看進度)", value=True)
+    measure = st.checkbox("⏱️ 記錄各階段時間與記憶體 (僅限前景執行)", value=False)
+
+    if st.button("🔍 試算 (只列出將變動的儲存格，不輸出)"):
+        if not file_step1 or not file_tpl:
+            st.error("請上傳必要檔案！")
+            return
+        show_plan(file_step1, file_tpl, target_date)
 
     if st.button("🚀 執行 Step 1 & 2"):
         if not file_step1 or not file_tpl:
@@ -79,40 +127,260 @@ def main():
         
         with st.spinner("處理中..."):
             try:
-                wb_src_step1 = load_file(file_step1)
-                wb_dst = openpyxl.load_workbook(file_tpl)
-                
-                logs = []
-
-                # --- 執行 Step 1 ---
-                ok1, msg1 = daily_single_1.run_step(wb_src_step1, wb_dst)
-                logs.append(msg1)
-                
-                # --- 執行 Step 2 ---
-                # 🔑 傳入 target_date 解決無法讀取公式日期的問題
-                if ok1:
-                    ok2, msg2 = run_dailyCopy_2.run_step(wb_dst, wb_dst, target_date=target_date)
-                    
-                    if isinstance(msg2, list):
-                        logs.extend(msg2)
-                    else:
-                        logs.append(str(msg2))
-                
+                # 來源、模板、日期與對應表版本都相同時，直接回傳先前的結果
+                results = get_result_cache()
+                key = result_cache.result_key(file_step1.getvalue(), file_step1.name,
+                                              file_tpl.getvalue(), target_date, engine, compression)
+                cached = results.get(key)
+                if cached is not None:
+                    data, logs = cached
+                    with log_expander:
+                        st.write(f"{results.stats_line()} (本次命中，直接使用先前結果)")
+                        for l in logs:
+                            st.write(l)
+
+                    st.success("執行完成！")
+                    st.download_button("📥 下載整合結果", data=data, file_name=f"Result_{target_date}.xlsx")
+                    return
+
+                if background and not measure:
+                    job_id = get_job_manager().submit(file_step1.getvalue(), file_step1.name,
+                                                      file_tpl.getvalue(), target_date, engine,
+                                                      label=f"{file_step1.name} / {target_date}",
+                                                      compression=compression)
+                    st.session_state.setdefault("jobs", []).append((job_id, key, str(target_date)))
+                    st.info(f"已送出背景工作 {job_id}")
+                else:
+                    metrics = new_metrics(measure)
+                    ok, data, logs = pipeline.run_daily(file_step1.getvalue(), file_step1.name,
+                                                        file_tpl.getvalue(), target_date, engine=engine,
+                                                        cache=get_template_cache(), metrics=metrics,
+                                                        compression=compression)
+
+                    with log_expander:
+                        for l in logs:
+                            st.write(l)
+                        show_metrics(metrics, mode="single", target_date=target_date, engine=engine)
+
+                    results.put(key, data, logs)
+
+                    st.success("執行完成！")
+                    st.download_button("📥 下載整合結果", data=data, file_name=f"Result_{target_date}.xlsx")
+
+            except jobs.JobRejected as e:
+                st.warning(f"系統忙碌中：{e}")
+            except Exception as e:
+                st.error(f"發生錯誤: {e}")
+                import traceback
+                st.text(traceback.format_exc())
+
+    show_jobs()
+
+def show_plan(file_src, file_tpl, target_date):
+    """試算 Step 1 & 2：顯示各工作表 / 任務的變動格數與逐格差異表"""
+    with st.spinner("試算中..."):
+        try:
+            ok, plan, logs = pipeline.plan_daily(file_src.getvalue(), file_src.name, file_tpl.getvalue(),
+                                                 target_date, cache=get_template_cache())
+        except Exception as e:
+            st.error(f"發生錯誤: {e}")
+            return
+
+    with st.expander("試算紀錄", expanded=not ok):
+        for l in logs:
+            st.write(l)
+    st.write(plan.summary_line())
+    st.dataframe(plan.summary(), hide_index=True)
+    table = plan.table()
+    if table:
+        if len(table) < plan.change_count() + plan.skip_count():
+            st.caption(f"只顯示前 {len(table)} 格")
+        st.dataframe(table, hide_index=True)
+
+def show_jobs():
+    """顯示本 session 送出的背景工作進度；仍有工作在執行時定期重新整理"""
+    session_jobs = st.session_state.get("jobs", [])
+    if not session_jobs:
+        return
+
+    manager = get_job_manager()
+    results = get_result_cache()
+    st.subheader("背景工作")
+    running = False
+
+    for job_id, key, target_date in session_jobs:
+        status = manager.status(job_id)
+        st.write(f"**{job_id}** {status['label']}")
+
+        if status["state"] in ("queued", "running"):
+            running = True
+            stage = "排隊中" if status["state"] == "queued" else f"執行中：{status['stage']}"
+            st.progress(status["progress"], text=stage)
+            continue
+
+        result = manager.result(job_id)
+        if result is None:
+            st.write("⚠️ 找不到此工作 (可能已過期)")
+            continue
+
+        ok, data, logs = result
+        with st.expander("執行紀錄", expanded=False):
+            for l in logs:
+                st.write(l)
+        if data is None:
+            st.error("執行失敗，請查看執行紀錄")
+            continue
+
+        results.put(key, data, logs)
+        st.download_button("📥 下載整合結果", data=data, file_name=f"Result_{target_date}.xlsx",
+                           key=f"dl_{job_id}")
+
+    if running:
+        time.sleep(1)
+        st.rerun()
+
+def backfill_page():
+    """多日補跑：一次上傳多個來源檔並各自指定日期，模板只載入與存檔一次"""
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.subheader("1. 來源檔案 (多個)")
+        files_src = st.file_uploader("mailmodamount (Step 1)", type=["xlsx", "csv"],
+                                     accept_multiple_files=True, key="bf_src")
+
+    with col2:
+        st.subheader("2. 模板檔案")
+        file_tpl = st.file_uploader("模板 (Template)", type=["xlsx"], key="bf_tpl")
+
+    st.subheader("3. 設定各來源檔日期")
+    pairs = []
+    for f in files_src or []:
+        # 以上傳檔的 file_id 作為 key：同名檔案上傳兩次時元件不會重複
+        d = st.date_input(f"{f.name} 的統計日期", value=date.today(), key=f"bf_date_{f.file_id}")
+        pairs.append((f, d))
+    engine = OUTPUT_ENGINES[st.selectbox("輸出方式", list(OUTPUT_ENGINES), key="bf_engine")]
+    compression = COMPRESSION_LEVELS[st.selectbox("壓縮等級", list(COMPRESSION_LEVELS), key="bf_compression")]
+    measure = st.checkbox("⏱️ 記錄各階段時間與記憶體", value=False, key="bf_measure")
+
+    if st.button("🚀 執行多日補跑"):
+        if not pairs or not file_tpl:
+            st.error("請上傳必要檔案！")
+            return
+
+        log_expander = st.expander("執行紀錄", expanded=True)
+
+        with st.spinner("處理中..."):
+            try:
+                metrics = new_metrics(measure)
+                with metrics.span("template_load", memory=True):
+                    wb_dst, cache_msg = load_template(file_tpl, selective=engine == pipeline.ENGINE_PATCH)
+                pairs.sort(key=lambda p: p[1])
+
+                # 來源檔逐日載入，Step 1 用完即關閉
+                def load_days():
+                    for f, d in pairs:
+                        with metrics.span("load_file", memory=True):
+                            wb_src = load_file(f)
+                        yield wb_src, d
+
+                days = load_days()
+                dirty = {}
+                ok, logs = backfill.run_backfill(wb_dst, days, dirty=dirty, metrics=metrics)
+                logs.insert(0, cache_msg)
+
+                with metrics.span("save", memory=True):
+                    output, save_logs = save_output(wb_dst, file_tpl, dirty, engine, compression)
+                    del wb_dst
+                logs.extend(save_logs)
+
                 with log_expander:
                     for l in logs:
                         st.write(l)
+                    show_metrics(metrics, mode="backfill", dates=f"{pairs[0][1]}~{pairs[-1][1]}", engine=engine)
 
-                output = io.BytesIO()
-                wb_dst.save(output)
-                output.seek(0)
-                
-                st.success("執行完成！")
-                st.download_button("📥 下載整合結果", data=output, file_name=f"Result_{target_date}.xlsx")
+                first, last = pairs[0][1], pairs[-1][1]
+                if ok:
+                    st.success("執行完成！")
+                else:
+                    st.warning("部分日期執行失敗，請查看執行紀錄")
+                st.download_button("📥 下載整合結果", data=output_writer.download(output),
+                                   file_name=f"Result_{first}_{last}.xlsx")
 
             except Exception as e:
                 st.error(f"發生錯誤: {e}")
                 import traceback
                 st.text(traceback.format_exc())
 
+def batch_page():
+    """多分區批次：各分區的來源檔共用一個模板 (或各自指定模板)，以多個行程平行執行後打包成 zip"""
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.subheader("1. 來源檔案 (各分區)")
+        files_src = st.file_uploader("mailmodamount (Step 1)", type=["xlsx", "csv"],
+                                     accept_multiple_files=True, key="bt_src")
+
+    with col2:
+        st.subheader("2. 模板檔案")
+        files_tpl = st.file_uploader("模板 (Template，可多個)", type=["xlsx"],
+                                     accept_multiple_files=True, key="bt_tpl")
+
+    st.subheader("3. 設定")
+    target_date = st.date_input("請選擇統計日期", value=date.today(), key="bt_date")
+    engine = OUTPUT_ENGINES[st.selectbox("輸出方式", list(OUTPUT_ENGINES), key="bt_engine")]
+    compression = COMPRESSION_LEVELS[st.selectbox("壓縮等級", list(COMPRESSION_LEVELS), key="bt_compression")]
+    workers = st.number_input("平行 worker 數", min_value=1, max_value=batch.default_workers(),
+                              value=batch.default_workers(), key="bt_workers")
+
+    # 只有一個模板時全部共用；多個模板時逐一指定
+    # 以上傳檔的 file_id / 模板的位置對應，同名檔案不會互相覆蓋
+    tpl_names = [f.name for f in files_tpl or []]
+    pairing = {}
+    if len(tpl_names) > 1:
+        for f in files_src or []:
+            pairing[f.file_id] = st.selectbox(f"{f.name} 使用的模板", range(len(tpl_names)),
+                                              format_func=tpl_names.__getitem__, key=f"bt_pair_{f.file_id}")
+
+    if st.button("🚀 執行多分區批次"):
+        if not files_src or not files_tpl:
+            st.error("請上傳必要檔案！")
+            return
+
+        log_expander = st.expander("執行紀錄", expanded=True)
+        bar = st.progress(0.0, text="處理中...")
+
+        def on_done(done, total, src_name, ok):
+            bar.progress(done / total, text=f"{'✅' if ok else '❌'} {src_name} ({done}/{total})")
+
+        try:
+            template = None
+            tpl_bytes = [f.getvalue() for f in files_tpl]
+            if len(files_tpl) == 1:
+                template = files_tpl[0].getvalue()
+                items = [(f.name, f.getvalue(), None) for f in files_src]
+            else:
+                items = [(f.name, f.getvalue(), tpl_bytes[pairing[f.file_id]]) for f in files_src]
+
+            output = output_writer.new_buffer()
+            ok_count, failed, logs = batch.run_batch(items, output, target_date, template=template,
+                                                     engine=engine, workers=int(workers), on_done=on_done,
+                                                     compression=compression)
+
+            with log_expander:
+                for l in logs:
+                    st.write(l)
+
+            if failed:
+                st.warning(f"{failed} 個來源檔執行失敗，請查看執行紀錄")
+            else:
+                st.success("執行完成！")
+            st.download_button("📥 下載批次結果 (zip)", data=output_writer.download(output), file_name=f"Result_{target_date}.zip",
+                               mime="application/zip")
+
+        except Exception as e:
+            st.error(f"發生錯誤: {e}")
+            import traceback
+            st.text(traceback.format_exc())
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
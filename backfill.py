@@ -0,0 +1,56 @@
+# backfill.py
+import daily_single_1
+import rollup
+import run_dailyCopy_2
+import daily_copy_task
+from metrics import NULL_METRICS
+
+def run_backfill(wb_dst, days, dirty=None, metrics=NULL_METRICS):
+    """
+    多日補跑：模板只載入一次，依日期順序逐日執行 Step 1 & 2，最後對所有日期執行一次 Step 3
+    days: (wb_src, target_date) 的序列，可為 generator (來源檔逐日載入，用完即關閉)
+    dirty: 記錄所有日期寫入儲存格的 dict (供局部修補輸出使用)
+    metrics: 量測物件 (預設不量測)
+    回傳 (是否全部成功, 每日的執行紀錄)
+    """
+    logs = []
+    all_ok = True
+    # 各日共用同一份日期索引，日期列只需掃描一次
+    date_index = daily_copy_task.DateColumnIndex()
+    written_dates = []
+    ran_step2 = False
+
+    for wb_src, target_date in days:
+        logs.append(f"📅 {target_date}")
+
+        with metrics.span("step1", memory=True):
+            ok1, msg1 = daily_single_1.run_step(wb_src, wb_dst, dirty=dirty, metrics=metrics)
+        if hasattr(wb_src, "close"):
+            wb_src.close()
+        logs.append(msg1)
+
+        if not ok1:
+            all_ok = False
+            continue
+
+        counts = {}
+        ran_step2 = True
+        with metrics.span("step2", memory=True):
+            ok2, msg2 = run_dailyCopy_2.run_step(wb_dst, wb_dst, target_date=target_date,
+                                                 date_index=date_index, dirty=dirty, metrics=metrics,
+                                                 counts=counts)
+        if isinstance(msg2, list):
+            logs.extend(msg2)
+        else:
+            logs.append(str(msg2))
+        all_ok = all_ok and ok2
+        # 來源檔中的日期可能與 target_date 不同，以 Step 2 實際寫入的日期為準
+        written_dates.extend(counts.get("dates", []))
+
+    # Step 3 只需在全部日期寫完後執行一次 (各日期所在的週 / 月一起重算)
+    if ran_step2:
+        with metrics.span("step3", memory=True):
+            _, msg3 = rollup.run_step(wb_dst, written_dates, date_index=date_index, dirty=dirty, metrics=metrics)
+        logs.append(msg3)
+
+    return all_ok, logs
@@ -0,0 +1,122 @@
+# batch.py
+import multiprocessing
+import os
+import sys
+import traceback
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import output_writer
+import pipeline
+
+# 每個 worker 處理幾個項目後重啟，釋放 openpyxl 殘留的記憶體 (Python 3.11 以上)
+MAX_ITEMS_PER_WORKER = 8
+# 每個 worker 最多同時有幾個已送出、尚未寫入 zip 的項目 (限制主行程暫存的結果量)
+IN_FLIGHT_PER_WORKER = 2
+
+LOG_NAME = "batch_log.txt"
+
+# worker 行程內的共用模板 (由 initializer 每個 worker 只傳一次)
+_shared_template = None
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+def _init_worker(tpl_bytes):
+    global _shared_template
+    _shared_template = tpl_bytes
+
+def _run_item(src_bytes, src_name, tpl_bytes, target_date, engine, compression):
+    """在 worker 行程中執行一個來源檔；tpl_bytes 為 None 時使用共用模板"""
+    if tpl_bytes is None:
+        tpl_bytes = _shared_template
+    try:
+        return pipeline.run_daily(src_bytes, src_name, tpl_bytes, target_date, engine=engine,
+                                  cache=pipeline.worker_cache(), compression=compression)
+    except Exception as e:
+        return False, None, [f"發生錯誤: {e}", traceback.format_exc()]
+
+def output_name(src_name, target_date, used):
+    """zip 內的結果檔名 Result_<來源檔名>_<日期>.xlsx，重複時加上序號"""
+    stem = os.path.splitext(os.path.basename(src_name))[0]
+    name = f"Result_{stem}_{target_date}.xlsx"
+    n = 2
+    while name in used:
+        name = f"Result_{stem}_{target_date}_{n}.xlsx"
+        n += 1
+    used.add(name)
+    return name
+
+def _executor(workers, shared_template):
+    kwargs = {"max_workers": workers, "mp_context": multiprocessing.get_context("spawn"),
+              "initializer": _init_worker, "initargs": (shared_template,)}
+    if sys.version_info >= (3, 11):
+        kwargs["max_tasks_per_child"] = MAX_ITEMS_PER_WORKER
+    return ProcessPoolExecutor(**kwargs)
+
+def run_batch(items, out, target_date, template=None, engine=pipeline.ENGINE_OPENPYXL,
+              workers=None, on_done=None, compression=output_writer.DEFAULT_COMPRESSION):
+    """
+    多分區批次：每個來源檔各自執行 Step 1 & 2，結果依完成順序寫入 zip (out)，
+    最後附上合併的執行紀錄 batch_log.txt
+    items: [(來源檔名, 來源位元組, 模板位元組或 None)]，None 表示使用共用的 template
+    on_done: 每完成一項以 (已完成數, 總數, 來源檔名, 是否成功) 呼叫
+    compression: 各結果檔的壓縮等級
+    回傳 (成功數, 失敗數, 合併紀錄)
+    """
+    items = list(items)
+    if any(tpl is None for _, _, tpl in items) and template is None:
+        raise ValueError("有來源檔未指定模板，且未提供共用模板")
+
+    workers = max(1, min(workers or default_workers(), len(items) or 1))
+    logs = [None] * len(items)
+    used = set()
+    ok_count = 0
+
+    with zipfile.ZipFile(out, "w") as zf, _executor(workers, template) as executor:
+        pending = {}
+        todo = iter(enumerate(items))
+        limit = workers * IN_FLIGHT_PER_WORKER
+
+        while True:
+            # 保持在途項目數不超過上限，結果寫入 zip 後才送出下一項
+            for i, (src_name, src_bytes, tpl_bytes) in todo:
+                future = executor.submit(_run_item, src_bytes, src_name, tpl_bytes, target_date, engine,
+                                         compression)
+                pending[future] = (i, src_name)
+                if len(pending) >= limit:
+                    break
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                i, src_name = pending.pop(future)
+                try:
+                    ok, data, item_logs = future.result()
+                except Exception as e:
+                    ok, data, item_logs = False, None, [f"發生錯誤: {e}"]
+
+                header = f"===== {src_name} ====="
+                if data is not None:
+                    name = output_name(src_name, target_date, used)
+                    # xlsx 本身已壓縮，直接存入不再壓縮
+                    zf.writestr(name, data, compress_type=zipfile.ZIP_STORED)
+                    header += f" → {name}"
+                else:
+                    header += " → ❌ 無輸出"
+                logs[i] = [header] + [str(l) for l in item_logs]
+
+                ok_count += bool(ok)
+                if on_done:
+                    on_done(sum(l is not None for l in logs), len(items), src_name, ok)
+
+        failed = len(items) - ok_count
+        combined = [f"📦 批次 {target_date}：共 {len(items)} 個來源檔，成功 {ok_count} 個，失敗 {failed} 個 (worker {workers} 個)"]
+        for item_logs in logs:
+            combined.append("")
+            combined.extend(item_logs)
+        zf.writestr(LOG_NAME, "\n".join(combined) + "\n", compress_type=zipfile.ZIP_DEFLATED)
+
+    return ok_count, failed, combined
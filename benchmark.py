@@ -0,0 +1,272 @@
+# benchmark.py
+"""
+效能量測工具：產生模擬的來源檔 / 模板，分別量測各階段的時間與記憶體峰值
+
+    python benchmark.py --rows 5000 --date-cols 366 --source csv-big5
+    python benchmark.py --save-baseline bench_baseline.json
+    python benchmark.py --baseline bench_baseline.json   # 超過門檻時 exit code 1
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+import openpyxl
+
+import daily_single_1
+import pipeline
+import rollup
+import run_dailyCopy_2
+import source_loader
+
+SOURCE_FORMATS = ["xlsx", "csv-utf-8", "csv-big5", "csv-cp950"]
+
+# 模擬模板的基礎：隨附的實際模板 (區塊位置、標籤、公式日期都與正式環境相同)
+BUNDLED_TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "114年dailyTool-單日.xlsx")
+
+REGIONS = ["台北（第一服務中心）", "台北（第二服務中心）", "新北", "桃園", "新竹", "台中",
+           "彰化", "嘉義", "台南", "高雄", "屏東", "宜蘭", "花蓮", "台東"]
+
+
+# -----------------
+# 模擬資料產生
+# -----------------
+def source_rows(rows, cols=11, report_date=date(2025, 11, 25)):
+    """mailmodamount 格式的模擬資料列"""
+    yield [None] * cols
+    yield [None] * cols
+    yield [None] * cols
+    yield [f"統計日期: {report_date:%Y/%m/%d}"] + [None] * (cols - 1)
+    for r in range(5, rows + 1):
+        region = REGIONS[r % len(REGIONS)]
+        yield [r - 4, region, f"{region}大服"] + [(r * 7 + c * 13) % 997 for c in range(cols - 3)]
+
+def make_source(rows, fmt="xlsx", cols=11):
+    """回傳 (檔名, 位元組)"""
+    if fmt == "xlsx":
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        for row in source_rows(rows, cols):
+            ws.append(row)
+        buf = io.BytesIO()
+        wb.save(buf)
+        return "mailmodamount.xlsx", buf.getvalue()
+
+    encoding = fmt.split("-", 1)[1]
+    text = io.StringIO()
+    writer = csv.writer(text)
+    for row in source_rows(rows, cols):
+        writer.writerow(["" if v is None else v for v in row])
+    return "mailmodamount.csv", text.getvalue().encode(encoding)
+
+def make_template(date_cols=366, merged=10, start=date(2025, 1, 1), extra_sheets=0, base=BUNDLED_TEMPLATE):
+    """
+    以實際模板 (預設為隨附的 114年dailyTool-單日.xlsx) 為基礎，保留其區塊位置、A 欄標籤與公式日期，
+    再補上流程需要、但模板中沒有的工作表：
+    - 114年dailyTool-單日：Step 1 的目的工作表 (含 merged 個合併範圍)
+    - 日統計 / 無上網日統計：依 TASKS 的目的位置放入來源區塊的標籤與各列名稱，日期列含 date_cols 個日期欄
+    - 空白的 週月統計 工作表 (Step 3 第一次執行時全部重算)
+    - extra_sheets 張流程不會用到的封存工作表
+    """
+    wb = openpyxl.load_workbook(base)
+    if daily_single_1.TARGET_SHEET not in wb.sheetnames:
+        ws_day = wb.create_sheet(daily_single_1.TARGET_SHEET, 0)
+        for i in range(merged):
+            row = 6 + i * 25
+            ws_day.merge_cells(start_row=row, start_column=9, end_row=row, end_column=11)
+
+    for task in run_dailyCopy_2.TASKS:
+        ws_src = wb[task["src_sheet"]]
+        if task["dst_sheet"] in wb.sheetnames:
+            ws = wb[task["dst_sheet"]]
+        else:
+            ws = wb.create_sheet(task["dst_sheet"])
+        # 區塊標籤與各列名稱 (例如各服務中心) 取自模板的來源區塊
+        ws[task["dst_key_cell"]] = ws_src[task["src_key_cell"]].value
+        key_col = ws[task["dst_key_cell"]].column
+        src_key_col = ws_src[task["src_key_cell"]].column
+        first = task["dst_date_row"] + task["dst_value_start_offset_row"]
+        for i, row in enumerate(ws_src[task["src_value_range"]]):
+            ws.cell(row=first + i, column=key_col, value=ws_src.cell(row=row[0].row, column=src_key_col).value)
+        for i in range(date_cols):
+            d = start + timedelta(days=i)
+            ws.cell(row=task["dst_date_row"], column=2 + i, value=datetime(d.year, d.month, d.day))
+
+    if rollup.ROLLUP_SHEET not in wb.sheetnames:
+        wb.create_sheet(rollup.ROLLUP_SHEET)
+
+    for n in range(extra_sheets):
+        ws = wb.create_sheet(f"封存{n + 1}")
+        for r in range(1, 301):
+            ws.append([r] + [(r * c) % 101 for c in range(1, 31)])
+
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+# -----------------
+# 量測
+# -----------------
+class _Upload(io.BytesIO):
+    """模擬 Streamlit 的 UploadedFile (有 name 與 getvalue)"""
+
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+
+def _stages(src_name, src_bytes, tpl_bytes, target_date):
+    """
+    依序回傳 (階段名稱, 函式)，每個函式使用前一階段的結果
+    各階段呼叫與 pipeline.run_daily 相同的函式 (模板載入、Step 1~3、輸出)，不使用模板快取
+    """
+    state = {}
+
+    def load_file():
+        state["src"] = source_loader.load_source(_Upload(src_bytes, src_name), src_name)
+
+    def load_template():
+        state["wb"], _ = pipeline.load_template(tpl_bytes)
+        state["dirty"] = {}
+        state["counts"] = {}
+        state["index"] = pipeline.date_index()
+
+    def load_template_selective():
+        pipeline.load_template(tpl_bytes, selective=True)
+
+    def step1():
+        ok, msg = daily_single_1.run_step(state["src"], state["wb"], dirty=state["dirty"])
+        state["src"].close()
+        if not ok:
+            raise RuntimeError(msg)
+
+    def step2():
+        run_dailyCopy_2.run_step(state["wb"], state["wb"], target_date=target_date, date_index=state["index"],
+                                 dirty=state["dirty"], counts=state["counts"])
+
+    def step3():
+        rollup.run_step(state["wb"], state["counts"].get("dates", []), date_index=state["index"],
+                        dirty=state["dirty"])
+
+    def save():
+        output, _ = pipeline.save_output(state["wb"], tpl_bytes, state["dirty"], pipeline.ENGINE_OPENPYXL)
+        output.close()
+
+    def save_patch():
+        output, _ = pipeline.save_output(state["wb"], tpl_bytes, state["dirty"], pipeline.ENGINE_PATCH)
+        output.close()
+
+    return [("load_file", load_file), ("template_load", load_template),
+            ("template_load_selective", load_template_selective), ("step1", step1),
+            ("step2", step2), ("step3", step3), ("save", save), ("save_patch", save_patch)]
+
+def run_pipeline(src_name, src_bytes, tpl_bytes, target_date, trace_memory=False):
+    """執行一次完整流程，回傳 {階段: (秒數, 記憶體峰值 bytes 或 None)}"""
+    result = {}
+    for name, fn in _stages(src_name, src_bytes, tpl_bytes, target_date):
+        if trace_memory:
+            tracemalloc.start()
+        t0 = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t0
+        peak = None
+        if trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        result[name] = (elapsed, peak)
+    return result
+
+def benchmark(rows=280, date_cols=366, merged=10, source="xlsx", repeat=3, extra_sheets=0,
+              template=BUNDLED_TEMPLATE):
+    """
+    量測各階段：時間取 repeat 次的中位數 (不開 tracemalloc)，
+    記憶體峰值另外以 tracemalloc 跑一次
+    template: 模擬模板的基礎檔 (預設為隨附的模板)
+    """
+    src_name, src_bytes = make_source(rows, source)
+    tpl_bytes = make_template(date_cols, merged, extra_sheets=extra_sheets, base=template)
+    target_date = date(2025, 11, 25)
+
+    timings = [run_pipeline(src_name, src_bytes, tpl_bytes, target_date) for _ in range(repeat)]
+    memory = run_pipeline(src_name, src_bytes, tpl_bytes, target_date, trace_memory=True)
+
+    return {
+        "params": {"rows": rows, "date_cols": date_cols, "merged": merged, "source": source,
+                   "repeat": repeat, "extra_sheets": extra_sheets,
+                   "template": os.path.basename(template)},
+        "stages": {
+            name: {
+                "seconds": statistics.median(t[name][0] for t in timings),
+                "peak_bytes": memory[name][1],
+            }
+            for name in memory
+        },
+    }
+
+def compare(report, baseline, threshold=0.2):
+    """回傳超過基準 (1 + threshold) 倍的階段列表 [(階段, 指標, 目前, 基準)]"""
+    regressions = []
+    for name, cur in report["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if not base:
+            continue
+        for metric in ("seconds", "peak_bytes"):
+            if base.get(metric) and cur[metric] > base[metric] * (1 + threshold):
+                regressions.append((name, metric, cur[metric], base[metric]))
+    return regressions
+
+def format_report(report, baseline=None):
+    lines = [f"{'stage':<24}{'time (ms)':>12}{'peak (MB)':>12}" + (f"{'vs base':>10}" if baseline else "")]
+    for name, cur in report["stages"].items():
+        line = f"{name:<24}{cur['seconds'] * 1000:>12.1f}{cur['peak_bytes'] / 1024 / 1024:>12.2f}"
+        base = (baseline or {}).get("stages", {}).get(name)
+        if base and base.get("seconds"):
+            line += f"{cur['seconds'] / base['seconds'] - 1:>+10.0%}"
+        lines.append(line)
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="dailyTool 各階段效能量測")
+    parser.add_argument("--rows", type=int, default=280, help="來源檔列數")
+    parser.add_argument("--date-cols", type=int, default=366, help="歷史工作表的日期欄數")
+    parser.add_argument("--merged", type=int, default=10, help="Step 1 目的工作表的合併範圍數")
+    parser.add_argument("--extra-sheets", type=int, default=0, help="模板中流程不會用到的工作表數")
+    parser.add_argument("--source", choices=SOURCE_FORMATS, default="xlsx", help="來源檔格式")
+    parser.add_argument("--template", default=BUNDLED_TEMPLATE, help="模擬模板的基礎檔 (預設為隨附的模板)")
+    parser.add_argument("--repeat", type=int, default=3, help="計時重複次數 (取中位數)")
+    parser.add_argument("--baseline", help="與此基準 JSON 比較，退步超過門檻時 exit code 1")
+    parser.add_argument("--threshold", type=float, default=0.2, help="允許的退步比例 (預設 0.2)")
+    parser.add_argument("--save-baseline", help="將本次結果存為基準 JSON")
+    args = parser.parse_args(argv)
+
+    report = benchmark(args.rows, args.date_cols, args.merged, args.source, args.repeat, args.extra_sheets,
+                       args.template)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print(json.dumps(report["params"], ensure_ascii=False))
+    print(format_report(report, baseline))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if baseline:
+        regressions = compare(report, baseline, args.threshold)
+        for name, metric, cur, base in regressions:
+            print(f"REGRESSION {name}.{metric}: {cur:.4g} > {base:.4g}")
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+# block_extract.py
+import re
+import numpy as np
+
+# 可安全轉成數字的字串 (不含前導零，避免把代碼類文字轉掉)
+# 一般數字或正確三位一組的千分位 (例如 1,234,567.5)；"1,2,3" 這類清單維持文字
+_NUMBER_RE = re.compile(r"^[+-]?(0|[1-9]\d*|[1-9]\d{0,2}(?:,\d{3})+)(\.\d+)?$")
+
+def load_sheet_columns(ws, min_row, max_row, min_col, max_col):
+    """以單次 iter_rows 讀取工作表的使用範圍，回傳 (列 x 欄) 的 object 陣列"""
+    rows = list(ws.iter_rows(min_row=min_row, max_row=max_row,
+                             min_col=min_col, max_col=max_col, values_only=True))
+    arr = np.empty((max_row - min_row + 1, max_col - min_col + 1), dtype=object)
+    for i, row in enumerate(rows):
+        arr[i, :len(row)] = row
+    return arr
+
+def _is_formula(v):
+    return isinstance(v, str) and v.startswith("=")
+
+_formula_mask = np.frompyfunc(_is_formula, 1, 1)
+
+def extract_blocks(plan, src_sheets, evaluator=None):
+    """
+    一次取出 plan 中所有任務的來源區塊
+    每張來源工作表只讀取一次 (涵蓋所有任務的列/欄範圍)，再以切片取出各區塊
+    evaluator: FormulaEvaluator，提供時區塊中的公式格改為計算結果 (或快取值)
+    回傳 (matrix, rows)：matrix 為 (任務數 x 區塊高度) 陣列，rows 為 {任務 index: matrix 列號}
+    找不到來源工作表的任務不會出現在 rows 中
+    """
+    by_sheet = {}
+    for ct in plan.tasks:
+        if src_sheets.get(ct.src_sheet) is not None:
+            by_sheet.setdefault(ct.src_sheet, []).append(ct)
+
+    height = max((ct.src_max_row - ct.src_min_row + 1 for ct in plan.tasks), default=0)
+    n_tasks = sum(len(items) for items in by_sheet.values())
+    matrix = np.empty((n_tasks, height), dtype=object)
+    rows = {}
+
+    for sheet_name, items in by_sheet.items():
+        min_row = min(ct.src_min_row for ct in items)
+        max_row = max(ct.src_max_row for ct in items)
+        min_col = min(ct.src_col for ct in items)
+        max_col = max(ct.src_col for ct in items)
+        arr = load_sheet_columns(src_sheets[sheet_name], min_row, max_row, min_col, max_col)
+
+        for ct in items:
+            block = arr[ct.src_min_row - min_row:ct.src_max_row - min_row + 1, ct.src_col - min_col]
+            if evaluator is not None:
+                for i in np.flatnonzero(_formula_mask(block).astype(bool)):
+                    block[i] = evaluator.value(src_sheets[sheet_name], ct.src_min_row + i, ct.src_col)
+            rows[ct.index] = len(rows)
+            matrix[rows[ct.index], :len(block)] = block
+
+    return normalize_values(matrix), rows
+
+def _is_blank(v):
+    return v is None or (isinstance(v, str) and not v.strip())
+
+def _parse_number(v):
+    """數字字串轉為 int / float (允許正確的千分位逗號)，無法轉換時回傳原值"""
+    if isinstance(v, str):
+        m = _NUMBER_RE.match(v.strip())
+        if not m:
+            return v
+        text = v.strip().replace(",", "")
+        return float(text) if m.group(2) else int(text)
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    return v
+
+_blank_mask = np.frompyfunc(_is_blank, 1, 1)
+_to_number = np.frompyfunc(_parse_number, 1, 1)
+
+def normalize_values(matrix):
+    """
+    對整個矩陣做型別正規化：空白字串 → None、數字字串 → int/float、整數值的 float → int
+    公式 (以 "=" 開頭) 與一般文字維持原樣
+    """
+    if matrix.size == 0:
+        return matrix
+    out = _to_number(matrix).astype(object)
+    out[_blank_mask(matrix).astype(bool)] = None
+    return out
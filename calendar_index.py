@@ -0,0 +1,167 @@
+# calendar_index.py
+"""
+日曆索引檔：把模板中 Step 2 各日期列 (日統計 / 無上網日統計 的 dst_date_row) 的
+{日期: 欄位} 存成模板旁的 <模板檔名>.calendar.json，
+索引只取決於日期列與 A 欄標籤 (版面簽章)：每日寫入資料後模板檔雖然不同，版面沒變時仍沿用索引；
+也可依統計日期在多個年度模板中找出對應的那一個
+"""
+import hashlib
+import io
+import json
+from datetime import date
+
+import openpyxl
+
+import daily_copy_task
+import run_dailyCopy_2
+import task_plan
+from template_cache import content_hash
+
+INDEX_VERSION = 2
+SIDECAR_SUFFIX = ".calendar.json"
+
+
+def date_rows(tasks=None):
+    """Step 2 用到的 (目的工作表, 日期列)"""
+    plan = task_plan.compile_tasks(tasks if tasks is not None else run_dailyCopy_2.TASKS)
+    return sorted(key for key, _ in plan.groups)
+
+def sidecar_path(template_path):
+    return template_path + SIDECAR_SUFFIX
+
+def read_headers(tpl_bytes, tasks=None):
+    """
+    以唯讀模式掃描模板一次 (每張工作表只讀一次)，回傳 ({(工作表名稱, 列): 日期列的值}, 版面簽章)
+    版面簽章是日期列與各目的工作表標籤欄 (dst_key_col) 內容的雜湊值
+    """
+    plan = task_plan.compile_tasks(tasks if tasks is not None else run_dailyCopy_2.TASKS)
+    wanted = {}
+    label_cols = {}
+    for sheet_name, row_idx in date_rows(tasks):
+        wanted.setdefault(sheet_name, set()).add(row_idx)
+    for ct in plan.tasks:
+        label_cols.setdefault(ct.dst_sheet, set()).add(ct.dst_key_col)
+
+    wb = openpyxl.load_workbook(io.BytesIO(tpl_bytes), read_only=True)
+    headers = {}
+    signature = []
+    try:
+        for sheet_name, row_set in wanted.items():
+            title = daily_copy_task.resolve_sheet_name(wb.sheetnames, sheet_name)
+            if title is None:
+                continue
+            cols = sorted(label_cols.get(sheet_name, ()))
+            labels = []
+            for row_idx, values in enumerate(wb[title].iter_rows(values_only=True), start=1):
+                if row_idx in row_set:
+                    headers[(title, row_idx)] = values
+                    signature.append([title, row_idx, [_sig(v) for v in values]])
+                found = [(col, values[col - 1]) for col in cols if col <= len(values) and values[col - 1] is not None]
+                if found:
+                    labels.append([row_idx, [[col, _sig(v)] for col, v in found]])
+            signature.append([title, "labels", labels])
+    finally:
+        wb.close()
+    digest = hashlib.sha256(json.dumps(signature, ensure_ascii=False).encode("utf-8")).hexdigest()
+    return headers, digest
+
+def _sig(v):
+    return None if v is None else f"{type(v).__name__}:{v}"
+
+
+class CalendarIndex:
+    """
+    模板的日期列索引 {(工作表名稱, 列): {date: 欄位索引}}
+    可直接作為 DateColumnIndex 的 preset
+    """
+
+    def __init__(self, file_hash, rows, layout_hash=None):
+        self.file_hash = file_hash
+        self.rows = rows
+        self.layout_hash = layout_hash
+
+    @classmethod
+    def from_headers(cls, headers, layout_hash, file_hash):
+        rows = {key: daily_copy_task.date_mapping(values) for key, values in headers.items()}
+        return cls(file_hash, rows, layout_hash)
+
+    @classmethod
+    def build(cls, tpl_bytes, tasks=None, file_hash=None):
+        """以唯讀模式掃描模板的日期列 (每張工作表只讀一次)"""
+        headers, layout_hash = read_headers(tpl_bytes, tasks)
+        return cls.from_headers(headers, layout_hash, file_hash or content_hash(tpl_bytes))
+
+    def covers(self, target_date):
+        """所有日期列都找得到 target_date 時回傳 True"""
+        d = daily_copy_task.to_date(target_date)
+        return bool(self.rows) and all(d in mapping for mapping in self.rows.values())
+
+    def date_range(self):
+        """索引中最早與最晚的日期 (沒有日期時回傳 (None, None))"""
+        dates = [d for mapping in self.rows.values() for d in mapping]
+        return (min(dates), max(dates)) if dates else (None, None)
+
+    def to_json(self):
+        return {
+            "version": INDEX_VERSION,
+            "hash": self.file_hash,
+            "layout_hash": self.layout_hash,
+            "rows": [{"sheet": sheet, "row": row,
+                      "dates": {d.isoformat(): col for d, col in mapping.items()}}
+                     for (sheet, row), mapping in self.rows.items()],
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        rows = {(r["sheet"], r["row"]): {date.fromisoformat(d): col for d, col in r["dates"].items()}
+                for r in data["rows"]}
+        return cls(data["hash"], rows, data.get("layout_hash"))
+
+
+def load_for_file(template_path, tpl_bytes=None, tasks=None):
+    """
+    讀取模板旁的索引檔並確認仍然適用：
+    - 模板檔完全相同時直接沿用 (不掃描)
+    - 模板檔不同 (例如已寫入新的資料) 但日期列與標籤的版面簽章相同時沿用，並更新記錄的檔案雜湊值
+    - 版面簽章不符或版本不同時重新建立並寫回
+    回傳 (CalendarIndex, 是否重新建立)
+    """
+    if tpl_bytes is None:
+        with open(template_path, "rb") as f:
+            tpl_bytes = f.read()
+    file_hash = content_hash(tpl_bytes)
+    path = sidecar_path(template_path)
+
+    saved = None
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == INDEX_VERSION:
+            saved = CalendarIndex.from_json(data)
+    except (OSError, ValueError, KeyError):
+        pass
+    if saved is not None and saved.file_hash == file_hash:
+        return saved, False
+
+    headers, layout_hash = read_headers(tpl_bytes, tasks)
+    rebuilt = saved is None or saved.layout_hash != layout_hash
+    if rebuilt:
+        index = CalendarIndex.from_headers(headers, layout_hash, file_hash)
+    else:
+        index = saved
+        index.file_hash = file_hash
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(index.to_json(), f, ensure_ascii=False)
+    except OSError:
+        # 模板所在資料夾不可寫入時仍可使用，只是下次需重新掃描
+        pass
+    return index, rebuilt
+
+def route(target_date, template_paths, tasks=None):
+    """在多個 (年度) 模板中找出日期列涵蓋 target_date 的模板，回傳 (路徑, CalendarIndex) 或 (None, None)"""
+    for path in sorted(template_paths):
+        index, _ = load_for_file(path, tasks=tasks)
+        if index.covers(target_date):
+            return path, index
+    return None, None
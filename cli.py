@@ -0,0 +1,178 @@
+# cli.py
+"""
+命令列執行 (供排程使用，不需啟動 Streamlit)
+
+    python cli.py mailmodamount.csv 模板.xlsx --date 2025-11-25 -o Result.xlsx
+    python cli.py --source-dir exports/ 模板.xlsx --date 2025-11-25 -o results/
+    python cli.py mailmodamount.csv 模板.xlsx --dry-run          # 只列出將變動的儲存格
+    python cli.py mailmodamount.csv templates/ --date 2026-01-02  # 依日期自動選擇年度模板
+
+模板旁會建立 <模板檔名>.calendar.json 日曆索引檔 (模板變動時自動重建)
+
+exit code：
+    0  全部成功
+    1  Step 2 有部分項目失敗
+    2  參數錯誤 (argparse)
+    3  Step 1 失敗或 Step 2 全部失敗
+    4  檔案讀寫或執行時發生錯誤
+"""
+import argparse
+import os
+import sys
+from datetime import date
+
+# openpyxl / numpy 等較重的模組在參數檢查通過後才載入 (見 run_one)
+
+EXIT_OK = 0
+EXIT_PARTIAL = 1
+EXIT_FAILED = 3
+EXIT_ERROR = 4
+
+SOURCE_EXTENSIONS = (".xlsx", ".csv")
+
+
+def exit_code(ok, counts):
+    """依 Step 1 結果與 Step 2 的成功 / 失敗項數決定 exit code"""
+    if not counts or not counts.get("success"):
+        return EXIT_FAILED
+    if not ok or counts.get("failed"):
+        return EXIT_PARTIAL
+    return EXIT_OK
+
+def _parse_date(text):
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"日期格式應為 YYYY-MM-DD：{text}")
+
+def run_one(src_path, tpl_bytes, target_date, output_path, engine, cache, quiet=False, calendar=None,
+            compression="balanced"):
+    """執行一個來源檔並寫出結果，回傳 exit code"""
+    import pipeline
+
+    with open(src_path, "rb") as f:
+        src_bytes = f.read()
+
+    counts = {}
+    ok, data, logs = pipeline.run_daily(src_bytes, os.path.basename(src_path), tpl_bytes, target_date,
+                                        engine=engine, cache=cache, counts=counts, calendar=calendar,
+                                        compression=compression)
+    code = exit_code(ok, counts)
+
+    if data is not None and code != EXIT_FAILED:
+        with open(output_path, "wb") as f:
+            f.write(data)
+
+    for l in logs:
+        if not quiet or l.startswith(("❌", "⚠️", "✅ Step 2")):
+            print(l)
+    print(f"[{code}] {src_path} → {output_path if code != EXIT_FAILED else '(未輸出)'}")
+    return code
+
+def plan_one(src_path, tpl_bytes, target_date, cache, quiet=False, calendar=None):
+    """試算一個來源檔：印出各工作表 / 任務的變動格數 (未加 -q 時再印逐格差異)，回傳 exit code"""
+    import pipeline
+
+    with open(src_path, "rb") as f:
+        src_bytes = f.read()
+
+    counts = {}
+    ok, plan, logs = pipeline.plan_daily(src_bytes, os.path.basename(src_path), tpl_bytes, target_date,
+                                         cache=cache, counts=counts, calendar=calendar)
+    for l in logs:
+        print(l)
+    for row in plan.summary():
+        print(f"  {row['工作表']} / {row['任務']}: 變動 {row['變動格數']} 格，合併略過 {row['合併略過']} 格")
+    if not quiet:
+        for row in plan.table():
+            note = f"  {row['備註']}" if row["備註"] else ""
+            print(f"    {row['工作表']}!{row['儲存格']}: {row['舊值']!r} → {row['新值']!r}{note}")
+    return exit_code(ok, counts)
+
+def list_files(directory, extensions):
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.lower().endswith(extensions) and not name.startswith("~$"))
+
+def list_sources(directory):
+    return list_files(directory, SOURCE_EXTENSIONS)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="dailyTool 命令列執行 (Step 1 & 2)")
+    parser.add_argument("source", nargs="?", help="來源檔 (xlsx / csv)")
+    parser.add_argument("template", help="模板 xlsx，或年度模板所在的資料夾 (依日期自動選擇)")
+    parser.add_argument("--source-dir", help="改為處理此資料夾內所有 xlsx / csv 來源檔")
+    parser.add_argument("--date", type=_parse_date, default=date.today(), help="統計日期 YYYY-MM-DD (預設今天)")
+    parser.add_argument("-o", "--output", help="結果檔路徑 (--source-dir 時為輸出資料夾)")
+    parser.add_argument("--engine", choices=["openpyxl", "patch"], default="openpyxl",
+                        help="輸出方式：openpyxl 完整存檔 / patch XML 局部修補")
+    parser.add_argument("--compression", choices=["fast", "balanced", "smallest"], default="balanced",
+                        help="結果檔壓縮等級：fast 最快 / balanced 平衡 / smallest 檔案最小")
+    parser.add_argument("--dry-run", action="store_true", help="試算：只列出將變動的儲存格，不輸出結果檔")
+    parser.add_argument("-q", "--quiet", action="store_true", help="只顯示錯誤與彙總")
+    args = parser.parse_args(argv)
+
+    if bool(args.source) == bool(args.source_dir):
+        parser.error("請指定一個來源檔或 --source-dir (擇一)")
+
+    # 排程環境的 locale 可能不支援 emoji
+    if hasattr(sys.stdout, "reconfigure"):
+        sys.stdout.reconfigure(errors="replace")
+
+    try:
+        import calendar_index
+        import template_cache
+        import batch
+
+        tpl_path = args.template
+        if os.path.isdir(tpl_path):
+            tpl_path, calendar = calendar_index.route(args.date, list_files(tpl_path, (".xlsx",)))
+            if tpl_path is None:
+                print(f"❌ {args.template} 中沒有日期列涵蓋 {args.date} 的模板")
+                return EXIT_FAILED
+            print(f"📅 {args.date} → {tpl_path}")
+
+        with open(tpl_path, "rb") as f:
+            tpl_bytes = f.read()
+        if tpl_path == args.template:
+            calendar, _ = calendar_index.load_for_file(tpl_path, tpl_bytes)
+
+        cache = template_cache.TemplateCache()
+
+        if args.dry_run:
+            sources = [args.source] if args.source else list_sources(args.source_dir)
+            codes = [plan_one(src, tpl_bytes, args.date, cache, args.quiet, calendar) for src in sources]
+            return max(codes or [EXIT_FAILED])
+
+        if args.source:
+            output = args.output or f"Result_{args.date}.xlsx"
+            return run_one(args.source, tpl_bytes, args.date, output, args.engine, cache, args.quiet, calendar,
+                           args.compression)
+
+        sources = list_sources(args.source_dir)
+        if not sources:
+            print(f"❌ {args.source_dir} 中沒有 xlsx / csv 來源檔")
+            return EXIT_FAILED
+
+        out_dir = args.output or "."
+        os.makedirs(out_dir, exist_ok=True)
+        used = set()
+        codes = []
+        for src in sources:
+            output = os.path.join(out_dir, batch.output_name(src, args.date, used))
+            try:
+                codes.append(run_one(src, tpl_bytes, args.date, output, args.engine, cache, args.quiet,
+                                     calendar, args.compression))
+            except Exception as e:
+                print(f"❌ {src} 發生錯誤: {e}")
+                codes.append(EXIT_ERROR)
+
+        failed = sum(c != EXIT_OK for c in codes)
+        print(f"📦 共 {len(codes)} 個來源檔，成功 {len(codes) - failed} 個，失敗 {failed} 個")
+        return max(codes)
+
+    except Exception as e:
+        print(f"❌ 發生錯誤: {e}")
+        return EXIT_ERROR
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,14 @@
 # daliy_copy_task.py
-import openpyxl
 from datetime import datetime, date
 from openpyxl.cell.cell import MergedCell
+from openpyxl.utils.datetime import from_excel
+
+import block_extract
+import formula_eval
+import layout_index
+from write_plan import same_value
+from metrics import NULL_METRICS
+import task_plan
 
 def get_cell_value(ws, cell_address):
     try:
@@ -9,113 +16,262 @@ def get_cell_value(ws, cell_address):
     except:
         return None
 
-def find_date_column(ws, row_idx, target_date):
+# Excel 序列日期的合理範圍 (約 1954 ~ 2119 年)，避免把一般數字誤判為日期
+EXCEL_SERIAL_MIN = 20000
+EXCEL_SERIAL_MAX = 80000
+
+def to_date(cell_val):
+    """將儲存格的值轉為 date：支援 datetime、date、"YYYY/MM/DD" 字串與 Excel 序列數字"""
+    if isinstance(cell_val, datetime):
+        return cell_val.date()
+    if isinstance(cell_val, date):
+        return cell_val
+    if isinstance(cell_val, str):
+        try:
+            return datetime.strptime(cell_val.strip(), "%Y/%m/%d").date()
+        except ValueError:
+            return None
+    if isinstance(cell_val, (int, float)) and not isinstance(cell_val, bool):
+        if EXCEL_SERIAL_MIN <= cell_val <= EXCEL_SERIAL_MAX:
+            return from_excel(cell_val).date()
+    return None
+
+
+def date_mapping(row_values):
+    """把一列的值轉為 {date: 欄位索引}；同一日期出現多次時，保留最左邊的欄位 (與原本線性搜尋一致)"""
+    mapping = {}
+    for col, cell_val in enumerate(row_values, start=1):
+        d = to_date(cell_val)
+        if d is not None and d not in mapping:
+            mapping[d] = col
+    return mapping
+
+
+class DateColumnIndex:
+    """
+    日期列索引：以 (工作表, 日期列) 為 key，快取 {date: 欄位索引}
+    每一列只掃描一次，之後的查詢皆為 O(1)
+    preset: 預先建立的索引 (例如模板旁的日曆索引檔) {(工作表名稱, 列): {date: 欄位索引}}，
+            有的列直接使用，不必掃描
+    """
+
+    def __init__(self, preset=None):
+        self._index = {}
+        self._preset = dict(preset or {})
+
+    def _build(self, ws, row_idx):
+        mapping = {}
+        for row in ws.iter_rows(min_row=row_idx, max_row=row_idx, values_only=True):
+            mapping = date_mapping(row)
+        return mapping
+
+    def mapping(self, ws, row_idx):
+        """整列的 {date: 欄位索引}"""
+        key = (ws, row_idx)
+        if key not in self._index:
+            mapping = self._preset.get((ws.title, row_idx))
+            self._index[key] = mapping if mapping is not None else self._build(ws, row_idx)
+        return self._index[key]
+
+    def lookup(self, ws, row_idx, target_date):
+        return self.mapping(ws, row_idx).get(to_date(target_date))
+
+    def invalidate(self, ws, row_idx):
+        """寫入某一列後呼叫，讓下次查詢時重新建立該列索引"""
+        self._index.pop((ws, row_idx), None)
+        self._preset.pop((ws.title, row_idx), None)
+
+
+def find_date_column(ws, row_idx, target_date, date_index=None):
     """在指定列尋找符合 target_date 的欄位索引"""
-    max_col = ws.max_column
-    for col in range(1, max_col + 1):
-        cell_val = ws.cell(row=row_idx, column=col).value
-        
-        if isinstance(cell_val, datetime):
-            cell_val = cell_val.date()
-        elif isinstance(cell_val, str):
-            try:
-                cell_val = datetime.strptime(cell_val, "%Y/%m/%d").date()
-            except:
-                pass
-        
-        if cell_val == target_date:
-            return col
+    if date_index is None:
+        date_index = DateColumnIndex()
+    return date_index.lookup(ws, row_idx, target_date)
+
+def resolve_sheet_name(sheetnames, sheet_name, fuzzy=False):
+    """
+    在工作表名稱列表中尋找 sheet_name，找不到時回傳 None
+    fuzzy=True 時允許部分比對 (例如 "日統計模板" 對應到 "日統計")
+    """
+    if sheet_name in sheetnames:
+        return sheet_name
+    if fuzzy:
+        for name in sheetnames:
+            if name in sheet_name or sheet_name.replace("模板", "") in name:
+                return name
     return None
 
+def resolve_sheet(wb, sheet_name, fuzzy=False):
+    """依名稱取得工作表，找不到時回傳 None (比對規則同 resolve_sheet_name)"""
+    name = resolve_sheet_name(wb.sheetnames, sheet_name, fuzzy)
+    return wb[name] if name is not None else None
+
 # 🔑 新增參數 force_date
-def copy_by_mapping_openpyxl(wb_src, wb_dst, tasks, force_date=None):
+def copy_by_mapping_openpyxl(wb_src, wb_dst, tasks, force_date=None, date_index=None, dirty=None,
+                             metrics=NULL_METRICS, counts=None, write_plan=None):
     """
     執行 tasks 列表中的所有複製任務
     force_date: 若無法從來源格讀取日期，則使用此日期
+    date_index: 共用的 DateColumnIndex (未提供則每次執行建立一個)
+    dirty: 若提供 dict，會把寫入的 (row, col) 記錄到 dirty[工作表名稱]
+    metrics: 量測物件 (預設不量測)
+    counts: 若提供 dict，會寫入 {"success": 成功項數, "failed": 失敗項數, "dates": 實際寫入的日期 (排序)}
+    write_plan: 若提供 WritePlan，只記錄每格的 舊值 → 新值，不寫入 wb_dst
     """
+    if date_index is None:
+        date_index = DateColumnIndex()
+
     logs = []
     success_count = 0
     fail_count = 0
-    
-    for idx, task in enumerate(tasks):
-        task_label = f"Task {idx+1}"
-        
-        try:
-            # 1. 解析來源 Sheet
-            src_sheet_name = task["src_sheet"]
-            ws_src = None
-            if src_sheet_name in wb_src.sheetnames:
-                ws_src = wb_src[src_sheet_name]
-            else:
-                for name in wb_src.sheetnames:
-                    if name in src_sheet_name or src_sheet_name.replace("模板", "") in name:
-                        ws_src = wb_src[name]
-                        break
-            
-            if ws_src is None:
-                logs.append(f"⚠️ {task_label}: 找不到來源工作表 '{src_sheet_name}'")
-                fail_count += 1
-                continue
-
-            # 2. 獲取來源日期 (優先讀取 Excel，失敗則用 force_date)
-            src_date_val = get_cell_value(ws_src, task["src_date_cell"])
-            if isinstance(src_date_val, datetime):
-                src_date_val = src_date_val.date()
-            
-            # 如果讀不到 (例如是公式)，且有提供強制日期，就用強制的
-            if not isinstance(src_date_val, date) and force_date:
-                src_date_val = force_date
-
-            if not src_date_val:
-                logs.append(f"⚠️ {task_label}: 無法從 {task['src_date_cell']} 讀取日期，且無強制日期")
-                fail_count += 1
-                continue
-
-            # 3. 讀取來源資料
-            src_range_cells = ws_src[task["src_value_range"]]
-            src_values = [row[0].value for row in src_range_cells]
-
-            # 4. 解析目的 Sheet
-            dst_sheet_name = task["dst_sheet"]
-            if dst_sheet_name not in wb_dst.sheetnames:
-                logs.append(f"⚠️ {task_label}: 找不到目的工作表 '{dst_sheet_name}'")
-                fail_count += 1
-                continue
-            
-            ws_dst = wb_dst[dst_sheet_name]
-            
-            # 5. 在目的檔尋找對應的日期欄位
-            date_row = task["dst_date_row"]
-            target_col_idx = find_date_column(ws_dst, date_row, src_date_val)
-            
-            if not target_col_idx:
-                logs.append(f"⚠️ {task_label}: 在 '{dst_sheet_name}' 第 {date_row} 列找不到日期 {src_date_val}")
-                fail_count += 1
-                continue
-
-            # 6. 計算寫入位置
-            dst_start_col = target_col_idx + task["dst_value_start_offset_col"]
-            dst_start_row = date_row + task["dst_value_start_offset_row"]
-            
-            # 7. 執行寫入 (避開 MergedCell)
-            for i, val in enumerate(src_values):
-                current_row = dst_start_row + i
-                current_col = dst_start_col
-                
-                dst_cell = ws_dst.cell(row=current_row, column=current_col)
-                
-                if isinstance(dst_cell, MergedCell):
-                    continue 
-
-                dst_cell.value = val
-                
-            success_count += 1
-
-        except Exception as e:
-            logs.append(f"❌ {task_label} 發生錯誤: {str(e)}")
-            fail_count += 1
-
-    summary = f"✅ Step 2 彙總：成功 {success_count} 項，失敗 {fail_count} 項。"
+    changed_count = 0
+    written_dates = set()
+
+    # 0. 編譯任務計畫 (依 tasks 雜湊值快取)，設定有誤時在寫入前就中止
+    try:
+        with metrics.span("step2.compile"):
+            plan = task_plan.compile_tasks(tasks)
+    except ValueError as e:
+        logs.append(f"❌ Step 2 任務設定錯誤: {str(e)}")
+        if counts is not None:
+            counts.update(success=0, failed=len(tasks), dates=[])
+        return False, logs
+
+    # 1. 每個工作表名稱只解析一次
+    src_sheets = {name: resolve_sheet(wb_src, name, fuzzy=True) for name in plan.src_sheets}
+    dst_sheets = {name: resolve_sheet(wb_dst, name) for name in plan.dst_sheets}
+
+    # 1-1. 依 A 欄標籤找出各區塊實際的位置 (每張工作表只掃描一次，版面未變時使用快取)
+    try:
+        with metrics.span("step2.layout"):
+            plan, layout_logs = layout_index.resolve_plan(plan, src_sheets, dst_sheets)
+    except ValueError as e:
+        logs.append(f"❌ Step 2 版面對應錯誤: {str(e)}")
+        if counts is not None:
+            counts.update(success=0, failed=len(tasks), dates=[])
+        return False, logs
+    logs.extend(layout_logs)
+
+    # 2. 一次取出所有任務的來源區塊 (每張來源工作表只讀一次，公式格先計算，並做型別正規化)
+    #    計算結果依儲存格記憶，多個任務共用的前置格只計算一次
+    #    來源與目的是同一個活頁簿時，Step 1 剛改寫的格子 (dirty) 讓參照它們的公式快取值失效
+    evaluator = formula_eval.FormulaEvaluator(wb_src, edited=dirty if wb_src is wb_dst else None)
+    with metrics.span("step2.extract"):
+        src_matrix, src_rows = block_extract.extract_blocks(plan, src_sheets, evaluator)
+
+    for (dst_sheet_name, date_row), group in plan.groups:
+        ws_dst = dst_sheets[dst_sheet_name]
+        written = dirty.setdefault(ws_dst.title, set()) if dirty is not None and ws_dst is not None else None
+        # 同一組 (目的工作表, 日期列) 的任務共用日期欄位查詢結果
+        col_cache = {}
+
+        for ct in group:
+            task_label = f"Task {ct.index+1}"
+
+            with metrics.span(f"step2.task{ct.index+1:02d}"):
+                try:
+                    ws_src = src_sheets[ct.src_sheet]
+                    if ws_src is None:
+                        logs.append(f"⚠️ {task_label}: 找不到來源工作表 '{ct.src_sheet}'")
+                        fail_count += 1
+                        continue
+
+                    # 3. 獲取來源日期 (優先讀取 Excel 或公式計算結果，失敗則用 force_date)
+                    src_date_val = to_date(evaluator.value(ws_src, ct.src_date_row, ct.src_date_col,
+                                                           fallback=False))
+
+                    # 如果讀不到 (例如是無法計算的公式)，且有提供強制日期，就用強制的
+                    # 公式的快取值是上次存檔時的日期，可能早於本次的目標日期，因此排在 force_date 之後
+                    if not isinstance(src_date_val, date):
+                        src_date_val = force_date or to_date(
+                            evaluator.value(ws_src, ct.src_date_row, ct.src_date_col))
+
+                    if not src_date_val:
+                        logs.append(f"⚠️ {task_label}: 無法從 {ct.src_date_cell} 讀取日期，且無強制日期")
+                        fail_count += 1
+                        continue
+
+                    # 4. 取出該任務的來源資料
+                    src_values = src_matrix[src_rows[ct.index], :ct.src_max_row - ct.src_min_row + 1]
+                    metrics.count("step2.cells_read", len(src_values))
+
+                    # 5. 目的 Sheet
+                    if ws_dst is None:
+                        logs.append(f"⚠️ {task_label}: 找不到目的工作表 '{dst_sheet_name}'")
+                        fail_count += 1
+                        continue
+
+                    # 6. 在目的檔尋找對應的日期欄位 (每組每個日期只查一次)
+                    if src_date_val not in col_cache:
+                        with metrics.span("step2.date_lookup"):
+                            col_cache[src_date_val] = find_date_column(ws_dst, date_row, src_date_val, date_index)
+                    target_col_idx = col_cache[src_date_val]
+
+                    if not target_col_idx:
+                        logs.append(f"⚠️ {task_label}: 在 '{dst_sheet_name}' 第 {date_row} 列找不到日期 {src_date_val}")
+                        fail_count += 1
+                        continue
+
+                    # 7. 計算寫入位置
+                    dst_start_col = target_col_idx + ct.dst_col_offset
+                    dst_start_row = date_row + ct.dst_row_offset
+
+                    # 8. 執行寫入 (避開 MergedCell)
+                    written_n = skipped_n = unchanged_n = 0
+                    for i, val in enumerate(src_values):
+                        current_row = dst_start_row + i
+                        current_col = dst_start_col
+
+                        # 直接查詢既有格子，不為空白格建立新物件
+                        dst_cell = ws_dst._cells.get((current_row, current_col))
+
+                        if isinstance(dst_cell, MergedCell):
+                            skipped_n += 1
+                            if write_plan is not None:
+                                write_plan.skip(ws_dst.title, task_label, current_row, current_col, val)
+                            continue
+
+                        old_val = dst_cell.value if dst_cell is not None else None
+                        if write_plan is not None:
+                            if write_plan.write(ws_dst.title, task_label, current_row, current_col, old_val, val):
+                                written_n += 1
+                            else:
+                                unchanged_n += 1
+                            continue
+
+                        # 值未變動時不寫入
+                        if same_value(old_val, val):
+                            unchanged_n += 1
+                            continue
+
+                        # ws.cell(value=None) 不會清空格子，必須直接指定 .value
+                        ws_dst.cell(row=current_row, column=current_col).value = val
+                        written_n += 1
+                        if written is not None:
+                            written.add((current_row, current_col))
+
+                        # 寫入到某個已建立索引的日期列時，讓該列索引失效
+                        date_index.invalidate(ws_dst, current_row)
+
+                    metrics.count("step2.cells_written", written_n)
+                    metrics.count("step2.cells_unchanged", unchanged_n)
+                    metrics.count("step2.cells_skipped_merged", skipped_n)
+                    changed_count += written_n
+                    success_count += 1
+                    if written_n:
+                        written_dates.add(src_date_val)
+
+                except Exception as e:
+                    logs.append(f"❌ {task_label} 發生錯誤: {str(e)}")
+                    fail_count += 1
+
+    formula_line = evaluator.summary_line()
+    if formula_line:
+        logs.append(formula_line)
+
+    summary = f"✅ Step 2 彙總：成功 {success_count} 項，失敗 {fail_count} 項，變動 {changed_count} 格。"
     logs.append(summary)
+    if counts is not None:
+        counts.update(success=success_count, failed=fail_count, dates=sorted(written_dates))
     
     return True, logs
\ No newline at end of file
@@ -1,21 +1,90 @@
 # daily_single_1.py
-import openpyxl
-from openpyxl.utils import column_index_from_string
-# 🔑 必須匯入這個特殊的類別來偵測合併儲存格
-from openpyxl.cell.cell import MergedCell 
-import re
+from openpyxl.utils import range_boundaries
 
-def run_step(wb_src, wb_dst):
+from metrics import NULL_METRICS
+from write_plan import same_value
+
+# 來源複製範圍 (新增產品線時只需調整這裡，或在呼叫 run_step 時傳入)
+SOURCE_RANGE = "A1:K280"
+
+# 模板中 Step 1 的目的工作表
+TARGET_SHEET = "114年dailyTool-單日"
+
+def merged_cell_mask(ws):
+    """
+    一次建立工作表的合併儲存格遮罩：回傳所有「非首格」的 (row, col) 集合
+    這些格子在 openpyxl 中是唯讀的 MergedCell，寫入時必須跳過
+    """
+    mask = set()
+    for mr in ws.merged_cells.ranges:
+        for row in range(mr.min_row, mr.max_row + 1):
+            for col in range(mr.min_col, mr.max_col + 1):
+                if row == mr.min_row and col == mr.min_col:
+                    continue
+                mask.add((row, col))
+    return mask
+
+def copy_block(ws_src, ws_dst, source_range=SOURCE_RANGE, start_row=1, start_col=1, dirty=None, write_plan=None):
+    """
+    區塊複製：以 values_only 一次讀取來源範圍，只寫入「可寫且值有變動」的格子
+    回傳 {"copied": 寫入數, "skipped": 合併儲存格跳過數, "unchanged": 值相同未寫入數}
+    dirty: 若提供 dict，會把寫入的 (row, col) 記錄到 dirty[工作表名稱]
+    write_plan: 若提供 WritePlan，只記錄差異，不寫入 ws_dst
+    """
+    min_col, min_row, max_col, max_row = range_boundaries(source_range)
+    mask = merged_cell_mask(ws_dst)
+    # 直接查詢已存在的格子，避免 ws.cell() 為空白格建立新物件
+    existing = ws_dst._cells
+
+    stats = {"copied": 0, "skipped": 0, "unchanged": 0}
+    written = dirty.setdefault(ws_dst.title, set()) if dirty is not None else None
+    rows = ws_src.iter_rows(min_row=min_row, max_row=max_row,
+                            min_col=min_col, max_col=max_col, values_only=True)
+
+    for r_idx, row in enumerate(rows):
+        dst_row = start_row + r_idx
+        for c_idx, val in enumerate(row):
+            dst_col = start_col + c_idx
+
+            if (dst_row, dst_col) in mask:
+                stats["skipped"] += 1
+                if write_plan is not None:
+                    write_plan.skip(ws_dst.title, "Step 1", dst_row, dst_col, val)
+                continue
+
+            dst_cell = existing.get((dst_row, dst_col))
+            old_val = dst_cell.value if dst_cell is not None else None
+            if write_plan is not None:
+                changed = write_plan.write(ws_dst.title, "Step 1", dst_row, dst_col, old_val, val)
+                stats["copied" if changed else "unchanged"] += 1
+                continue
+
+            if same_value(old_val, val):
+                stats["unchanged"] += 1
+                continue
+
+            # ws.cell(value=None) 不會清空格子，必須直接指定 .value
+            ws_dst.cell(row=dst_row, column=dst_col).value = val
+            stats["copied"] += 1
+            if written is not None:
+                written.add((dst_row, dst_col))
+
+    return stats
+
+def run_step(wb_src, wb_dst, source_range=SOURCE_RANGE, dirty=None, metrics=NULL_METRICS, write_plan=None):
     """
-    執行 Step 1: 將來源檔的 A1:K280 複製到 模板
+    執行 Step 1: 將來源檔的 source_range (預設 A1:K280) 複製到 模板
     (已加入合併儲存格防呆機制)
+    dirty: 記錄寫入儲存格的 dict (供局部修補輸出使用)
+    metrics: 量測物件 (預設不量測)
+    write_plan: 試算模式的 WritePlan (只記錄差異，不寫入)
     """
     try:
         # 1. 讀取來源工作表 (假設資料在第 1 頁)
         ws_src = wb_src.worksheets[0]
         
         # 2. 讀取目的工作表 (模板)
-        target_sheet_name = "114年dailyTool-單日"
+        target_sheet_name = TARGET_SHEET
         
         if target_sheet_name in wb_dst.sheetnames:
             ws_dst = wb_dst[target_sheet_name]
@@ -23,26 +92,20 @@ def run_step(wb_src, wb_dst):
             ws_dst = wb_dst.worksheets[0]
             print(f"警告: 找不到 '{target_sheet_name}'，寫入至 '{ws_dst.title}'")
 
-        # 3. 執行複製 (A1:K280)
-        source_range = ws_src["A1:K280"]
-        
-        start_row = 1
-        start_col = 1
-        
-        for r_idx, row in enumerate(source_range):
-            for c_idx, cell in enumerate(row):
-                # 取得目的地的格子物件
-                dst_cell = ws_dst.cell(row=start_row + r_idx, column=start_col + c_idx)
-                
-                # 🛑 關鍵修正：檢查目的地是否為「被合併的儲存格」
-                if isinstance(dst_cell, MergedCell):
-                    # 如果是合併儲存格的一部分(非首格)，它是唯讀的，必須跳過
-                    continue
+        # 3. 執行區塊複製 (合併儲存格遮罩只建立一次)
+        stats = copy_block(ws_src, ws_dst, source_range, dirty=dirty, write_plan=write_plan)
+        metrics.count("step1.cells_read", sum(stats.values()))
+        metrics.count("step1.cells_written", stats["copied"])
+        metrics.count("step1.cells_unchanged", stats["unchanged"])
+        metrics.count("step1.cells_skipped_merged", stats["skipped"])
 
-                # 正常寫入
-                dst_cell.value = cell.value
+        if write_plan is not None:
+            return True, (f"🔍 Step 1 (daily_single) 試算：{source_range} 將寫入 {stats['copied']} 格，"
+                          f"未變動 {stats['unchanged']} 格，避開合併儲存格 {stats['skipped']} 格")
 
-        return True, "✅ Step 1 (daily_single) 執行成功：已複製 A1:K280 (已避開合併儲存格)"
+        return True, (f"✅ Step 1 (daily_single) 執行成功：已複製 {source_range} "
+                      f"(寫入 {stats['copied']} 格，未變動 {stats['unchanged']} 格，"
+                      f"避開合併儲存格 {stats['skipped']} 格)")
 
     except Exception as e:
-        return False, f"❌ Step 1 發生錯誤: {str(e)}"
\ No newline at end of file
+        return False, f"❌ Step 1 發生錯誤: {str(e)}"
@@ -0,0 +1,440 @@
+# formula_eval.py
+"""
+小型公式計算器：只支援模板常用的日期與四則運算公式，例如
+    =DATEVALUE(RIGHT('DAY1'!$A4,5))    =B1+1    ='114年dailyTool-單日'!C10*2
+無法計算的公式 (不支援的函數、錯誤值、循環參照、參照到未載入的工作表) 改用檔案中 Excel 上次存檔的快取值；
+但前置格在本次執行中被改寫過的公式，快取值已過期，不再使用
+"""
+import re
+from datetime import date, datetime, timedelta
+
+from openpyxl.formula import Tokenizer
+from openpyxl.formula.tokenizer import Token
+from openpyxl.styles.numbers import is_date_format
+from openpyxl.utils import range_boundaries
+from openpyxl.utils.datetime import from_excel, to_excel
+
+
+class FormulaError(Exception):
+    """公式無法計算 (不支援或結果為錯誤值)"""
+
+
+class _Ref:
+    """儲存格 / 範圍參照"""
+
+    def __init__(self, ws, min_row, min_col, max_row, max_col):
+        self.ws = ws
+        self.bounds = (min_row, min_col, max_row, max_col)
+
+
+# 運算子優先順序 (數字越大越先計算)
+_INFIX = {"=": 1, "<>": 1, "<": 1, ">": 1, "<=": 1, ">=": 1, "&": 2, "+": 3, "-": 3, "*": 4, "/": 4, "^": 5}
+
+# 千分位逗號必須三位一組 (與 Excel 的 VALUE 相同，"1,2,3" 是 #VALUE!)
+_GROUPED_RE = re.compile(r"^\s*[+-]?\d{1,3}(,\d{3})+(\.\d*)?\s*$")
+
+_DATE_RE = re.compile(r"^\s*(?:(\d{4})[/-])?(\d{1,2})[/-](\d{1,2})(?:\s.*)?$")
+
+
+def _num(v):
+    if v is None:
+        return 0
+    if isinstance(v, bool):
+        return int(v)
+    if isinstance(v, (int, float)):
+        return v
+    if isinstance(v, (datetime, date)):
+        return to_excel(v)
+    if isinstance(v, str):
+        text = v.replace(",", "") if _GROUPED_RE.match(v) else v
+        try:
+            return float(text.strip())
+        except ValueError:
+            pass
+    raise FormulaError(f"#VALUE! ({v!r})")
+
+def _text(v):
+    if v is None:
+        return ""
+    if isinstance(v, bool):
+        return "TRUE" if v else "FALSE"
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return str(v)
+
+def _serial(y, m, d):
+    y += (m - 1) // 12
+    m = (m - 1) % 12 + 1
+    return to_excel(datetime(y, m, 1) + timedelta(days=d - 1))
+
+def _compare(op, a, b):
+    if isinstance(a, str) or isinstance(b, str):
+        a, b = _text(a).lower(), _text(b).lower()
+    else:
+        a, b = _num(a), _num(b)
+    return {"=": a == b, "<>": a != b, "<": a < b, ">": a > b, "<=": a <= b, ">=": a >= b}[op]
+
+
+class FormulaEvaluator:
+    """
+    計算活頁簿中的公式格，結果依 (工作表, 列, 欄) 記憶，
+    多個任務參照同一個前置格時只計算一次
+    DATEVALUE("11/25") 這類沒有年份的日期在 Excel 中取決於計算當下的年份，不自行推測，改用快取值
+    IF 只計算成立的分支，未採用的分支有錯誤時不影響結果
+    edited: 本次執行已改寫的儲存格 {工作表名稱: {(row, col)}} (即 Step 1 的 dirty)，
+            直接或間接參照到這些格子的公式不使用快取值
+    """
+
+    def __init__(self, wb, edited=None):
+        self.wb = wb
+        self.edited = edited or {}
+        self.stats = {"evaluated": 0, "cached": 0, "failed": 0, "stale": 0}
+        self._memo = {}
+        self._active = set()
+        self._stale = {}
+        self._functions = {
+            "DATEVALUE": self._datevalue,
+            "DATE": lambda y, m, d: _serial(int(_num(y)), int(_num(m)), int(_num(d))),
+            "YEAR": lambda v: from_excel(_num(v)).year,
+            "MONTH": lambda v: from_excel(_num(v)).month,
+            "DAY": lambda v: from_excel(_num(v)).day,
+            "RIGHT": lambda s, n=1: _text(s)[-int(_num(n)):] if int(_num(n)) else "",
+            "LEFT": lambda s, n=1: _text(s)[:int(_num(n))],
+            "MID": lambda s, start, n: _text(s)[int(_num(start)) - 1:int(_num(start)) - 1 + int(_num(n))],
+            "LEN": lambda s: len(_text(s)),
+            "TRIM": lambda s: " ".join(_text(s).split()),
+            "VALUE": lambda s: _num(s),
+            "INT": lambda v: int(_num(v) // 1),
+            "ABS": lambda v: abs(_num(v)),
+            "ROUND": lambda v, n=0: round(_num(v), int(_num(n))),
+            "SUM": lambda *args: sum(_num(v) for v in args if not isinstance(v, str)),
+            "MIN": lambda *args: min(_num(v) for v in args if not isinstance(v, str)),
+            "MAX": lambda *args: max(_num(v) for v in args if not isinstance(v, str)),
+            "CONCATENATE": lambda *args: "".join(_text(v) for v in args),
+        }
+
+    # --- 對外介面 ---
+    def value(self, ws, row, col, fallback=True):
+        """
+        回傳儲存格的值：一般值原樣回傳；公式先嘗試計算，失敗時改用快取值，兩者都沒有時回傳公式文字
+        日期格式的公式格回傳 datetime
+        fallback=False 時無法計算的公式一律回傳 None (由呼叫端決定是否改用其他值)
+        """
+        raw = self._raw(ws, row, col)
+        if not (isinstance(raw, str) and raw.startswith("=")):
+            return raw
+
+        key = (ws.title, row, col)
+        if key not in self._memo:
+            if key in self._active:
+                # 循環參照：交由最外層的公式格改用它自己的快取值，中間的格子不記憶結果
+                raise FormulaError("循環參照")
+            self._memo[key] = self._compute(ws, row, col, raw)
+        result, computed = self._memo[key]
+        if not computed and not fallback:
+            return None
+        return result
+
+    def is_stale(self, ws, row, col):
+        """公式格直接或間接參照到本次已改寫的儲存格時回傳 True (此時檔案中的快取值已過期)"""
+        raw = self._raw(ws, row, col)
+        if not (isinstance(raw, str) and raw.startswith("=")) or not any(self.edited.values()):
+            return False
+        key = (ws.title, row, col)
+        if key not in self._stale:
+            # 先標記為未過期，循環參照時不會無限遞迴
+            self._stale[key] = False
+            self._stale[key] = self._depends_on_edits(ws, raw)
+        return self._stale[key]
+
+    def summary_line(self):
+        """有公式時回傳執行紀錄用的統計文字，否則回傳 None"""
+        if not any(self.stats.values()):
+            return None
+        stale = f"，快取值已過期 {self.stats['stale']} 格" if self.stats["stale"] else ""
+        return (f"🧮 公式：計算 {self.stats['evaluated']} 格，使用檔案快取值 {self.stats['cached']} 格，"
+                f"無法取得值 {self.stats['failed']} 格{stale}")
+
+    # --- 內部 ---
+    def _compute(self, ws, row, col, raw):
+        """回傳 (值, 是否為計算結果)"""
+        try:
+            result = self._evaluate(ws, row, col, raw)
+            self.stats["evaluated"] += 1
+            return result, True
+        except (FormulaError, ArithmeticError, ValueError, OverflowError, TypeError, IndexError):
+            pass
+        cached = getattr(ws, "cached_values", {}).get((row, col))
+        if cached is None:
+            self.stats["failed"] += 1
+        elif self.is_stale(ws, row, col):
+            self.stats["stale"] += 1
+        else:
+            self.stats["cached"] += 1
+            return cached, False
+        return raw, False
+
+    def _depends_on_edits(self, ws, formula):
+        for token in Tokenizer(formula).items:
+            if token.type != Token.OPERAND or token.subtype != Token.RANGE:
+                continue
+            try:
+                ref = self._ref(ws, token.value, loaded_only=False)
+            except FormulaError:
+                # 名稱或整欄參照無法確定範圍，視為可能受影響
+                return True
+            min_row, min_col, max_row, max_col = ref.bounds
+            edited = self.edited.get(ref.ws.title) or ()
+            if any(min_row <= r <= max_row and min_col <= c <= max_col for r, c in edited):
+                return True
+            for r, c in self._formula_cells(ref.ws, ref.bounds):
+                if self.is_stale(ref.ws, r, c):
+                    return True
+        return False
+
+    def _formula_cells(self, ws, bounds):
+        """範圍內的公式格座標"""
+        min_row, min_col, max_row, max_col = bounds
+        cells = getattr(ws, "_cells", None)
+        if cells is None:
+            return
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > len(cells):
+            coords = [k for k in cells if min_row <= k[0] <= max_row and min_col <= k[1] <= max_col]
+        else:
+            coords = [(r, c) for r in range(min_row, max_row + 1) for c in range(min_col, max_col + 1)]
+        for r, c in coords:
+            cell = cells.get((r, c))
+            if cell is not None and isinstance(cell.value, str) and cell.value.startswith("="):
+                yield r, c
+
+    @staticmethod
+    def _raw(ws, row, col):
+        cells = getattr(ws, "_cells", None)
+        if cells is None:
+            # 唯讀 / 精簡值表格沒有 _cells
+            for values in ws.iter_rows(min_row=row, max_row=row, min_col=col, max_col=col, values_only=True):
+                return values[0] if values else None
+            return None
+        cell = cells.get((row, col))
+        return cell.value if cell is not None else None
+
+    def _evaluate(self, ws, row, col, formula):
+        key = (ws.title, row, col)
+        self._active.add(key)
+        try:
+            tokens = [t for t in Tokenizer(formula).items if t.type != Token.WSPACE]
+            parser = _Parser(self, ws, tokens)
+            result = parser.expression()
+            if parser.pos != len(tokens):
+                raise FormulaError("無法解析的公式")
+        finally:
+            self._active.discard(key)
+
+        if isinstance(result, _Ref):
+            result = self._scalar(result)
+        cell = getattr(ws, "_cells", {}).get((row, col))
+        if isinstance(result, (int, float)) and not isinstance(result, bool):
+            # 公式格的 data_type 是 "f"，cell.is_date 永遠為 False，直接看數字格式
+            if cell is not None and is_date_format(cell.number_format):
+                return from_excel(result)
+            if isinstance(result, float) and result.is_integer():
+                return int(result)
+        return result
+
+    def _cell(self, ws, row, col):
+        value = self.value(ws, row, col)
+        if isinstance(value, str) and value.startswith("="):
+            raise FormulaError(f"無法計算 {ws.title}!{row},{col}")
+        return value
+
+    def _scalar(self, ref):
+        min_row, min_col, max_row, max_col = ref.bounds
+        if (min_row, min_col) != (max_row, max_col):
+            raise FormulaError("#VALUE! (範圍不能當作單一值)")
+        return self._cell(ref.ws, min_row, min_col)
+
+    def _values(self, ref):
+        min_row, min_col, max_row, max_col = ref.bounds
+        for r in range(min_row, max_row + 1):
+            for c in range(min_col, max_col + 1):
+                yield self._cell(ref.ws, r, c)
+
+    def _datevalue(self, text):
+        m = _DATE_RE.match(_text(text))
+        if not m:
+            raise FormulaError(f"#VALUE! DATEVALUE({text!r})")
+        if not m.group(1):
+            raise FormulaError(f"DATEVALUE({text!r}) 沒有年份")
+        return _serial(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+
+    def _ref(self, ws, text, loaded_only=True):
+        if "!" in text:
+            sheet, text = text.rsplit("!", 1)
+            sheet = sheet.strip("'").replace("''", "'")
+            if sheet not in self.wb.sheetnames:
+                raise FormulaError(f"#REF! ({sheet})")
+            ws = self.wb[sheet]
+        # 只解析部分工作表時，未解析的工作表是空白佔位，不能當作真的空白格計算
+        if loaded_only and ws.title in (getattr(self.wb, "skipped_sheets", None) or ()):
+            raise FormulaError(f"工作表 '{ws.title}' 未載入")
+        try:
+            min_col, min_row, max_col, max_row = range_boundaries(text.replace("$", ""))
+        except (ValueError, TypeError):
+            raise FormulaError(f"不支援的參照 {text}")
+        if None in (min_col, min_row, max_col, max_row):
+            raise FormulaError(f"不支援整欄 / 整列參照 {text}")
+        return _Ref(ws, min_row, min_col, max_row, max_col)
+
+
+class _Parser:
+    """以 openpyxl 的 Tokenizer 切出的 token 做優先順序遞迴下降計算"""
+
+    def __init__(self, evaluator, ws, tokens):
+        self.ev = evaluator
+        self.ws = ws
+        self.tokens = tokens
+        self.pos = 0
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _next(self):
+        token = self._peek()
+        if token is None:
+            raise FormulaError("公式不完整")
+        self.pos += 1
+        return token
+
+    def _scalar(self, v):
+        return self.ev._scalar(v) if isinstance(v, _Ref) else v
+
+    def expression(self, min_prec=1):
+        left = self.unary()
+        while True:
+            token = self._peek()
+            if token is None or token.type != Token.OP_IN or token.value not in _INFIX:
+                return left
+            prec = _INFIX[token.value]
+            if prec < min_prec:
+                return left
+            self.pos += 1
+            right = self.expression(prec + 1)
+            left = self._infix(token.value, self._scalar(left), self._scalar(right))
+
+    def _infix(self, op, a, b):
+        if op == "&":
+            return _text(a) + _text(b)
+        if op in ("=", "<>", "<", ">", "<=", ">="):
+            return _compare(op, a, b)
+        a, b = _num(a), _num(b)
+        if op == "+":
+            return a + b
+        if op == "-":
+            return a - b
+        if op == "*":
+            return a * b
+        if op == "/":
+            if b == 0:
+                raise FormulaError("#DIV/0!")
+            return a / b
+        return a ** b
+
+    def unary(self):
+        token = self._peek()
+        if token is not None and token.type == Token.OP_PRE:
+            self.pos += 1
+            value = _num(self._scalar(self.unary()))
+            return -value if token.value == "-" else value
+        value = self.primary()
+        while self._peek() is not None and self._peek().type == Token.OP_POST:
+            self.pos += 1
+            value = _num(self._scalar(value)) / 100
+        return value
+
+    def primary(self):
+        token = self._next()
+        if token.type == Token.OPERAND:
+            if token.subtype == Token.NUMBER:
+                return float(token.value) if any(ch in token.value for ch in ".eE") else int(token.value)
+            if token.subtype == Token.TEXT:
+                return token.value[1:-1].replace('""', '"')
+            if token.subtype == Token.LOGICAL:
+                return token.value.upper() == "TRUE"
+            if token.subtype == Token.RANGE:
+                return self.ev._ref(self.ws, token.value)
+            raise FormulaError(f"錯誤值 {token.value}")
+
+        if token.type == Token.PAREN and token.subtype == Token.OPEN:
+            value = self.expression()
+            closing = self._next()
+            if closing.type != Token.PAREN:
+                raise FormulaError("括號不成對")
+            return value
+
+        if token.type == Token.FUNC and token.subtype == Token.OPEN:
+            name = token.value[:-1].upper()
+            if name == "IF":
+                return self._if()
+            func = self.ev._functions.get(name)
+            if func is None:
+                raise FormulaError(f"不支援的函數 {name}")
+            args = []
+            if not (self._peek() is not None and self._peek().type == Token.FUNC
+                    and self._peek().subtype == Token.CLOSE):
+                while True:
+                    args.append(self.expression())
+                    sep = self._next()
+                    if sep.type == Token.FUNC and sep.subtype == Token.CLOSE:
+                        break
+                    if sep.type != Token.SEP:
+                        raise FormulaError("函數參數格式錯誤")
+            else:
+                self.pos += 1
+            return func(*self._args(name, args))
+
+        raise FormulaError(f"不支援的語法 {token.value}")
+
+    def _if(self):
+        """IF(條件, 成立值, 不成立值)：只計算採用的分支，另一個分支只跳過 token"""
+        taken = bool(_num(self._scalar(self.expression())))
+        value = taken
+        branch = 0
+        while True:
+            sep = self._next()
+            if sep.type == Token.FUNC and sep.subtype == Token.CLOSE:
+                return value
+            if sep.type != Token.SEP or branch == 2:
+                raise FormulaError("函數參數格式錯誤")
+            branch += 1
+            if (branch == 1) == taken:
+                value = self._scalar(self.expression())
+            else:
+                self._skip_argument()
+
+    def _skip_argument(self):
+        """跳到同一層的下一個參數分隔或函數結尾"""
+        depth = 0
+        while True:
+            token = self._peek()
+            if token is None:
+                raise FormulaError("公式不完整")
+            if depth == 0 and (token.type == Token.SEP or
+                               (token.type == Token.FUNC and token.subtype == Token.CLOSE)):
+                return
+            if token.subtype == Token.OPEN:
+                depth += 1
+            elif token.subtype == Token.CLOSE:
+                depth -= 1
+            self.pos += 1
+
+    def _args(self, name, args):
+        # 彙總函數展開範圍，其他函數取單一值
+        if name in ("SUM", "MIN", "MAX"):
+            flat = []
+            for a in args:
+                if isinstance(a, _Ref):
+                    flat.extend(v for v in self.ev._values(a) if v is not None)
+                else:
+                    flat.append(a)
+            return flat
+        return [self._scalar(a) for a in args]
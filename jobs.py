@@ -0,0 +1,119 @@
+# jobs.py
+import multiprocessing
+import threading
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import output_writer
+import pipeline
+
+# 同時執行的 worker 數、可排隊的工作總數、保留的已完成結果數
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_JOBS = 4
+DEFAULT_KEEP_RESULTS = 20
+
+
+class JobRejected(Exception):
+    """排隊中的工作已達上限 (admission control)"""
+
+
+def _run_job(job_id, progress, src_bytes, src_name, tpl_bytes, target_date, engine, compression):
+    """在 worker 行程中執行單日流程，並把目前階段寫入共用的 progress"""
+    def report(stage):
+        progress[job_id] = stage
+
+    try:
+        return pipeline.run_daily(src_bytes, src_name, tpl_bytes, target_date, engine=engine,
+                                  cache=pipeline.worker_cache(), progress=report, compression=compression)
+    except Exception as e:
+        return False, None, [f"發生錯誤: {e}", traceback.format_exc()]
+    finally:
+        progress[job_id] = "done"
+
+
+class JobManager:
+    """
+    背景工作佇列：以行程池執行 Step 1 & 2 (避免 GIL 競爭)，
+    超過 max_jobs 個未完成工作時拒絕新工作，完成的結果可依 job id 取回
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, max_jobs=DEFAULT_MAX_JOBS, keep_results=DEFAULT_KEEP_RESULTS):
+        ctx = multiprocessing.get_context("spawn")
+        self.max_jobs = max_jobs
+        self.keep_results = keep_results
+        self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+        self._manager = ctx.Manager()
+        self._progress = self._manager.dict()
+        self._jobs = OrderedDict()   # job_id -> (Future, 說明)
+        self._lock = threading.Lock()
+
+    def active_count(self):
+        with self._lock:
+            return sum(1 for f, _ in self._jobs.values() if not f.done())
+
+    def submit(self, src_bytes, src_name, tpl_bytes, target_date, engine=pipeline.ENGINE_OPENPYXL, label="",
+               compression=output_writer.DEFAULT_COMPRESSION):
+        """送出工作並回傳 job id；排隊已滿時丟出 JobRejected"""
+        with self._lock:
+            active = sum(1 for f, _ in self._jobs.values() if not f.done())
+            if active >= self.max_jobs:
+                raise JobRejected(f"目前已有 {active} 個工作在執行或排隊，請稍後再試")
+
+            job_id = uuid.uuid4().hex[:12]
+            self._progress[job_id] = "queued"
+            future = self._executor.submit(_run_job, job_id, self._progress, src_bytes, src_name,
+                                           tpl_bytes, target_date, engine, compression)
+            self._jobs[job_id] = (future, label)
+            self._trim()
+        return job_id
+
+    def _trim(self):
+        """只保留最近 keep_results 個已完成的工作"""
+        done = [job_id for job_id, (f, _) in self._jobs.items() if f.done()]
+        for job_id in done[:max(0, len(done) - self.keep_results)]:
+            self._forget(job_id)
+
+    def _forget(self, job_id):
+        self._jobs.pop(job_id, None)
+        self._progress.pop(job_id, None)
+
+    def status(self, job_id):
+        """
+        回傳 {"state": queued/running/done/failed/unknown, "stage": 階段, "progress": 0~1, "label": 說明}
+        """
+        with self._lock:
+            entry = self._jobs.get(job_id)
+        if entry is None:
+            return {"state": "unknown", "stage": None, "progress": 0.0, "label": ""}
+
+        future, label = entry
+        stage = self._progress.get(job_id, "queued")
+        if future.done():
+            failed = future.exception() is not None or not future.result()[1]
+            return {"state": "failed" if failed else "done", "stage": "done", "progress": 1.0, "label": label}
+        if stage == "queued":
+            return {"state": "queued", "stage": stage, "progress": 0.0, "label": label}
+
+        idx = pipeline.STAGES.index(stage) if stage in pipeline.STAGES else len(pipeline.STAGES)
+        return {"state": "running", "stage": stage, "progress": idx / len(pipeline.STAGES), "label": label}
+
+    def result(self, job_id):
+        """工作完成時回傳 (是否成功, 結果位元組, 執行紀錄)，未完成或不存在時回傳 None"""
+        with self._lock:
+            entry = self._jobs.get(job_id)
+        if entry is None or not entry[0].done():
+            return None
+        future = entry[0]
+        if future.exception() is not None:
+            return False, None, [f"發生錯誤: {future.exception()}"]
+        return future.result()
+
+    def forget(self, job_id):
+        with self._lock:
+            self._forget(job_id)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._manager.shutdown()
@@ -0,0 +1,153 @@
+# layout_index.py
+import hashlib
+import re
+from collections import OrderedDict
+
+import task_plan
+
+# 已解析版面的快取筆數上限
+MAX_CACHED_LAYOUTS = 32
+
+_WIDTH_MAP = str.maketrans("（）", "()")
+_SPACE_RE = re.compile(r"\s+")
+
+# (計畫版本, 各工作表標籤欄雜湊) -> (已解析的 TaskPlan, 紀錄)
+_LAYOUT_CACHE = OrderedDict()
+
+
+def normalize_label(value):
+    """標籤比對用：去除空白、全形括號轉半形；非文字回傳 None"""
+    if not isinstance(value, str):
+        return None
+    text = _SPACE_RE.sub("", value.translate(_WIDTH_MAP))
+    return text or None
+
+def label_column(ws, col):
+    """讀取工作表某一欄的 (列, 標籤)；一般工作表直接查詢既有格子，不建立空白格"""
+    cells = getattr(ws, "_cells", None)
+    if cells is not None:
+        for row in range(1, ws.max_row + 1):
+            cell = cells.get((row, col))
+            label = normalize_label(cell.value) if cell is not None else None
+            if label:
+                yield row, label
+        return
+
+    for row, values in enumerate(ws.iter_rows(min_col=col, max_col=col, values_only=True), start=1):
+        label = normalize_label(values[0]) if values else None
+        if label:
+            yield row, label
+
+
+class SheetLabels:
+    """工作表一欄的 {標籤: [列...]}，以及該欄內容的雜湊值 (作為版面快取的 key)"""
+
+    def __init__(self, ws, col):
+        self.rows = {}
+        self.by_row = {}
+        digest = hashlib.sha256()
+        for row, label in label_column(ws, col):
+            self.rows.setdefault(label, []).append(row)
+            self.by_row[row] = label
+            digest.update(f"{row}\t{label}\n".encode("utf-8"))
+        self.hash = digest.hexdigest()[:16]
+
+    def find(self, label):
+        """回傳標籤所在的所有列 (完全相符，只忽略空白與全形 / 半形括號)"""
+        return self.rows.get(normalize_label(label), [])
+
+    def label_at(self, row):
+        """某一列的標籤 (正規化後)，空白時回傳 None"""
+        return self.by_row.get(row)
+
+
+def _labels_for(plan, sheets, sheet_attr, col_attr):
+    """每個 (工作表, 標籤欄) 只掃描一次，與任務數量無關"""
+    labels = {}
+    for ct in plan.tasks:
+        key = (getattr(ct, sheet_attr), getattr(ct, col_attr))
+        ws = sheets.get(key[0])
+        if key not in labels and ws is not None:
+            labels[key] = SheetLabels(ws, key[1])
+    return labels
+
+# (側別, 工作表, 標籤, 標籤列, 標籤欄)
+_SIDES = (("來源", "src_sheet", "src_key_label", "src_key_row", "src_key_col"),
+          ("目的", "dst_sheet", "dst_key_label", "dst_key_row", "dst_key_col"))
+
+def _check_dst_label(ct, dst_labels):
+    """
+    未設定 dst_key_label 的任務：目的區塊的標籤格與來源標籤不同時回傳警告文字 (不移動、不中止)
+    標籤格空白時不檢查 (目的工作表不一定有標籤)
+    """
+    if ct.dst_key_label or not ct.src_key_label or dst_labels is None:
+        return None
+    actual = dst_labels.label_at(ct.dst_key_row)
+    if actual is None or actual == normalize_label(ct.src_key_label):
+        return None
+    rows = dst_labels.find(ct.src_key_label)
+    where = f"，'{ct.src_key_label}' 位於第 {', '.join(map(str, rows))} 列" if rows else ""
+    return (f"⚠️ Task {ct.index+1}: 目的工作表 '{ct.dst_sheet}' 第 {ct.dst_key_row} 列的標籤是 '{actual}'，"
+            f"與來源區塊 '{ct.src_key_label}' 不同{where}；請確認目的位置或設定 dst_key_label")
+
+def resolve_plan(plan, src_sheets, dst_sheets):
+    """
+    依 src_key_label / dst_key_label 找出每個任務的來源 / 目的區塊實際所在的列，回傳 (調整後的 TaskPlan, 紀錄)
+    標籤與 src_key_cell / dst_key_cell 的列不同時，整個區塊 (日期列、值範圍) 一起移動；
+    未設定標籤的一側使用設定的位置，工作表不存在時交由 copy_by_mapping 回報；
+    未設定 dst_key_label 時，目的標籤格與來源標籤不同只記錄警告
+    標籤找不到、出現在多個列、或與其他任務對應到同一個區塊時丟出 ValueError (不猜測位置)
+    以計畫版本與各標籤欄的雜湊值快取結果，版面未變動時不重新解析
+    """
+    labels = {"來源": _labels_for(plan, src_sheets, "src_sheet", "src_key_col"),
+              "目的": _labels_for(plan, dst_sheets, "dst_sheet", "dst_key_col")}
+
+    cache_key = (plan.version,
+                 tuple(sorted((k, v.hash) for k, v in labels["來源"].items())),
+                 tuple(sorted((k, v.hash) for k, v in labels["目的"].items())))
+    cached = _LAYOUT_CACHE.get(cache_key)
+    if cached is not None:
+        _LAYOUT_CACHE.move_to_end(cache_key)
+        return cached
+
+    logs = []
+    claimed = {}    # (側別, 工作表, 標籤列) -> 任務 index
+    resolved = []
+    for ct in plan.tasks:
+        shifts = []
+        for side, sheet_attr, label_attr, row_attr, col_attr in _SIDES:
+            sheet, label, key_row = getattr(ct, sheet_attr), getattr(ct, label_attr), getattr(ct, row_attr)
+            sheet_labels = labels[side].get((sheet, getattr(ct, col_attr)))
+            if not label or sheet_labels is None:
+                shifts.append(0)
+                continue
+
+            rows = sheet_labels.find(label)
+            if not rows:
+                raise ValueError(f"Task {ct.index+1}: {side}工作表 '{sheet}' 找不到標籤 '{label}'")
+            if len(rows) > 1:
+                raise ValueError(f"Task {ct.index+1}: 標籤 '{label}' 在{side}工作表 '{sheet}' 出現在多列 "
+                                 f"({', '.join(map(str, rows))})，無法判斷區塊位置")
+            row = rows[0]
+            other = claimed.setdefault((side, sheet, row), ct.index)
+            if other != ct.index:
+                raise ValueError(f"Task {ct.index+1} 與 Task {other+1} 在{side}工作表 '{sheet}' "
+                                 f"對應到同一個區塊 (第 {row} 列 '{label}')")
+            if row != key_row:
+                logs.append(f"📍 Task {ct.index+1}: '{label}' 在{side}工作表 '{sheet}' 已由第 {key_row} 列移到第 {row} 列")
+            shifts.append(row - key_row)
+
+        moved = task_plan.shift(ct, *shifts)
+        warning = _check_dst_label(moved, labels["目的"].get((ct.dst_sheet, ct.dst_key_col)))
+        if warning:
+            logs.append(warning)
+        resolved.append(moved)
+
+    if any(a is not b for a, b in zip(resolved, plan.tasks)):
+        plan = task_plan.build_plan(plan.version, tuple(resolved))
+
+    result = (plan, logs)
+    _LAYOUT_CACHE[cache_key] = result
+    while len(_LAYOUT_CACHE) > MAX_CACHED_LAYOUTS:
+        _LAYOUT_CACHE.popitem(last=False)
+    return result
@@ -0,0 +1,120 @@
+# metrics.py
+import json
+import time
+import tracemalloc
+from datetime import datetime
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+
+class NullMetrics:
+    """關閉量測時使用：所有操作都是空的，不計時也不追蹤記憶體"""
+    enabled = False
+
+    def span(self, name, memory=False):
+        return _NULL_SPAN
+
+    def count(self, name, n=1):
+        pass
+
+NULL_METRICS = NullMetrics()
+
+
+class _Span:
+    def __init__(self, metrics, name, memory):
+        self.metrics = metrics
+        self.name = name
+        self.memory = memory and metrics.memory
+
+    def __enter__(self):
+        if self.memory:
+            self.metrics._push_memory(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        peak = self.metrics._pop_memory(self) if self.memory else None
+        self.metrics.spans.append({"name": self.name, "seconds": seconds, "peak_bytes": peak})
+        return False
+
+
+class Metrics:
+    """
+    執行量測：span() 記錄各階段時間 (memory=True 時以 tracemalloc 記錄記憶體峰值)，
+    count() 累計讀取/寫入/跳過的儲存格數
+    """
+    enabled = True
+
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.spans = []
+        self.counts = {}
+        self._memory_stack = []
+        self._started_tracing = False
+
+    def span(self, name, memory=False):
+        return _Span(self, name, memory)
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    # --- 記憶體 (允許巢狀 span，內層 reset_peak 前先把峰值記到外層) ---
+    def _push_memory(self, span):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        current, peak = tracemalloc.get_traced_memory()
+        for outer in self._memory_stack:
+            outer.max_peak = max(outer.max_peak, peak)
+        tracemalloc.reset_peak()
+        span.base = current
+        span.max_peak = current
+        self._memory_stack.append(span)
+
+    def _pop_memory(self, span):
+        _, peak = tracemalloc.get_traced_memory()
+        for s in self._memory_stack:
+            s.max_peak = max(s.max_peak, peak)
+        self._memory_stack.pop()
+        if not self._memory_stack and self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        return span.max_peak - span.base
+
+    # --- 輸出 ---
+    def summary(self):
+        """依 span 名稱彙總 (同名 span 的時間相加)"""
+        rows = {}
+        for s in self.spans:
+            row = rows.setdefault(s["name"], {"階段": s["name"], "次數": 0, "時間 (ms)": 0.0, "記憶體峰值 (MB)": None})
+            row["次數"] += 1
+            row["時間 (ms)"] += s["seconds"] * 1000
+            if s["peak_bytes"] is not None:
+                mb = s["peak_bytes"] / 1024 / 1024
+                row["記憶體峰值 (MB)"] = max(row["記憶體峰值 (MB)"] or 0, mb)
+        for row in rows.values():
+            row["時間 (ms)"] = round(row["時間 (ms)"], 2)
+            if row["記憶體峰值 (MB)"] is not None:
+                row["記憶體峰值 (MB)"] = round(row["記憶體峰值 (MB)"], 2)
+        return list(rows.values())
+
+    def to_record(self, **extra):
+        record = {"ts": datetime.now().isoformat(timespec="seconds")}
+        record.update({k: str(v) for k, v in extra.items()})
+        record["spans"] = self.spans
+        record["counts"] = self.counts
+        return record
+
+    def write_jsonl(self, path, **extra):
+        """附加一行 JSON 到 path，方便跨日彙整"""
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.to_record(**extra), ensure_ascii=False) + "\n")
@@ -0,0 +1,81 @@
+# output_writer.py
+"""
+結果檔序列化：
+- 壓縮等級預設：fast / balanced / smallest (zip deflate 等級 1 / 6 / 9)
+- 輸出超過門檻時改寫入暫存檔，不佔用記憶體；下載時才從暫存檔讀出
+- 存檔後立即釋放 openpyxl 的儲存格物件，活頁簿與 zip 不會同時留在記憶體
+"""
+import tempfile
+import zipfile
+from datetime import datetime, timezone
+
+from openpyxl.writer.excel import ExcelWriter
+
+COMPRESSION_PRESETS = {"fast": 1, "balanced": 6, "smallest": 9}
+DEFAULT_COMPRESSION = "balanced"
+
+# 輸出超過此大小時改寫入暫存檔
+SPOOL_THRESHOLD = 8 * 1024 * 1024
+
+
+def compress_level(compression=DEFAULT_COMPRESSION):
+    """預設名稱或 0~9 的數字轉為 deflate 等級；不合法時丟出 ValueError"""
+    if compression in COMPRESSION_PRESETS:
+        return COMPRESSION_PRESETS[compression]
+    level = int(compression)
+    if not 0 <= level <= 9:
+        raise ValueError(f"壓縮等級必須是 {' / '.join(COMPRESSION_PRESETS)} 或 0~9：{compression}")
+    return level
+
+def new_buffer(threshold=None):
+    """輸出用的檔案物件：小於 threshold (預設 SPOOL_THRESHOLD) 時在記憶體，超過時自動改寫入暫存檔"""
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_THRESHOLD if threshold is None else threshold)
+
+def on_disk(buffer):
+    """buffer 是否已改寫入暫存檔"""
+    return bool(getattr(buffer, "_rolled", False))
+
+def size_of(buffer):
+    pos = buffer.tell()
+    buffer.seek(0, 2)
+    size = buffer.tell()
+    buffer.seek(pos)
+    return size
+
+def read_bytes(buffer):
+    """讀出完整內容並關閉 buffer (結果快取、背景工作等需要位元組時使用)"""
+    buffer.seek(0)
+    data = buffer.read()
+    buffer.close()
+    return data
+
+def download(buffer):
+    """
+    st.download_button 的 data：回傳不帶參數的函式，使用者按下下載時才從 buffer 讀出內容
+    (頁面每次 rerun 不必把整個結果檔複製到記憶體；Streamlit 送出檔案時仍需要完整的位元組)
+    """
+    def data():
+        buffer.seek(0)
+        return buffer.read()
+    return data
+
+def save_workbook(wb, out, compression=DEFAULT_COMPRESSION):
+    """與 wb.save() 相同，但可指定壓縮等級"""
+    level = compress_level(compression)
+    wb.properties.modified = datetime.now(tz=timezone.utc).replace(tzinfo=None)
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED, allowZip64=True, compresslevel=level) as archive:
+        ExcelWriter(wb, archive).write_data()
+
+def release(wb):
+    """釋放活頁簿的儲存格物件 (存檔後呼叫，之後活頁簿不可再使用)"""
+    for ws in wb.worksheets:
+        for attr in ("_cells", "cached_values"):
+            cells = getattr(ws, attr, None)
+            if cells is not None:
+                cells.clear()
+
+def report_line(buffer, seconds, compression):
+    size = size_of(buffer)
+    where = "，已暫存至磁碟" if on_disk(buffer) else ""
+    return f"💾 輸出 {size / 1024:,.0f} KB (壓縮：{compression})，存檔 {seconds:.2f} 秒{where}"
+
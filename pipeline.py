@@ -0,0 +1,204 @@
+# pipeline.py
+import io
+import time
+
+import daily_copy_task
+import daily_single_1
+import output_writer
+import rollup
+import run_dailyCopy_2
+import source_loader
+import template_cache
+import template_loader
+import xml_patch_writer
+from metrics import NULL_METRICS
+from write_plan import WritePlan
+
+# 輸出方式
+ENGINE_OPENPYXL = "openpyxl"
+ENGINE_PATCH = "patch"
+
+# 執行階段 (供進度回報使用，依執行順序)
+STAGES = ("load_file", "template_load", "step1", "step2", "step3", "save")
+
+# worker 行程自己的模板快取上限 (行程間不共用)
+WORKER_CACHE_BYTES = 64 * 1024 * 1024
+_worker_cache = None
+
+def _no_progress(stage):
+    pass
+
+def worker_cache():
+    """行程內共用的模板快取 (供背景工作 / 批次的 worker 使用)"""
+    global _worker_cache
+    if _worker_cache is None:
+        _worker_cache = template_cache.TemplateCache(max_bytes=WORKER_CACHE_BYTES)
+    return _worker_cache
+
+def date_index(calendar=None):
+    """Step 2 的日期欄位索引；有日曆索引檔時以它預先填入"""
+    return daily_copy_task.DateColumnIndex(preset=calendar.rows if calendar is not None else None)
+
+def load_template(tpl_bytes, selective=False, cache=None):
+    """
+    載入模板，回傳 (活頁簿, 紀錄文字或 None)
+    selective=True 時只解析流程會用到的工作表 (搭配 XML 局部修補輸出)
+    cache: TemplateCache，未提供時直接解析
+    """
+    sheet_names = None
+    if selective:
+        sheet_names = template_loader.template_required_sheets(tpl_bytes)
+
+    if cache is None:
+        return template_cache.load_template(tpl_bytes, sheet_names), None
+
+    wb, hit = cache.load(tpl_bytes, sheet_names)
+    status = "命中" if hit else "未命中"
+    return wb, f"{cache.stats_line()} (本次{status})"
+
+def save_output(wb_dst, tpl_bytes, dirty, engine=ENGINE_OPENPYXL, cache=None,
+                compression=output_writer.DEFAULT_COMPRESSION, release=False):
+    """
+    輸出結果檔，回傳 (檔案物件, 紀錄列表)
+    XML 局部修補：只重寫有異動的工作表，其餘 zip 成員原樣搬移；模板不支援時改用完整存檔
+    dirty 中沒有任何變動的儲存格時，直接沿用模板檔，不重新序列化
+    compression: 壓縮等級 (fast / balanced / smallest 或 0~9)
+    release: 存檔後釋放 wb_dst 的儲存格物件 (之後不可再使用)
+    """
+    if dirty is not None and not any(dirty.values()):
+        if release:
+            output_writer.release(wb_dst)
+        return io.BytesIO(tpl_bytes), ["♻️ 本次沒有任何儲存格變動，直接沿用模板檔 (略過存檔)"]
+
+    level = output_writer.compress_level(compression)
+    output = output_writer.new_buffer()
+    logs = []
+    saved = False
+    t0 = time.perf_counter()
+
+    if engine == ENGINE_PATCH:
+        edits = xml_patch_writer.collect_edits(wb_dst, dirty)
+        try:
+            info = xml_patch_writer.write_patched(io.BytesIO(tpl_bytes), edits, output, compresslevel=level)
+            logs.append(f"📝 局部修補輸出：重寫 {info['sheets']} 張工作表，新增 {info['new_strings']} 個共用字串")
+            saved = True
+        except xml_patch_writer.PatchError as e:
+            output.close()
+            output = output_writer.new_buffer()
+            logs.append(f"⚠️ 無法局部修補 ({e})，改用完整存檔")
+
+            # 只解析部分工作表的活頁簿不能直接存檔：改載入完整模板並套用異動
+            if getattr(wb_dst, "skipped_sheets", None):
+                if release:
+                    output_writer.release(wb_dst)
+                wb_dst, _ = load_template(tpl_bytes, cache=cache)
+                template_loader.apply_edits(wb_dst, edits)
+
+    if not saved:
+        output_writer.save_workbook(wb_dst, output, level)
+    if release:
+        output_writer.release(wb_dst)
+
+    output.seek(0)
+    logs.append(output_writer.report_line(output, time.perf_counter() - t0, compression))
+    return output, logs
+
+def run_daily(src_bytes, src_name, tpl_bytes, target_date, engine=ENGINE_OPENPYXL,
+              cache=None, metrics=NULL_METRICS, progress=_no_progress, counts=None, calendar=None,
+              compression=output_writer.DEFAULT_COMPRESSION):
+    """
+    執行單日的 Step 1 & 2 (及 Step 3 週月統計) 並輸出結果
+    progress: 每個階段開始時以階段名稱呼叫
+    counts: 若提供 dict，會寫入 Step 2 的 {"success": 成功項數, "failed": 失敗項數, "dates": 實際寫入的日期}
+    calendar: 模板的 CalendarIndex (日曆索引檔)，提供時 Step 2 不必掃描日期列
+    compression: 輸出的壓縮等級 (fast / balanced / smallest)
+    回傳 (是否成功, 結果 xlsx 位元組, 執行紀錄)
+    """
+    logs = []
+
+    progress("load_file")
+    with metrics.span("load_file", memory=True):
+        wb_src = source_loader.load_source(io.BytesIO(src_bytes), src_name)
+
+    progress("template_load")
+    with metrics.span("template_load", memory=True):
+        wb_dst, cache_msg = load_template(tpl_bytes, selective=engine == ENGINE_PATCH, cache=cache)
+    if cache_msg:
+        logs.append(cache_msg)
+
+    dirty = {}
+
+    # --- 執行 Step 1 ---
+    progress("step1")
+    with metrics.span("step1", memory=True):
+        ok1, msg1 = daily_single_1.run_step(wb_src, wb_dst, dirty=dirty, metrics=metrics)
+    wb_src.close()
+    logs.append(msg1)
+
+    # --- 執行 Step 2 ---
+    # 🔑 傳入 target_date 解決無法讀取公式日期的問題
+    ok2 = False
+    if counts is None:
+        counts = {}
+    if ok1:
+        index = date_index(calendar)
+        progress("step2")
+        with metrics.span("step2", memory=True):
+            ok2, msg2 = run_dailyCopy_2.run_step(wb_dst, wb_dst, target_date=target_date,
+                                                 date_index=index,
+                                                 dirty=dirty, metrics=metrics, counts=counts)
+
+        if isinstance(msg2, list):
+            logs.extend(msg2)
+        else:
+            logs.append(str(msg2))
+
+        # --- 執行 Step 3：只重算 Step 2 實際寫入的日期所在的週 / 月 (可能與 target_date 不同) ---
+        progress("step3")
+        with metrics.span("step3", memory=True):
+            _, msg3 = rollup.run_step(wb_dst, counts.get("dates", []), date_index=index, dirty=dirty,
+                                      metrics=metrics)
+        logs.append(msg3)
+
+    # 存檔後立即釋放活頁簿，再讀出結果位元組
+    progress("save")
+    with metrics.span("save", memory=True):
+        output, save_logs = save_output(wb_dst, tpl_bytes, dirty, engine, cache=cache,
+                                        compression=compression, release=True)
+        del wb_dst
+        data = output_writer.read_bytes(output)
+    logs.extend(save_logs)
+
+    return ok1 and ok2, data, logs
+
+def plan_daily(src_bytes, src_name, tpl_bytes, target_date, cache=None, counts=None, calendar=None):
+    """
+    試算 (dry-run)：執行 Step 1 & 2 但只記錄每格的 舊值 → 新值，不存檔
+    只解析流程會用到的工作表；Step 1 的變動只套用在記憶體中的工作副本上，供 Step 2 試算使用
+    回傳 (是否成功, WritePlan, 執行紀錄)
+    """
+    logs = []
+    plan = WritePlan()
+
+    wb_src = source_loader.load_source(io.BytesIO(src_bytes), src_name)
+    wb_dst, cache_msg = load_template(tpl_bytes, selective=True, cache=cache)
+    if cache_msg:
+        logs.append(cache_msg)
+
+    ok1, msg1 = daily_single_1.run_step(wb_src, wb_dst, write_plan=plan)
+    wb_src.close()
+    logs.append(msg1)
+
+    ok2 = False
+    if ok1:
+        # Step 2 的來源公式參照 Step 1 寫入的工作表：先把 Step 1 的變動套用到這份不存檔的工作副本，
+        # Step 2 才會以本次的資料試算 (與實際執行相同)
+        dirty = {}
+        plan.apply(wb_dst, dirty)
+        ok2, msg2 = run_dailyCopy_2.run_step(wb_dst, wb_dst, target_date=target_date,
+                                             date_index=date_index(calendar), dirty=dirty, counts=counts,
+                                             write_plan=plan)
+        logs.extend(msg2)
+
+    logs.append(plan.summary_line())
+    return ok1 and ok2, plan, logs
@@ -0,0 +1,142 @@
+# result_cache.py
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import daily_single_1
+import output_writer
+import pipeline
+import rollup
+import run_dailyCopy_2
+
+# 快取上限 (結果檔位元組數)
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+
+def pipeline_version():
+    """Step 1 範圍、Step 2 對應表與 Step 3 彙總表的版本，任一變動都會讓舊結果失效"""
+    return f"{daily_single_1.SOURCE_RANGE}|{run_dailyCopy_2.PLAN_VERSION}|{rollup.ROLLUP_VERSION}"
+
+def result_key(src_bytes, src_name, tpl_bytes, target_date, engine=pipeline.ENGINE_OPENPYXL,
+               compression=output_writer.DEFAULT_COMPRESSION, version=None):
+    """
+    以 (來源雜湊, 模板雜湊, 日期, 輸出方式, 壓縮等級, 對應表版本) 組成結果快取 key
+    輸出方式與壓縮等級不同時結果檔的位元組也不同，不能共用
+    """
+    if version is None:
+        version = pipeline_version()
+    h = hashlib.sha256()
+    for part in (hashlib.sha256(src_bytes).hexdigest(),
+                 os.path.splitext(src_name)[1].lower(),
+                 hashlib.sha256(tpl_bytes).hexdigest(),
+                 str(target_date),
+                 engine,
+                 str(output_writer.compress_level(compression)),
+                 version):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    產出結果的快取：key → (Result xlsx 位元組, 執行紀錄)
+    directory 為 None 時存在記憶體，否則存成本機檔案；總大小超過 max_bytes 時依 LRU 淘汰
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()   # key -> 位元組數 (記憶體模式時為 (data, logs))
+        self._size = 0
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._scan_directory()
+
+    def _paths(self, key):
+        return (os.path.join(self.directory, f"{key}.xlsx"),
+                os.path.join(self.directory, f"{key}.json"))
+
+    def _scan_directory(self):
+        """載入既有的快取檔，依修改時間排出 LRU 順序"""
+        found = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".xlsx"):
+                path = os.path.join(self.directory, name)
+                found.append((os.path.getmtime(path), name[:-5], os.path.getsize(path)))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._size += size
+        self._evict()
+
+    def get(self, key):
+        """命中時回傳 (data, logs)，否則回傳 None"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            if not self.directory:
+                return self._entries[key][1]
+
+        data_path, log_path = self._paths(key)
+        try:
+            with open(data_path, "rb") as f:
+                data = f.read()
+            with open(log_path, encoding="utf-8") as f:
+                logs = json.load(f)
+            os.utime(data_path)
+        except OSError:
+            # 檔案被外部刪除時視為未命中
+            with self._lock:
+                self._drop(key)
+                self.hits -= 1
+                self.misses += 1
+            return None
+        return data, logs
+
+    def put(self, key, data, logs):
+        size = len(data)
+        if size > self.max_bytes:
+            return
+        if self.directory:
+            data_path, log_path = self._paths(key)
+            with open(log_path, "w", encoding="utf-8") as f:
+                json.dump(list(logs), f, ensure_ascii=False)
+            with open(data_path, "wb") as f:
+                f.write(data)
+
+        with self._lock:
+            if key in self._entries:
+                self._drop(key, remove_files=False)
+            self._entries[key] = size if self.directory else (size, (data, list(logs)))
+            self._size += size
+            self._evict()
+
+    def _entry_size(self, entry):
+        return entry if self.directory else entry[0]
+
+    def _drop(self, key, remove_files=True):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._size -= self._entry_size(entry)
+        if self.directory and remove_files:
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._entries:
+            self._drop(next(iter(self._entries)))
+
+    def stats_line(self):
+        return (f"♻️ 結果快取：命中 {self.hits} 次，未命中 {self.misses} 次，"
+                f"快取 {len(self._entries)} 份 ({self._size / 1024 / 1024:.1f} MB)")
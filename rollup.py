@@ -0,0 +1,341 @@
+# rollup.py
+"""
+Step 3 週 / 月彙總：把 日統計 / 無上網日統計 各區塊的每日歷史讀成 (區塊 x 列 x 日) 陣列，
+以向量運算算出每週、每月與近 7 日的合計，寫成 週月統計 工作表的靜態值 (不使用公式)
+- 流量指標 (新裝、拆機…) 取期間加總；存量指標 (累計客戶數) 取期間內最後一天的值
+- 增量更新：只讀取、重算本次寫入日期所在的週 / 月 (及近 7 日)，其他期間的欄位不動
+- 近 7 日一律截至最後一個有資料的日子 (增量與全部重算規則相同)
+"""
+import re
+from collections import namedtuple
+from datetime import date, timedelta
+
+import numpy as np
+
+import block_extract
+import daily_copy_task
+import layout_index
+import run_dailyCopy_2
+import task_plan
+from metrics import NULL_METRICS
+from write_plan import same_value
+
+ROLLUP_SHEET = "週月統計"
+ROLLUP_VERSION = 1
+
+# 以 A1 的標記判斷工作表是否由目前版本產生 (不同時全部重算)
+MARKER = f"週月統計 (Step 3 自動產生 v{ROLLUP_VERSION}，請勿手動修改)"
+
+# 標籤以此開頭的區塊是存量指標
+STOCK_PREFIX = "累計"
+
+ROLLING_DAYS = 7
+
+# 版面：第 1 列為標題列 (A 標記、B 近 7 日、C 起為各期間)，區塊由第 3 列開始，區塊間空一列
+HEADER_ROW = 1
+ROLLING_COL = 2
+FIRST_PERIOD_COL = 3
+FIRST_BLOCK_ROW = 3
+
+_ROLLING_RE = re.compile(r"^近\d+日 \(截至 (\d{4}-\d{2}-\d{2})\)$")
+
+# 彙總表中的一個區塊：header_row 為區塊標題列，資料由下一列開始
+Block = namedtuple("Block", ["task", "label", "stock", "header_row", "height"])
+
+
+# -----------------
+# 期間
+# -----------------
+def month_period(d):
+    """回傳 (標籤, 起日, 迄日)"""
+    start = d.replace(day=1)
+    end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return f"{d.year}-{d.month:02d}", start, end
+
+def week_period(d):
+    """ISO 週 (週一 ~ 週日)，回傳 (標籤, 起日, 迄日)"""
+    year, week, _ = d.isocalendar()
+    start = d - timedelta(days=d.weekday())
+    return f"{year}-W{week:02d}", start, start + timedelta(days=6)
+
+PERIOD_KINDS = (month_period, week_period)
+
+def rolling_label(end):
+    return f"近{ROLLING_DAYS}日 (截至 {end.isoformat()})"
+
+
+# -----------------
+# 讀取歷史
+# -----------------
+def layout(plan):
+    """依任務順序排出彙總表中每個區塊的位置"""
+    blocks = []
+    row = FIRST_BLOCK_ROW
+    for ct in plan.tasks:
+        height = ct.src_max_row - ct.src_min_row + 1
+        label = ct.dst_key_label or ct.src_key_label or f"Task {ct.index+1}"
+        blocks.append(Block(ct, label, label.startswith(STOCK_PREFIX), row, height))
+        row += height + 2
+    return blocks
+
+def _as_float(v):
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return float(v)
+    return np.nan
+
+_to_float = np.frompyfunc(_as_float, 1, 1)
+
+def _read_block(ws, rows, cols):
+    """讀取 rows x cols 的值 (object 陣列)；一般工作表直接查詢既有格子，不建立空白格"""
+    cells = getattr(ws, "_cells", None)
+    if cells is None:
+        arr = block_extract.load_sheet_columns(ws, rows[0], rows[-1], min(cols), max(cols))
+        return arr[:, np.asarray(cols) - min(cols)]
+    out = np.empty((len(rows), len(cols)), dtype=object)
+    for i, r in enumerate(rows):
+        for k, c in enumerate(cols):
+            cell = cells.get((r, c))
+            out[i, k] = cell.value if cell is not None else None
+    return out
+
+def load_history(blocks, dst_sheets, date_index, date_from=None, date_to=None):
+    """
+    讀取各區塊在 [date_from, date_to] 之間的每日值
+    回傳 (days, values)：days 為排序後的日期列表，values 為 (區塊 x 列 x 日) 的 float 陣列，空白或非數字為 NaN
+    """
+    mappings = []
+    for b in blocks:
+        ws = dst_sheets.get(b.task.dst_sheet)
+        mapping = date_index.mapping(ws, b.task.dst_date_row) if ws is not None else {}
+        mappings.append({d: col for d, col in mapping.items()
+                         if (date_from is None or d >= date_from) and (date_to is None or d <= date_to)})
+
+    days = sorted({d for m in mappings for d in m})
+    day_pos = {d: k for k, d in enumerate(days)}
+    height = max((b.height for b in blocks), default=0)
+    values = np.full((len(blocks), height, len(days)), np.nan)
+
+    for n, (b, mapping) in enumerate(zip(blocks, mappings)):
+        if not mapping:
+            continue
+        ct = b.task
+        start = ct.dst_date_row + ct.dst_row_offset
+        block_days = sorted(mapping)
+        raw = _read_block(dst_sheets[ct.dst_sheet], list(range(start, start + b.height)),
+                          [mapping[d] + ct.dst_col_offset for d in block_days])
+        values[n, :b.height][:, [day_pos[d] for d in block_days]] = _to_float(raw).astype(float)
+    return days, values
+
+
+# -----------------
+# 彙總 (向量運算)
+# -----------------
+def aggregate(values, stock, starts):
+    """
+    依日軸上連續的期間彙總 values (區塊 x 列 x 日)
+    stock: 每個區塊是否為存量指標 (取期間內最後一個有值的日子，否則加總)
+    starts: 各期間在日軸上的起點 (遞增)
+    回傳 (區塊 x 列 x 期間)，期間內完全沒有資料時為 NaN
+    """
+    n_days = values.shape[2]
+    starts = np.asarray(starts, dtype=np.intp)
+    ends = np.append(starts[1:], n_days) - 1
+
+    valid = ~np.isnan(values)
+    total = np.add.reduceat(np.where(valid, values, 0.0), starts, axis=2)
+    count = np.add.reduceat(valid.astype(np.int32), starts, axis=2)
+
+    # 每一天之前 (含) 最後一個有值的位置，取各期間最後一天的
+    last_pos = np.maximum.accumulate(np.where(valid, np.arange(n_days), 0), axis=2)[:, :, ends]
+    last = np.take_along_axis(values, last_pos, axis=2)
+
+    out = np.where(np.asarray(stock, dtype=bool)[:, None, None], last, total)
+    out[count == 0] = np.nan
+    return out
+
+def period_groups(days, kind):
+    """把排序後的 days 依期間分組，回傳 [(標籤, 起日, 迄日)] 與各組在日軸上的起點"""
+    periods, starts = [], []
+    for k, d in enumerate(days):
+        period = kind(d)
+        if not periods or periods[-1][0] != period[0]:
+            periods.append(period)
+            starts.append(k)
+    return periods, starts
+
+def last_data_day(days, values):
+    """最後一個有任何資料的日子，沒有資料時回傳 None"""
+    has_data = np.flatnonzero(~np.isnan(values).all(axis=(0, 1)))
+    return days[has_data[-1]] if len(has_data) else None
+
+def _cell_value(v):
+    if np.isnan(v):
+        return None
+    v = float(v)
+    return int(v) if v.is_integer() else round(v, 6)
+
+
+# -----------------
+# 寫入
+# -----------------
+class _Writer:
+    """只寫入有變動的格子，並記錄到 dirty"""
+
+    def __init__(self, ws, written):
+        self.ws = ws
+        self.written = written
+        self.changed = 0
+
+    def get(self, row, col):
+        cell = self.ws._cells.get((row, col))
+        return cell.value if cell is not None else None
+
+    def put(self, row, col, value):
+        if same_value(self.get(row, col), value):
+            return
+        # ws.cell(value=None) 不會清空格子，必須直接指定 .value
+        self.ws.cell(row=row, column=col).value = value
+        self.changed += 1
+        if self.written is not None:
+            self.written.add((row, col))
+
+def _period_columns(writer, labels):
+    """依標題列找出各期間的欄位；新的期間依序接在最後一欄之後"""
+    existing = {}
+    for (row, col), cell in writer.ws._cells.items():
+        if row == HEADER_ROW and col >= FIRST_PERIOD_COL and isinstance(cell.value, str):
+            existing.setdefault(cell.value, col)
+    next_col = max(list(existing.values()) + [FIRST_PERIOD_COL - 1]) + 1
+    columns = {}
+    for label in labels:
+        if label not in existing:
+            existing[label] = next_col
+            next_col += 1
+        columns[label] = existing[label]
+    return columns
+
+def _write_labels(writer, blocks, dst_sheets):
+    """區塊標題與每列的名稱 (取自來源工作表標籤欄)"""
+    for b in blocks:
+        ct = b.task
+        writer.put(b.header_row, 1, f"{ct.dst_sheet}｜{b.label}")
+        ws = dst_sheets.get(ct.dst_sheet)
+        start = ct.dst_date_row + ct.dst_row_offset
+        for i in range(b.height):
+            name = ws._cells.get((start + i, ct.dst_key_col)) if ws is not None else None
+            name = name.value if name is not None else None
+            writer.put(b.header_row + 1 + i, 1, name if name is not None else f"第 {i+1} 列")
+
+def _write_column(writer, blocks, col, agg):
+    """agg: (區塊 x 列) 的彙總值"""
+    for n, b in enumerate(blocks):
+        for i in range(b.height):
+            writer.put(b.header_row + 1 + i, col, _cell_value(agg[n, i]))
+
+
+def run_step(wb, target_dates=None, date_index=None, dirty=None, metrics=NULL_METRICS, tasks=None):
+    """
+    Step 3 主程式：更新 週月統計 工作表 (不存在時建立)
+    target_dates: Step 2 實際寫入的日期；None 或工作表是舊版 / 新建時全部重算，空列表表示沒有需要更新的期間
+    date_index: 與 Step 2 共用的 DateColumnIndex
+    dirty: 記錄寫入儲存格的 dict (供局部修補輸出使用)
+    回傳 (是否成功, 訊息)
+    """
+    if date_index is None:
+        date_index = daily_copy_task.DateColumnIndex()
+
+    try:
+        plan = task_plan.compile_tasks(tasks if tasks is not None else run_dailyCopy_2.TASKS)
+        src_sheets = {name: daily_copy_task.resolve_sheet(wb, name, fuzzy=True) for name in plan.src_sheets}
+        dst_sheets = {name: daily_copy_task.resolve_sheet(wb, name) for name in plan.dst_sheets}
+        plan, _ = layout_index.resolve_plan(plan, src_sheets, dst_sheets)
+    except ValueError as e:
+        return False, f"❌ Step 3 版面對應錯誤: {str(e)}"
+
+    if not any(dst_sheets.values()):
+        return False, f"⚠️ Step 3 略過：找不到 {' / '.join(plan.dst_sheets)} 工作表"
+
+    blocks = layout(plan)
+    stock = [b.stock for b in blocks]
+
+    ws = wb[ROLLUP_SHEET] if ROLLUP_SHEET in wb.sheetnames else wb.create_sheet(ROLLUP_SHEET)
+    writer = _Writer(ws, dirty.setdefault(ws.title, set()) if dirty is not None else None)
+
+    targets = sorted({daily_copy_task.to_date(d) for d in target_dates or ()} - {None})
+    m = _ROLLING_RE.match(str(writer.get(HEADER_ROW, ROLLING_COL) or ""))
+    rolling_end = date.fromisoformat(m.group(1)) if m else None
+    full = target_dates is None or writer.get(HEADER_ROW, 1) != MARKER
+    if not full and not targets:
+        return True, "✅ Step 3 週月統計：本次沒有寫入任何日期，略過"
+
+    # 1. 決定要重算的期間與讀取的日期範圍
+    update_rolling = full
+    if full:
+        touched = None
+        date_from = date_to = None
+    else:
+        touched = {kind(d)[0] for d in targets for kind in PERIOD_KINDS}
+        bounds = [kind(d)[1:] for d in targets for kind in PERIOD_KINDS]
+        # 寫入的日期在目前近 7 日之內或之後時才需要重算 (寫入的可能是空白，結尾日可能往前移)
+        end = max(targets[-1], rolling_end) if rolling_end else targets[-1]
+        update_rolling = rolling_end is None or targets[-1] > rolling_end - timedelta(days=ROLLING_DAYS)
+        if update_rolling:
+            bounds.append((end - timedelta(days=ROLLING_DAYS - 1), end))
+        date_from = min(start for start, _ in bounds)
+        date_to = max(end for _, end in bounds)
+
+    with metrics.span("step3.load"):
+        days, values = load_history(blocks, dst_sheets, date_index, date_from, date_to)
+
+    rolling_end = None
+    if full or update_rolling:
+        rolling_end = last_data_day(days, values)
+        # 最後有資料的日子往前移到讀取範圍之外：改讀完整歷史 (與全部重算相同)
+        if not full and (rolling_end is None or rolling_end - timedelta(days=ROLLING_DAYS - 1) < date_from):
+            with metrics.span("step3.load"):
+                days, values = load_history(blocks, dst_sheets, date_index, None, date_to)
+            rolling_end = last_data_day(days, values)
+    # 補跑較舊的日期時近 7 日不受影響
+    metrics.count("step3.days", len(days))
+
+    # 2. 各期間彙總
+    results = []        # [(標籤, 起日, (區塊 x 列) 彙總值)]
+    with metrics.span("step3.aggregate"):
+        if days:
+            for kind in PERIOD_KINDS:
+                periods, starts = period_groups(days, kind)
+                agg = aggregate(values, stock, starts)
+                for k, (label, start, _) in enumerate(periods):
+                    if touched is None or label in touched:
+                        results.append((label, start, agg[:, :, k]))
+
+        rolling = None
+        if update_rolling and rolling_end is None:
+            # 完全沒有資料：清空近 7 日欄位
+            rolling = np.full((len(blocks), max((b.height for b in blocks), default=0)), np.nan)
+        elif rolling_end is not None:
+            in_window = [k for k, d in enumerate(days)
+                         if rolling_end - timedelta(days=ROLLING_DAYS) < d <= rolling_end]
+            if in_window:
+                rolling = aggregate(values[:, :, in_window], stock, [0])[:, :, 0]
+            else:
+                rolling = np.full(values.shape[:2], np.nan)
+
+    # 3. 寫入 (月在週之前，依起日排序)
+    with metrics.span("step3.write"):
+        writer.put(HEADER_ROW, 1, MARKER)
+        _write_labels(writer, blocks, dst_sheets)
+        results.sort(key=lambda r: r[1])
+        columns = _period_columns(writer, [label for label, _, _ in results])
+        for label, _, agg in results:
+            writer.put(HEADER_ROW, columns[label], label)
+            _write_column(writer, blocks, columns[label], agg)
+        if rolling is not None:
+            writer.put(HEADER_ROW, ROLLING_COL, rolling_label(rolling_end) if rolling_end else None)
+            _write_column(writer, blocks, ROLLING_COL, rolling)
+    metrics.count("step3.cells_written", writer.changed)
+
+    scope = "全部重算" if full else "增量更新"
+    extra = f"、近 {ROLLING_DAYS} 日" if rolling is not None else ""
+    return True, (f"✅ Step 3 週月統計 ({scope})：重算 {len(results)} 個週 / 月期間{extra}，"
+                  f"歷史 {len(days)} 天，變動 {writer.changed} 格")
@@ -1,293 +1,327 @@
 # run_dailyCopy_2.py
 import daily_copy_task
+import task_plan
+from metrics import NULL_METRICS
+
+# Step 2 對應表：每個任務把模板中的一個區塊複製到歷史工作表的日期欄
+# src_key_label 為來源區塊在模板 A 欄 (src_key_cell) 的實際標籤：插入 / 刪除區塊使位置移動時，
+# 依標籤找出實際的列 (見 layout_index)；標籤找不到、重複或對應到其他任務的區塊時中止，不猜測位置
+# dst_key_label (選填) 為目的工作表 dst_key_cell 的標籤；未設定時目的區塊使用設定的位置
+TASKS = [
+    # 累計客戶數(ALL)
+    {
+        "src_file": "114年dailyTool-單日",
+        "src_sheet": "日統計模板",
+        "dst_prefix": "影視業務日報表",
+        "dst_sheet": "日統計",
+        "src_key_label": "累計客戶數(ALL)",
+        "src_key_cell": "A1",
+        "src_date_cell": "B1",
+        "src_value_range": "B2:B25",
+        "dst_key_cell": "A1",
+        "dst_date_row": 2,
+        "dst_value_start_offset_row": 1,
+        "dst_value_start_offset_col": 0,
+    },
+    { # 新裝申請數(ALL)
+        "src_file": "114年dailyTool-單日",
+        "src_sheet": "日統計模板",
+        "dst_prefix": "影視業務日報表",
+        "dst_sheet": "日統計",
+        "src_key_label": "新裝申請數(ALL)",
+        "src_key_cell": "A28",
+        "src_date_cell": "B28",
+        "src_value_range": "B29:B52",
+        "dst_key_cell": "A55",
+        "dst_date_row": 56,
+        "dst_value_start_offset_row": 1,
+        "dst_value_start_offset_col": 0,
+    },
+    { # 新裝竣工數(ALL)
+        "src_file": "114年dailyTool-單日",
+        "src_sheet": "日統計模板",
+        "dst_prefix": "影視業務日報表",
+        "dst_sheet": "日統計",
+        "src_key_label": "新裝竣工數(ALL)",
+        "src_key_cell": "A55",
+        "src_date_cell": "B55",
+        "src_value_range": "B56:B79",
+        "dst_key_cell": "A82",
+        "dst_date_row": 83,
+        "dst_value_start_offset_row": 1,
+        "dst_value_start_offset_col": 0,
+    },
+    { # 退租申請數(ALL)
+        "src_file": "114年dailyTool-單日",
+        "src_sheet": "日統計模板",
+        "dst_prefix": "影視業務日報表",
+        "dst_sheet": "日統計",
+        "src_key_label": "退租申請數(ALL)",
+        "src_key_cell": "A82",
+        "src_date_cell": "B82",
+        "src_value_range": "B83:B106",
+        "dst_key_cell": "A109",
+        "dst_date_row": 110,
+        "dst_value_start_offset_row": 1,
+        "dst_value_start_offset_col": 0,
+    },
+    { # 退租竣工數(ALL)
+        "src_file": "114年dailyTool-單日",
+        "src_sheet": "日統計模板",
+        "dst_prefix": "影視業務日報表",
+        "dst_sheet": "日統計",
+        "src_key_label": "退租竣工數(ALL)",
+        "src_key_cell": "A109",
+        "src_date_cell": "B109",
+        "src_value_range": "B110:B133",
+        "dst_key_cell": "A136",
+        "dst_date_row": 137,
+        "dst_value_start_offset_row": 1,
+        "dst_value_start_offset_col": 0,
+    },
+    { # 新裝註銷數(ALL)
+        "src_file": "114年dailyTool-單日",
+        "src_sheet": "日統計模板",
+        "dst_prefix": "影視業務日報表",
+        "dst_sheet": "日統計",
+        "src_key_label": "新裝註銷數(ALL)",
+        "src_key_cell": "A136",
+        "src_date_cell": "B136",
+        "src_value_range": "B137:B160",
+        "dst_key_cell": "A163",
+        "dst_date_row": 164,
+        "dst_value_start_offset_row": 1,
+        "dst_value_start_offset_col": 0,
+    },
+    { # 累計客戶數(消客)
+        "src_file": "114年dailyTool-單日",
+        "src_sheet": "日統計模板",
+        "dst_prefix": "影視業務日報表",
+        "dst_sheet": "日統計",
+        "src_key_label": "累計客戶數(消客)",
+        "src_key_cell": "A163",
+        "src_date_cell": "B163",
+        "src_value_range": "B164:B187",
+        "dst_key_cell": "A190",
+        "dst_date_row": 191,
+        "dst_value_start_offset_row": 1,
+        "dst_value_start_offset_col": 0,
+    },
+    { # 新裝申請數(消客)
+        "src_file": "114年dailyTool-單日",
+        "src_sheet": "日統計模板",
+        "dst_prefix": "影視業務日報表",
+        "dst_sheet": "日統計",
+        "src_key_label": "新裝申請數(消客)",
+        "src_key_cell": "A190",
+        "src_date_cell": "B190",
+        "src_value_range": "B191:B214",
+        "dst_key_cell": "A217",
+        "dst_date_row": 218,
+        "dst_value_start_offset_row": 1,
+        "dst_value_start_offset_col": 0,
+    },
+    { # 新裝竣工數(消客)
+        "src_file": "114年dailyTool-單日",
+        "src_sheet": "日統計模板",
+        "dst_prefix": "影視業務日報表",
+        "dst_sheet": "日統計",
+        "src_key_label": "新裝竣工數(消客)",
+        "src_key_cell": "A217",
+        "src_date_cell": "B217",
+        "src_value_range": "B218:B241",
+        "dst_key_cell": "A244",
+        "dst_date_row": 245,
+        "dst_value_start_offset_row": 1,
+        "dst_value_start_offset_col": 0,
+    },
+    { # 退租申請數(消客)
+        "src_file": "114年dailyTool-單日",
+        "src_sheet": "日統計模板",
+        "dst_prefix": "影視業務日報表",
+        "dst_sheet": "日統計",
+        "src_key_label": "退租申請數(消客)",
+        "src_key_cell": "A244",
+        "src_date_cell": "B244",
+        "src_value_range": "B245:B268",
+        "dst_key_cell": "A271",
+        "dst_date_row": 272,
+        "dst_value_start_offset_row": 1,
+        "dst_value_start_offset_col": 0,
+    },
+
+    # --- 無上網日統計模板 → 無上網日統計 ---
+    { # 累計客戶數(ALL)
+        "src_file": "114年dailyTool-單日",
+        "src_sheet": "無上網日統計模板",
+        "dst_prefix": "影視業務日報表",
+        "dst_sheet": "無上網日統計",
+        "src_key_label": "累計客戶數(ALL)",
+        "src_key_cell": "A1",
+        "src_date_cell": "B1",
+        "src_value_range": "B2:B25",
+        "dst_key_cell": "A1",
+        "dst_date_row": 2,
+        "dst_value_start_offset_row": 1,
+        "dst_value_start_offset_col": 0,
+    },
+    { # 新裝申請數(ALL)
+        "src_file": "114年dailyTool-單日",
+        "src_sheet": "無上網日統計模板",
+        "dst_prefix": "影視業務日報表",
+        "dst_sheet": "無上網日統計",
+        "src_key_label": "新裝申請數(ALL)",
+        "src_key_cell": "A28",
+        "src_date_cell": "B28",
+        "src_value_range": "B29:B52",
+        "dst_key_cell": "A28",
+        "dst_date_row": 29,
+        "dst_value_start_offset_row": 1,
+        "dst_value_start_offset_col": 0,
+    },
+    { # 新裝竣工數(ALL)
+        "src_file": "114年dailyTool-單日",
+        "src_sheet": "無上網日統計模板",
+        "dst_prefix": "影視業務日報表",
+        "dst_sheet": "無上網日統計",
+        "src_key_label": "新裝竣工數(ALL)",
+        "src_key_cell": "A55",
+        "src_date_cell": "B55",
+        "src_value_range": "B56:B79",
+        "dst_key_cell": "A55",
+        "dst_date_row": 56,
+        "dst_value_start_offset_row": 1,
+        "dst_value_start_offset_col": 0,
+    },
+    { # 退租申請數(ALL)
+        "src_file": "114年dailyTool-單日",
+        "src_sheet": "無上網日統計模板",
+        "dst_prefix": "影視業務日報表",
+        "dst_sheet": "無上網日統計",
+        "src_key_label": "退租申請數(ALL)",
+        "src_key_cell": "A82",
+        "src_date_cell": "B82",
+        "src_value_range": "B83:B106",
+        "dst_key_cell": "A82",
+        "dst_date_row": 83,
+        "dst_value_start_offset_row": 1,
+        "dst_value_start_offset_col": 0,
+    },
+    { # 退租竣工數(ALL)
+        "src_file": "114年dailyTool-單日",
+        "src_sheet": "無上網日統計模板",
+        "dst_prefix": "影視業務日報表",
+        "dst_sheet": "無上網日統計",
+        "src_key_label": "退租竣工數(ALL)",
+        "src_key_cell": "A109",
+        "src_date_cell": "B109",
+        "src_value_range": "B110:B133",
+        "dst_key_cell": "A109",
+        "dst_date_row": 110,
+        "dst_value_start_offset_row": 1,
+        "dst_value_start_offset_col": 0,
+    },
+    { # 新裝註銷數(ALL)
+        "src_file": "114年dailyTool-單日",
+        "src_sheet": "無上網日統計模板",
+        "dst_prefix": "影視業務日報表",
+        "dst_sheet": "無上網日統計",
+        "src_key_label": "新裝註銷數(ALL)",
+        "src_key_cell": "A136",
+        "src_date_cell": "B136",
+        "src_value_range": "B137:B160",
+        "dst_key_cell": "A136",
+        "dst_date_row": 137,
+        "dst_value_start_offset_row": 1,
+        "dst_value_start_offset_col": 0,
+    },
+    { # 累計客戶數(消客)
+        "src_file": "114年dailyTool-單日",
+        "src_sheet": "無上網日統計模板",
+        "dst_prefix": "影視業務日報表",
+        "dst_sheet": "無上網日統計",
+        "src_key_label": "累計客戶數(消客)",
+        "src_key_cell": "A163",
+        "src_date_cell": "B163",
+        "src_value_range": "B164:B187",
+        "dst_key_cell": "A163",
+        "dst_date_row": 164,
+        "dst_value_start_offset_row": 1,
+        "dst_value_start_offset_col": 0,
+    },
+    { # 新裝申請數(消客)
+        "src_file": "114年dailyTool-單日",
+        "src_sheet": "無上網日統計模板",
+        "dst_prefix": "影視業務日報表",
+        "dst_sheet": "無上網日統計",
+        "src_key_label": "新裝申請數(消客)",
+        "src_key_cell": "A190",
+        "src_date_cell": "B190",
+        "src_value_range": "B191:B214",
+        "dst_key_cell": "A190",
+        "dst_date_row": 191,
+        "dst_value_start_offset_row": 1,
+        "dst_value_start_offset_col": 0,
+    },
+    { # 新裝竣工數(消客)
+        "src_file": "114年dailyTool-單日",
+        "src_sheet": "無上網日統計模板",
+        "dst_prefix": "影視業務日報表",
+        "dst_sheet": "無上網日統計",
+        "src_key_label": "新裝竣工數(消客)",
+        "src_key_cell": "A217",
+        "src_date_cell": "B217",
+        "src_value_range": "B218:B241",
+        "dst_key_cell": "A217",
+        "dst_date_row": 218,
+        "dst_value_start_offset_row": 1,
+        "dst_value_start_offset_col": 0,
+    },
+    { # 退租申請數(消客)
+        "src_file": "114年dailyTool-單日",
+        "src_sheet": "無上網日統計模板",
+        "dst_prefix": "影視業務日報表",
+        "dst_sheet": "無上網日統計",
+        "src_key_label": "退租申請數(消客)",
+        "src_key_cell": "A244",
+        "src_date_cell": "B244",
+        "src_value_range": "B245:B268",
+        "dst_key_cell": "A298",
+        "dst_date_row": 299,
+        "dst_value_start_offset_row": 1,
+        "dst_value_start_offset_col": 0,
+    },
+    { # 退租竣工數(消客)
+        "src_file": "114年dailyTool-單日",
+        "src_sheet": "無上網日統計模板",
+        "dst_prefix": "影視業務日報表",
+        "dst_sheet": "無上網日統計",
+        "src_key_label": "退租竣工數(消客)",
+        "src_key_cell": "A271",
+        "src_date_cell": "B271",
+        "src_value_range": "B272:B295",
+        "dst_key_cell": "A325",
+        "dst_date_row": 326,
+        "dst_value_start_offset_row": 1,
+        "dst_value_start_offset_col": 0,
+    }
+]
+
+# 對應表版本 (tasks 內容的雜湊值)，對應表變動時會改變
+PLAN_VERSION = task_plan.plan_hash(TASKS)
 
 # 🔑 新增參數 target_date=None
-def run_step(wb_src, wb_dst, target_date=None):
+def run_step(wb_src, wb_dst, target_date=None, date_index=None, dirty=None, metrics=NULL_METRICS, counts=None,
+             write_plan=None):
     """
     Step 2 主程式
+    date_index: 多日補跑時共用的 DateColumnIndex，避免每天重建日期索引
+    dirty: 記錄寫入儲存格的 dict (供局部修補輸出使用)
+    metrics: 量測物件 (預設不量測)
+    counts: 回填成功 / 失敗項數與實際寫入日期的 dict
+    write_plan: 試算模式的 WritePlan (只記錄差異，不寫入)
     """
-
-    tasks = [
-        # ... (這裡保留你原本那一大串 tasks 設定，不用動) ...
-        # 為了節省版面，請保留你原本的 tasks 列表內容
-        # 累計客戶數(ALL)
-        {
-            "src_file": "114年dailyTool-單日",
-            "src_sheet": "日統計模板",
-            "dst_prefix": "影視業務日報表",
-            "dst_sheet": "日統計",
-            "src_key_cell": "A1",
-            "src_date_cell": "B1",
-            "src_value_range": "B2:B25",
-            "dst_key_cell": "A1",
-            "dst_date_row": 2,
-            "dst_value_start_offset_row": 1,
-            "dst_value_start_offset_col": 0,
-        },
-        # ... (以下請保留原本所有任務) ...
-        { # 新裝申請數
-            "src_file": "114年dailyTool-單日",
-            "src_sheet": "日統計模板",
-            "dst_prefix": "影視業務日報表",
-            "dst_sheet": "日統計",
-            "src_key_cell": "A28",
-            "src_date_cell": "B28",
-            "src_value_range": "B29:B52",
-            "dst_key_cell": "A55",
-            "dst_date_row": 56,
-            "dst_value_start_offset_row": 1,
-            "dst_value_start_offset_col": 0,
-        },
-        { # 新裝竣工數
-            "src_file": "114年dailyTool-單日",
-            "src_sheet": "日統計模板",
-            "dst_prefix": "影視業務日報表",
-            "dst_sheet": "日統計",
-            "src_key_cell": "A55",
-            "src_date_cell": "B55",
-            "src_value_range": "B56:B79",
-            "dst_key_cell": "A82",
-            "dst_date_row": 83,
-            "dst_value_start_offset_row": 1,
-            "dst_value_start_offset_col": 0,
-        },
-        { # 新裝註銷數
-            "src_file": "114年dailyTool-單日",
-            "src_sheet": "日統計模板",
-            "dst_prefix": "影視業務日報表",
-            "dst_sheet": "日統計",
-            "src_key_cell": "A82",
-            "src_date_cell": "B82",
-            "src_value_range": "B83:B106",
-            "dst_key_cell": "A109",
-            "dst_date_row": 110,
-            "dst_value_start_offset_row": 1,
-            "dst_value_start_offset_col": 0,
-        },
-        { # 拆機申請數
-            "src_file": "114年dailyTool-單日",
-            "src_sheet": "日統計模板",
-            "dst_prefix": "影視業務日報表",
-            "dst_sheet": "日統計",
-            "src_key_cell": "A109",
-            "src_date_cell": "B109",
-            "src_value_range": "B110:B133",
-            "dst_key_cell": "A136",
-            "dst_date_row": 137,
-            "dst_value_start_offset_row": 1,
-            "dst_value_start_offset_col": 0,
-        },
-        { # 拆機竣工數
-            "src_file": "114年dailyTool-單日",
-            "src_sheet": "日統計模板",
-            "dst_prefix": "影視業務日報表",
-            "dst_sheet": "日統計",
-            "src_key_cell": "A136",
-            "src_date_cell": "B136",
-            "src_value_range": "B137:B160",
-            "dst_key_cell": "A163",
-            "dst_date_row": 164,
-            "dst_value_start_offset_row": 1,
-            "dst_value_start_offset_col": 0,
-        },
-        { # 拆機註銷數
-            "src_file": "114年dailyTool-單日",
-            "src_sheet": "日統計模板",
-            "dst_prefix": "影視業務日報表",
-            "dst_sheet": "日統計",
-            "src_key_cell": "A163",
-            "src_date_cell": "B163",
-            "src_value_range": "B164:B187",
-            "dst_key_cell": "A190",
-            "dst_date_row": 191,
-            "dst_value_start_offset_row": 1,
-            "dst_value_start_offset_col": 0,
-        },
-        { # 異動申請數
-            "src_file": "114年dailyTool-單日",
-            "src_sheet": "日統計模板",
-            "dst_prefix": "影視業務日報表",
-            "dst_sheet": "日統計",
-            "src_key_cell": "A190",
-            "src_date_cell": "B190",
-            "src_value_range": "B191:B214",
-            "dst_key_cell": "A217",
-            "dst_date_row": 218,
-            "dst_value_start_offset_row": 1,
-            "dst_value_start_offset_col": 0,
-        },
-        { # 異動竣工數
-            "src_file": "114年dailyTool-單日",
-            "src_sheet": "日統計模板",
-            "dst_prefix": "影視業務日報表",
-            "dst_sheet": "日統計",
-            "src_key_cell": "A217",
-            "src_date_cell": "B217",
-            "src_value_range": "B218:B241",
-            "dst_key_cell": "A244",
-            "dst_date_row": 245,
-            "dst_value_start_offset_row": 1,
-            "dst_value_start_offset_col": 0,
-        },
-        { # 異動註銷數
-            "src_file": "114年dailyTool-單日",
-            "src_sheet": "日統計模板",
-            "dst_prefix": "影視業務日報表",
-            "dst_sheet": "日統計",
-            "src_key_cell": "A244",
-            "src_date_cell": "B244",
-            "src_value_range": "B245:B268",
-            "dst_key_cell": "A271",
-            "dst_date_row": 272,
-            "dst_value_start_offset_row": 1,
-            "dst_value_start_offset_col": 0,
-        },
-
-        # --- (消客) 系列 ---
-        { # 累計客戶數(消客)
-            "src_file": "114年dailyTool-單日",
-            "src_sheet": "無上網日統計模板",
-            "dst_prefix": "影視業務日報表",
-            "dst_sheet": "無上網日統計",
-            "src_key_cell": "A1",
-            "src_date_cell": "B1",
-            "src_value_range": "B2:B25",
-            "dst_key_cell": "A1",
-            "dst_date_row": 2,
-            "dst_value_start_offset_row": 1,
-            "dst_value_start_offset_col": 0,
-        },
-        { # 新裝申請數(消客)
-            "src_file": "114年dailyTool-單日",
-            "src_sheet": "無上網日統計模板",
-            "dst_prefix": "影視業務日報表",
-            "dst_sheet": "無上網日統計",
-            "src_key_cell": "A28",
-            "src_date_cell": "B28",
-            "src_value_range": "B29:B52",
-            "dst_key_cell": "A28",
-            "dst_date_row": 29,
-            "dst_value_start_offset_row": 1,
-            "dst_value_start_offset_col": 0,
-        },
-        { # 新裝竣工數(消客)
-            "src_file": "114年dailyTool-單日",
-            "src_sheet": "無上網日統計模板",
-            "dst_prefix": "影視業務日報表",
-            "dst_sheet": "無上網日統計",
-            "src_key_cell": "A55",
-            "src_date_cell": "B55",
-            "src_value_range": "B56:B79",
-            "dst_key_cell": "A55",
-            "dst_date_row": 56,
-            "dst_value_start_offset_row": 1,
-            "dst_value_start_offset_col": 0,
-        },
-        { # 新裝註銷數(消客)
-            "src_file": "114年dailyTool-單日",
-            "src_sheet": "無上網日統計模板",
-            "dst_prefix": "影視業務日報表",
-            "dst_sheet": "無上網日統計",
-            "src_key_cell": "A82",
-            "src_date_cell": "B82",
-            "src_value_range": "B83:B106",
-            "dst_key_cell": "A82",
-            "dst_date_row": 83,
-            "dst_value_start_offset_row": 1,
-            "dst_value_start_offset_col": 0,
-        },
-        { # 拆機申請數(消客)
-            "src_file": "114年dailyTool-單日",
-            "src_sheet": "無上網日統計模板",
-            "dst_prefix": "影視業務日報表",
-            "dst_sheet": "無上網日統計",
-            "src_key_cell": "A109",
-            "src_date_cell": "B109",
-            "src_value_range": "B110:B133",
-            "dst_key_cell": "A109",
-            "dst_date_row": 110,
-            "dst_value_start_offset_row": 1,
-            "dst_value_start_offset_col": 0,
-        },
-        { # 拆機竣工數(消客)
-            "src_file": "114年dailyTool-單日",
-            "src_sheet": "無上網日統計模板",
-            "dst_prefix": "影視業務日報表",
-            "dst_sheet": "無上網日統計",
-            "src_key_cell": "A136",
-            "src_date_cell": "B136",
-            "src_value_range": "B137:B160",
-            "dst_key_cell": "A136",
-            "dst_date_row": 137,
-            "dst_value_start_offset_row": 1,
-            "dst_value_start_offset_col": 0,
-        },
-        { # 拆機註銷數(消客)
-            "src_file": "114年dailyTool-單日",
-            "src_sheet": "無上網日統計模板",
-            "dst_prefix": "影視業務日報表",
-            "dst_sheet": "無上網日統計",
-            "src_key_cell": "A163",
-            "src_date_cell": "B163",
-            "src_value_range": "B164:B187",
-            "dst_key_cell": "A163",
-            "dst_date_row": 164,
-            "dst_value_start_offset_row": 1,
-            "dst_value_start_offset_col": 0,
-        },
-        { # 異動申請數(消客)
-            "src_file": "114年dailyTool-單日",
-            "src_sheet": "無上網日統計模板",
-            "dst_prefix": "影視業務日報表",
-            "dst_sheet": "無上網日統計",
-            "src_key_cell": "A190",
-            "src_date_cell": "B190",
-            "src_value_range": "B191:B214",
-            "dst_key_cell": "A190",
-            "dst_date_row": 191,
-            "dst_value_start_offset_row": 1,
-            "dst_value_start_offset_col": 0,
-        },
-        { # 異動竣工數(消客)
-            "src_file": "114年dailyTool-單日",
-            "src_sheet": "無上網日統計模板",
-            "dst_prefix": "影視業務日報表",
-            "dst_sheet": "無上網日統計",
-            "src_key_cell": "A217",
-            "src_date_cell": "B217",
-            "src_value_range": "B218:B241",
-            "dst_key_cell": "A217",
-            "dst_date_row": 218,
-            "dst_value_start_offset_row": 1,
-            "dst_value_start_offset_col": 0,
-        },
-        { # 退租申請數(消客)
-            "src_file": "114年dailyTool-單日",
-            "src_sheet": "無上網日統計模板",
-            "dst_prefix": "影視業務日報表",
-            "dst_sheet": "無上網日統計",
-            "src_key_cell": "A244",
-            "src_date_cell": "B244",
-            "src_value_range": "B245:B268",
-            "dst_key_cell": "A298",
-            "dst_date_row": 299,
-            "dst_value_start_offset_row": 1,
-            "dst_value_start_offset_col": 0,
-        },
-        { # 退租竣工數(消客)
-            "src_file": "114年dailyTool-單日",
-            "src_sheet": "無上網日統計模板",
-            "dst_prefix": "影視業務日報表",
-            "dst_sheet": "無上網日統計",
-            "src_key_cell": "A271",
-            "src_date_cell": "B271",
-            "src_value_range": "B272:B295",
-            "dst_key_cell": "A325",
-            "dst_date_row": 326,
-            "dst_value_start_offset_row": 1,
-            "dst_value_start_offset_col": 0,
-        }
-    ]
-
     # 執行任務 (傳入 target_date 作為 force_date)
-    return daily_copy_task.copy_by_mapping_openpyxl(wb_src, wb_dst, tasks, force_date=target_date)
\ No newline at end of file
+    return daily_copy_task.copy_by_mapping_openpyxl(wb_src, wb_dst, TASKS, force_date=target_date,
+                                                    date_index=date_index, dirty=dirty,
+                                                    metrics=metrics, counts=counts, write_plan=write_plan)
\ No newline at end of file
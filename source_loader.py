@@ -0,0 +1,187 @@
+# source_loader.py
+import csv
+import io
+import codecs
+import openpyxl
+from openpyxl.utils import range_boundaries
+
+import daily_single_1
+
+# 依序嘗試的 CSV 編碼 (utf-8-sig 可同時處理有/無 BOM 的 utf-8)
+CSV_ENCODINGS = ("utf-8-sig", "big5", "cp950")
+
+# 偵測編碼時只讀取檔案開頭的位元組數
+ENCODING_PROBE_BYTES = 64 * 1024
+
+def detect_encoding(prefix):
+    """
+    只用檔案開頭的一段位元組判斷編碼 (單次掃描)
+    使用 incremental decoder，避免前綴剛好切在多位元組字元中間時誤判
+    只是初步判斷：CsvSheet 第一次讀取時以嚴格模式解碼視窗，失敗時改試其他編碼
+    """
+    for enc in CSV_ENCODINGS:
+        decoder = codecs.getincrementaldecoder(enc)()
+        try:
+            decoder.decode(prefix, final=False)
+            return enc
+        except UnicodeDecodeError:
+            continue
+    return CSV_ENCODINGS[0]
+
+def source_window(source_range=daily_single_1.SOURCE_RANGE):
+    """回傳 Step 1 需要的 (最大列, 最大欄)"""
+    _, _, max_col, max_row = range_boundaries(source_range)
+    return max_row, max_col
+
+def iter_csv_window(bytes_data, min_row=1, max_row=None, min_col=1, max_col=None, encoding=None):
+    """
+    串流管線：位元組 → 逐段解碼 → csv.reader → 列 / 欄視窗 → 逐列產出 tuple
+    不保留已讀過的列 (記憶體只與單列寬度有關)；讀到 max_row 即停止，不解碼檔案其餘部分
+    """
+    if encoding is None:
+        encoding = detect_encoding(bytes_data[:ENCODING_PROBE_BYTES])
+    # 嚴格解碼：編碼不符時丟出 UnicodeDecodeError，不默默丟掉位元組
+    text_io = io.TextIOWrapper(io.BytesIO(bytes_data), encoding=encoding,
+                               errors="strict", newline="")
+    try:
+        for r, row in enumerate(csv.reader(text_io), start=1):
+            if r >= min_row:
+                yield tuple(row[min_col - 1:max_col])
+            if max_row and r >= max_row:
+                break
+    finally:
+        text_io.close()
+
+def _pad_window(rows, min_row, max_row, width):
+    """每列補齊到 width 欄；來源列數不足 max_row 時，與一般工作表一樣補空白列"""
+    r = min_row - 1
+    for r, values in enumerate(rows, start=min_row):
+        values = tuple(values)
+        yield values + (None,) * (width - len(values))
+    for _ in range(r + 1, (max_row or 0) + 1):
+        yield (None,) * width
+
+
+class CsvSheet:
+    """
+    CSV 來源的唯讀工作表：不建立任何格子物件
+    第一次讀取時從原始位元組串流解碼一次視窗 (最多 window_rows x window_cols，讀到 window_rows 即停止)，
+    同一次掃描取得列 / 欄數並確認編碼；視窗內的值以 tuple 列保留，記憶體只與視窗大小有關
+    介面與 openpyxl 工作表的 iter_rows(values_only=True) 相容
+    """
+
+    def __init__(self, bytes_data, window_rows=None, window_cols=None, title="Sheet"):
+        self.title = title
+        self._bytes = bytes_data
+        self._window = (window_rows, window_cols)
+        self.encoding = detect_encoding(bytes_data[:ENCODING_PROBE_BYTES])
+        self._rows = None
+
+    def _clip(self, max_row, max_col):
+        window_rows, window_cols = self._window
+        if window_rows:
+            max_row = min(max_row, window_rows) if max_row else window_rows
+        if window_cols:
+            max_col = min(max_col, window_cols) if max_col else window_cols
+        return max_row, max_col
+
+    def _window_rows(self):
+        """
+        視窗內的列 (只解碼一次並記住結果)
+        以嚴格模式解碼，失敗時依序改試其他編碼；此時尚未產出任何列，Step 1 不會只寫入一半
+        """
+        if self._rows is None:
+            max_row, max_col = self._clip(None, None)
+            candidates = [self.encoding] + [enc for enc in CSV_ENCODINGS if enc != self.encoding]
+            for enc in candidates:
+                try:
+                    rows = list(iter_csv_window(self._bytes, max_row=max_row, max_col=max_col, encoding=enc))
+                except UnicodeDecodeError:
+                    continue
+                self.encoding = enc
+                self._rows = rows
+                break
+            else:
+                raise ValueError(f"CSV 無法以 {' / '.join(candidates)} 解碼，請確認檔案編碼")
+        return self._rows
+
+    @property
+    def max_row(self):
+        return len(self._window_rows())
+
+    @property
+    def max_column(self):
+        return max((len(values) for values in self._window_rows()), default=0)
+
+    def iter_rows(self, min_row=1, max_row=None, min_col=1, max_col=None, values_only=True):
+        rows = self._window_rows()
+        max_row, max_col = self._clip(max_row or self.max_row, max_col or self.max_column)
+        window = (values[min_col - 1:max_col] for values in rows[min_row - 1:max_row])
+        return _pad_window(window, min_row, max_row, max_col - min_col + 1)
+
+
+class PaddedSheet:
+    """
+    唯讀 xlsx 工作表的包裝：iter_rows 在檔案列數不足時補空白列 (與 CsvSheet 相同)，
+    較短的來源檔仍會涵蓋整個 Step 1 範圍，舊資料會被清空
+    """
+
+    def __init__(self, ws):
+        self._ws = ws
+        self.title = ws.title
+
+    def __getattr__(self, name):
+        return getattr(self._ws, name)
+
+    def iter_rows(self, min_row=1, max_row=None, min_col=1, max_col=None, values_only=True):
+        rows = self._ws.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col,
+                                  values_only=True)
+        if not max_col:
+            return rows
+        return _pad_window(rows, min_row, max_row, max_col - min_col + 1)
+
+
+class ValueWorkbook:
+    """只含精簡工作表 (CsvSheet / PaddedSheet) 的活頁簿，提供 Step 1 使用的 worksheets / sheetnames / close()"""
+
+    def __init__(self, *sheets, source=None):
+        self.worksheets = list(sheets)
+        self._source = source
+
+    @property
+    def sheetnames(self):
+        return [ws.title for ws in self.worksheets]
+
+    def __getitem__(self, name):
+        for ws in self.worksheets:
+            if ws.title == name:
+                return ws
+        raise KeyError(name)
+
+    def close(self):
+        if self._source is not None:
+            self._source.close()
+
+
+def load_csv(bytes_data, max_row=None, max_col=None):
+    """
+    CSV 來源：不先讀成表格，Step 1 讀取時才由位元組逐列串流解碼，
+    只取 max_row x max_col 範圍，讀到 max_row 即停止
+    """
+    return ValueWorkbook(CsvSheet(bytes_data, max_row, max_col))
+
+def load_xlsx(file_obj):
+    """以唯讀模式開啟 xlsx，資料列由 Step 1 的 iter_rows 依需要逐列讀取 (列數不足時補空白列)"""
+    wb = openpyxl.load_workbook(file_obj, read_only=True, data_only=True)
+    return ValueWorkbook(*(PaddedSheet(ws) for ws in wb.worksheets), source=wb)
+
+def load_source(file_obj, filename, source_range=daily_single_1.SOURCE_RANGE):
+    """依副檔名載入來源檔 (CSV 或 xlsx)"""
+    max_row, max_col = source_window(source_range)
+    if filename.lower().endswith(".csv"):
+        if hasattr(file_obj, "getvalue"):
+            bytes_data = file_obj.getvalue()
+        else:
+            bytes_data = file_obj.read()
+        return load_csv(bytes_data, max_row=max_row, max_col=max_col)
+    return load_xlsx(file_obj)
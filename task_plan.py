@@ -0,0 +1,165 @@
+# task_plan.py
+import hashlib
+import json
+from collections import namedtuple
+from openpyxl.utils import range_boundaries, column_index_from_string, get_column_letter
+from openpyxl.utils.cell import coordinate_from_string
+
+# Excel 工作表的列/欄上限
+EXCEL_MAX_ROW = 1048576
+EXCEL_MAX_COL = 16384
+
+# 單一編譯後的任務 (不可變)
+CompiledTask = namedtuple("CompiledTask", [
+    "index",            # 在原 tasks 列表中的位置 (0 起算)
+    "src_sheet",        # 來源工作表名稱 (原始設定)
+    "src_date_cell",    # 來源日期格，例如 "B1"
+    "src_date_row",
+    "src_date_col",
+    "src_min_row",      # 來源值範圍 (單欄)
+    "src_max_row",
+    "src_col",
+    "dst_sheet",
+    "dst_date_row",
+    "dst_row_offset",   # 寫入起點相對於日期格的位移
+    "dst_col_offset",
+    "src_key_label",    # 來源 / 目的區塊在標籤欄的標籤 (未設定時為 None，使用設定的位置)
+    "dst_key_label",
+    "src_key_row",      # 來源 / 目的工作表中標籤格的位置 (src_key_cell / dst_key_cell)
+    "src_key_col",
+    "dst_key_row",
+    "dst_key_col",
+])
+
+# 編譯後的計畫：tasks 依 (dst_sheet, dst_date_row) 分組
+TaskPlan = namedtuple("TaskPlan", ["version", "tasks", "groups", "src_sheets", "dst_sheets"])
+
+# 以 tasks 定義的雜湊值快取已編譯的計畫
+_PLAN_CACHE = {}
+
+def plan_hash(tasks):
+    """計算 tasks 定義的雜湊值 (作為計畫版本)"""
+    payload = json.dumps(tasks, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+def _compile_task(idx, task):
+    label = f"Task {idx+1}"
+
+    min_col, min_row, max_col, max_row = range_boundaries(task["src_value_range"])
+    if min_col != max_col:
+        raise ValueError(f"{label}: 來源範圍 {task['src_value_range']} 必須是單一欄")
+
+    date_col_letter, date_row = coordinate_from_string(task["src_date_cell"])
+    src_key_letter, src_key_row = coordinate_from_string(task["src_key_cell"])
+    dst_key_letter, dst_key_row = coordinate_from_string(task["dst_key_cell"])
+
+    return CompiledTask(
+        index=idx,
+        src_sheet=task["src_sheet"],
+        src_date_cell=task["src_date_cell"],
+        src_date_row=date_row,
+        src_date_col=column_index_from_string(date_col_letter),
+        src_min_row=min_row,
+        src_max_row=max_row,
+        src_col=min_col,
+        dst_sheet=task["dst_sheet"],
+        dst_date_row=task["dst_date_row"],
+        dst_row_offset=task["dst_value_start_offset_row"],
+        dst_col_offset=task["dst_value_start_offset_col"],
+        src_key_label=task.get("src_key_label"),
+        dst_key_label=task.get("dst_key_label"),
+        src_key_row=src_key_row,
+        src_key_col=column_index_from_string(src_key_letter),
+        dst_key_row=dst_key_row,
+        dst_key_col=column_index_from_string(dst_key_letter),
+    )
+
+def shift(ct, src_rows=0, dst_rows=0):
+    """回傳來源 / 目的區塊各自上下移動指定列數後的任務"""
+    if not src_rows and not dst_rows:
+        return ct
+    return ct._replace(
+        src_date_cell=f"{get_column_letter(ct.src_date_col)}{ct.src_date_row + src_rows}",
+        src_date_row=ct.src_date_row + src_rows,
+        src_min_row=ct.src_min_row + src_rows,
+        src_max_row=ct.src_max_row + src_rows,
+        src_key_row=ct.src_key_row + src_rows,
+        dst_date_row=ct.dst_date_row + dst_rows,
+        dst_key_row=ct.dst_key_row + dst_rows,
+    )
+
+def dst_rows(ct):
+    """任務寫入目的工作表的列範圍 (含頭尾)"""
+    start = ct.dst_date_row + ct.dst_row_offset
+    return start, start + (ct.src_max_row - ct.src_min_row)
+
+def validate(compiled):
+    """
+    寫入前檢查：目的列超出範圍、區塊互相重疊、區塊蓋到其他任務的日期列，
+    或兩個任務讀取重疊的來源區塊
+    有問題時丟出 ValueError
+    """
+    by_sheet = {}
+    for ct in compiled:
+        label = f"Task {ct.index+1}"
+        start, end = dst_rows(ct)
+        if ct.dst_date_row < 1 or start < 1 or end > EXCEL_MAX_ROW:
+            raise ValueError(f"{label}: 目的列 {start}~{end} 超出工作表範圍")
+        if abs(ct.dst_col_offset) >= EXCEL_MAX_COL:
+            raise ValueError(f"{label}: 目的欄位移 {ct.dst_col_offset} 超出工作表範圍")
+        by_sheet.setdefault(ct.dst_sheet, []).append(ct)
+
+    for sheet, items in by_sheet.items():
+        date_rows = {ct.dst_date_row for ct in items}
+        for i, a in enumerate(items):
+            a_start, a_end = dst_rows(a)
+            for row in date_rows:
+                if a_start <= row <= a_end:
+                    raise ValueError(f"Task {a.index+1}: 寫入範圍 {a_start}~{a_end} 蓋到 '{sheet}' 的日期列 {row}")
+            for b in items[i+1:]:
+                if a.dst_col_offset != b.dst_col_offset:
+                    continue
+                b_start, b_end = dst_rows(b)
+                if a_start <= b_end and b_start <= a_end:
+                    raise ValueError(f"Task {a.index+1} 與 Task {b.index+1} 在 '{sheet}' 的寫入範圍重疊")
+
+    by_source = {}
+    for ct in compiled:
+        by_source.setdefault((ct.src_sheet, ct.src_col), []).append(ct)
+    for (sheet, _), items in by_source.items():
+        for i, a in enumerate(items):
+            for b in items[i+1:]:
+                if a.src_min_row <= b.src_max_row and b.src_min_row <= a.src_max_row:
+                    raise ValueError(f"Task {a.index+1} 與 Task {b.index+1} 讀取 '{sheet}' 重疊的來源範圍 "
+                                     f"({a.src_min_row}~{a.src_max_row} / {b.src_min_row}~{b.src_max_row})")
+
+def compile_tasks(tasks):
+    """
+    將 tasks 設定編譯為不可變的 TaskPlan (依 tasks 雜湊值快取)
+    設定有誤時丟出 ValueError，此時尚未寫入任何資料
+    """
+    version = plan_hash(tasks)
+    plan = _PLAN_CACHE.get(version)
+    if plan is not None:
+        return plan
+
+    compiled = tuple(_compile_task(idx, task) for idx, task in enumerate(tasks))
+    plan = build_plan(version, compiled)
+    _PLAN_CACHE[version] = plan
+    return plan
+
+def build_plan(version, compiled):
+    """檢查已編譯的任務並依 (dst_sheet, dst_date_row) 分組為 TaskPlan；有問題時丟出 ValueError"""
+    validate(compiled)
+
+    groups = {}
+    for ct in compiled:
+        groups.setdefault((ct.dst_sheet, ct.dst_date_row), []).append(ct)
+
+    return TaskPlan(
+        version=version,
+        tasks=compiled,
+        groups=tuple((key, tuple(items)) for key, items in groups.items()),
+        src_sheets=tuple(dict.fromkeys(ct.src_sheet for ct in compiled)),
+        dst_sheets=tuple(dict.fromkeys(ct.dst_sheet for ct in compiled)),
+    )
@@ -0,0 +1,89 @@
+# template_cache.py
+import hashlib
+import pickle
+import threading
+from collections import OrderedDict
+
+import template_loader
+
+# 快取上限 (以序列化後的位元組數計算)
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+def content_hash(file_bytes):
+    """模板內容的雜湊值 (作為快取 key)"""
+    return hashlib.sha256(file_bytes).hexdigest()
+
+def load_template(file_bytes, sheet_names=None):
+    """
+    解析模板 (快取未命中時使用)；指定 sheet_names 時只解析這些工作表
+    公式格的 Excel 快取值保留在 ws.cached_values (同一次解析取得，不必再以 data_only 載入)
+    """
+    if sheet_names is None:
+        return template_loader.load_full(file_bytes)
+    return template_loader.load_selected(file_bytes, sheet_names)
+
+
+class TemplateCache:
+    """
+    已解析模板的快取：以內容雜湊為 key，保存解析後活頁簿的 pickle 位元組
+    每次取用都 unpickle 出一份獨立的工作副本 (比重新解析 zip/XML 快)，
+    總大小超過 max_bytes 時依 LRU 淘汰
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, loader=load_template):
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def load(self, file_bytes, sheet_names=None):
+        """
+        回傳 (工作副本, 是否命中快取)
+        sheet_names: 只解析這些工作表 (不同的工作表組合分開快取)
+        """
+        key = content_hash(file_bytes)
+        if sheet_names is not None:
+            key += "|" + "|".join(sorted(sheet_names))
+
+        with self._lock:
+            blob = self._entries.get(key)
+            if blob is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if blob is not None:
+            return pickle.loads(blob), True
+
+        wb = self.loader(file_bytes, sheet_names)
+        blob = pickle.dumps(wb, protocol=pickle.HIGHEST_PROTOCOL)
+        self._store(key, blob)
+        # 快取保存的是序列化快照，呼叫端可直接修改這份剛解析的活頁簿
+        return wb, False
+
+    def _store(self, key, blob):
+        # 單一模板就超過上限時不快取
+        if len(blob) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = blob
+            self._size += len(blob)
+            while self._size > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self._size -= len(old)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats_line(self):
+        """執行紀錄用的統計文字"""
+        return (f"🗂️ 模板快取：命中 {self.hits} 次，未命中 {self.misses} 次，"
+                f"快取 {len(self._entries)} 份 ({self._size / 1024 / 1024:.1f} MB)")
@@ -0,0 +1,262 @@
+# template_loader.py
+import io
+import warnings
+import zipfile
+import xml.etree.ElementTree as ET
+
+from openpyxl.cell import MergedCell
+from openpyxl.comments.comment_sheet import CommentSheet
+from openpyxl.drawing.spreadsheet_drawing import SpreadsheetDrawing
+from openpyxl.formula import Tokenizer
+from openpyxl.formula.tokenizer import Token
+from openpyxl.packaging.relationship import RelationshipList, get_dependents, get_rels_path
+from openpyxl.pivot.table import TableDefinition
+from openpyxl.reader.drawings import find_images
+from openpyxl.reader.excel import ExcelReader
+from openpyxl.worksheet._reader import FORMULA_TAG, VALUE_TAG, WorksheetReader, WorkSheetParser
+from openpyxl.worksheet.table import Table
+from openpyxl.xml.constants import COMMENTS_NS
+from openpyxl.xml.functions import fromstring
+
+import daily_copy_task
+import daily_single_1
+import rollup
+import run_dailyCopy_2
+import task_plan
+import xml_patch_writer
+
+def template_sheet_names(file_bytes):
+    """只讀 workbook.xml 取得模板的工作表名稱 (不解析任何工作表)"""
+    with zipfile.ZipFile(io.BytesIO(file_bytes)) as zin:
+        sheets, _, _ = xml_patch_writer.read_package(zin)
+    return list(sheets)
+
+def required_sheets(sheetnames, tasks=None):
+    """
+    依 Step 1 目的工作表與 Step 2 任務計畫，算出流程實際會用到的工作表
+    名稱比對規則與執行時相同 (來源工作表允許部分比對)
+    """
+    plan = task_plan.compile_tasks(tasks if tasks is not None else run_dailyCopy_2.TASKS)
+    required = set()
+
+    if daily_single_1.TARGET_SHEET in sheetnames:
+        required.add(daily_single_1.TARGET_SHEET)
+    elif sheetnames:
+        required.add(sheetnames[0])
+
+    for name in plan.src_sheets:
+        resolved = daily_copy_task.resolve_sheet_name(sheetnames, name, fuzzy=True)
+        if resolved:
+            required.add(resolved)
+    for name in plan.dst_sheets:
+        resolved = daily_copy_task.resolve_sheet_name(sheetnames, name)
+        if resolved:
+            required.add(resolved)
+    if rollup.ROLLUP_SHEET in sheetnames:
+        required.add(rollup.ROLLUP_SHEET)
+    return required
+
+
+# _DualViewReader.read_worksheets 複製來源的 openpyxl 版本 (升級時需重新比對)
+OPENPYXL_VERSION = "3.1.5"
+
+
+class _DualViewParser(WorkSheetParser):
+    """
+    解析工作表時同時保留公式與 Excel 上次存檔的快取值 (<v>)：
+    儲存格的值仍是公式，快取值另存在 cached_values {(row, col): 值}
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cached_values = {}
+
+    def parse_cell(self, element):
+        formula = element.find(FORMULA_TAG)
+        cell = super().parse_cell(element)
+        # openpyxl 存檔時公式格的 <v> 是空的
+        if formula is None or not element.findtext(VALUE_TAG):
+            return cell
+
+        # 暫時拿掉 <f>，以一般值的規則 (含日期格式) 解析同一個元素的 <v>
+        counter = self.col_counter
+        element.remove(formula)
+        try:
+            cached = super().parse_cell(element)
+        finally:
+            element.insert(0, formula)
+            self.col_counter = counter
+        if cached["data_type"] != "e" and cached["value"] is not None:
+            self.cached_values[(cell["row"], cell["column"])] = cached["value"]
+        return cell
+
+
+class _DualViewWorksheetReader(WorksheetReader):
+    """改用 _DualViewParser，並把快取值掛在 ws.cached_values"""
+
+    def __init__(self, ws, xml_source, shared_strings, data_only, rich_text):
+        super().__init__(ws, xml_source, shared_strings, data_only, rich_text)
+        wb = ws.parent
+        self.parser = _DualViewParser(xml_source, shared_strings, data_only, wb.epoch,
+                                      wb._date_formats, wb._timedelta_formats, rich_text)
+
+    def bind_all(self):
+        super().bind_all()
+        self.ws.cached_values = self.parser.cached_values
+
+
+class _DualViewReader(ExcelReader):
+    """
+    每張工作表只解析一次，同時取得公式與快取值
+    read_worksheets 與 openpyxl 的 ExcelReader.read_worksheets 相同，只是明確改用 _DualViewWorksheetReader
+    (不替換 openpyxl 模組層級的 WorksheetReader，其他 load_workbook 不受影響)
+    這段複製自 openpyxl 3.1.5 (OPENPYXL_VERSION)，requirements.txt 因此固定該版本
+    """
+
+    def _keep(self, sheet):
+        """是否解析這張工作表 (子類別可略過部分工作表)"""
+        return True
+
+    def read_worksheets(self):
+        for sheet, rel in self.parser.find_sheets():
+            if rel.target not in self.valid_files:
+                continue
+            if not self._keep(sheet):
+                continue
+
+            if "chartsheet" in rel.Type:
+                self.read_chartsheet(sheet, rel)
+                continue
+
+            rels_path = get_rels_path(rel.target)
+            rels = RelationshipList()
+            if rels_path in self.valid_files:
+                rels = get_dependents(self.archive, rels_path)
+
+            ws = self.wb.create_sheet(sheet.name)
+            ws._rels = rels
+            with self.archive.open(rel.target) as fh:
+                ws_parser = _DualViewWorksheetReader(ws, fh, self.shared_strings, self.data_only, self.rich_text)
+                ws_parser.bind_all()
+
+            # 註解
+            for r in rels.find(COMMENTS_NS):
+                comment_sheet = CommentSheet.from_tree(fromstring(self.archive.read(r.target)))
+                for ref, comment in comment_sheet.comments:
+                    try:
+                        ws[ref].comment = comment
+                    except AttributeError:
+                        c = ws[ref]
+                        if isinstance(c, MergedCell):
+                            warnings.warn(f"Cell '{ws.title}':{c.coordinate} is part of a merged range "
+                                          "but has a comment which will be removed")
+
+            # VBA 的 VML 連結
+            if self.wb.vba_archive and ws.legacy_drawing:
+                ws.legacy_drawing = rels.get(ws.legacy_drawing).target
+            else:
+                ws.legacy_drawing = None
+
+            for t in ws_parser.tables:
+                ws.add_table(Table.from_tree(fromstring(self.archive.read(t))))
+
+            for drawing in rels.find(SpreadsheetDrawing._rel_type):
+                charts, images = find_images(self.archive, drawing.target)
+                for c in charts:
+                    ws.add_chart(c, c.anchor)
+                for im in images:
+                    ws.add_image(im, im.anchor)
+
+            for r in rels.find(TableDefinition.rel_type):
+                pivot = TableDefinition.from_tree(fromstring(self.archive.read(r.Target)))
+                pivot.cache = self.parser.pivot_caches[pivot.cacheId]
+                ws.add_pivot(pivot)
+
+            ws.sheet_state = sheet.state
+
+
+class _SelectiveReader(_DualViewReader):
+    """只解析指定工作表的 ExcelReader；其他工作表以空白佔位，保持順序與索引不變"""
+
+    def __init__(self, fn, sheet_names, **kwargs):
+        super().__init__(fn, **kwargs)
+        self.sheet_names = set(sheet_names)
+        self.skipped = []
+
+    def _keep(self, sheet):
+        if sheet.name in self.sheet_names:
+            return True
+        ws = self.wb.create_sheet(sheet.name)
+        ws.sheet_state = sheet.state
+        self.skipped.append(sheet.name)
+        return False
+
+def load_full(file_bytes):
+    """完整解析模板 (公式格另外保留快取值於 ws.cached_values)"""
+    reader = _DualViewReader(io.BytesIO(file_bytes))
+    reader.read()
+    return reader.wb
+
+def load_selected(file_bytes, sheet_names):
+    """
+    只完整解析 sheet_names 中的工作表，回傳活頁簿
+    wb.skipped_sheets 記錄未解析 (空白佔位) 的工作表；
+    這種活頁簿不能直接 wb.save()，輸出必須以原始模板為基礎 (XML 局部修補或 apply_edits)
+    """
+    reader = _SelectiveReader(io.BytesIO(file_bytes), sheet_names)
+    reader.read()
+    reader.wb.skipped_sheets = reader.skipped
+    return reader.wb
+
+def _formula_sheets(formula):
+    """公式中參照到的工作表名稱"""
+    found = set()
+    try:
+        tokens = Tokenizer(formula).items
+    except Exception:
+        return found
+    for tok in tokens:
+        if tok.type == Token.OPERAND and tok.subtype == Token.RANGE and "!" in tok.value:
+            found.add(tok.value.rsplit("!", 1)[0].strip("'").replace("''", "'"))
+    return found
+
+def with_precedents(file_bytes, sheet_names):
+    """
+    加入 sheet_names 中公式 (含間接) 參照到的工作表，
+    例如日統計模板 B1 =DATEVALUE(RIGHT('DAY1'!$A4,5)) 需要 DAY1，否則公式只能改用快取值
+    只掃描 <f> 元素，不建立儲存格
+    """
+    with zipfile.ZipFile(io.BytesIO(file_bytes)) as zin:
+        members, _, _ = xml_patch_writer.read_package(zin)
+        required = set(sheet_names)
+        pending = [name for name in required if name in members]
+        while pending:
+            name = pending.pop()
+            with zin.open(members[name]) as fh:
+                for _, elem in ET.iterparse(fh):
+                    if elem.tag == FORMULA_TAG and elem.text:
+                        for ref in _formula_sheets("=" + elem.text) - required:
+                            if ref in members:
+                                required.add(ref)
+                                pending.append(ref)
+                    elif elem.tag.endswith("}row"):
+                        elem.clear()
+    return required
+
+def template_required_sheets(file_bytes, tasks=None):
+    """模板中流程會用到的工作表 (含公式的前置工作表)"""
+    names = template_sheet_names(file_bytes)
+    return with_precedents(file_bytes, required_sheets(names, tasks))
+
+def load_required(file_bytes, tasks=None):
+    """只解析流程會用到的工作表 (含公式的前置工作表)"""
+    return load_selected(file_bytes, template_required_sheets(file_bytes, tasks))
+
+def apply_edits(wb, edits):
+    """把 collect_edits() 的結果寫回完整解析的活頁簿 (局部修補失敗時的備援)；模板沒有的工作表 (例如新建的週月統計) 會新增"""
+    for title, rows in edits.items():
+        ws = wb[title] if title in wb.sheetnames else wb.create_sheet(title)
+        for row, cols in rows.items():
+            for col, value in cols.items():
+                # ws.cell(value=None) 不會清空格子，必須直接指定 .value
+                ws.cell(row=row, column=col).value = value
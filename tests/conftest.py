@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+# 專案的模組都放在根目錄 (沒有套件結構)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,81 @@
+# tests/test_daily_copy_task.py
+from datetime import date, datetime
+
+import openpyxl
+import pytest
+
+from daily_copy_task import copy_by_mapping_openpyxl, date_mapping, to_date
+
+
+@pytest.mark.parametrize("value, expected", [
+    (datetime(2025, 11, 25, 8, 30), date(2025, 11, 25)),
+    (date(2025, 11, 25), date(2025, 11, 25)),
+    ("2025/11/25", date(2025, 11, 25)),
+    (" 2025/1/5 ", date(2025, 1, 5)),
+    (45986, date(2025, 11, 25)),
+    (45986.75, date(2025, 11, 25)),
+])
+def test_to_date_accepts_dates_text_and_serials(value, expected):
+    assert to_date(value) == expected
+
+
+@pytest.mark.parametrize("value", [None, "", "11/25", "2025-13-01", "統計日期", True, 12, 99999])
+def test_to_date_rejects_other_values(value):
+    # 沒有年份的文字、布林值與超出日期範圍的數字都不是日期
+    assert to_date(value) is None
+
+
+def test_date_mapping_keeps_leftmost_column():
+    row = ["標題", datetime(2025, 1, 1), "2025/01/02", datetime(2025, 1, 1), None]
+    assert date_mapping(row) == {date(2025, 1, 1): 2, date(2025, 1, 2): 3}
+
+
+def _formula_date_workbook(cached_date):
+    """日統計模板!B1 是沒有年份的日期公式，快取值為上次存檔時的日期；日統計 有 11/24、11/25 兩欄"""
+    wb = openpyxl.Workbook()
+    tpl = wb.active
+    tpl.title = "日統計模板"
+    tpl["B1"] = "=DATEVALUE(RIGHT('DAY1'!$A4,5))"
+    tpl["B1"].number_format = "yyyy-mm-dd"
+    tpl["B2"] = 5
+    tpl["B3"] = 6
+    tpl.cached_values = {(1, 2): datetime.combine(cached_date, datetime.min.time())}
+    day = wb.create_sheet("DAY1")
+    day["A4"] = "2025/11/25"
+    day.cached_values = {}
+    dst = wb.create_sheet("日統計")
+    dst["B1"] = datetime(2025, 11, 24)
+    dst["C1"] = datetime(2025, 11, 25)
+    return wb
+
+TASKS = [{
+    "src_sheet": "日統計模板",
+    "dst_sheet": "日統計",
+    "src_key_cell": "A1",
+    "src_date_cell": "B1",
+    "src_value_range": "B2:B3",
+    "dst_key_cell": "A1",
+    "dst_date_row": 1,
+    "dst_value_start_offset_row": 1,
+    "dst_value_start_offset_col": 0,
+}]
+
+
+def test_force_date_wins_over_a_stale_cached_formula_date():
+    # Step 1 剛改寫 DAY1!A4，B1 的快取值 (11/24) 已過期，必須寫入目標日期 11/25
+    wb = _formula_date_workbook(date(2025, 11, 24))
+    dirty = {"DAY1": {(4, 1)}}
+    counts = {}
+    ok, _ = copy_by_mapping_openpyxl(wb, wb, TASKS, force_date=date(2025, 11, 25), dirty=dirty, counts=counts)
+    dst = wb["日統計"]
+    assert ok
+    assert counts["dates"] == [date(2025, 11, 25)]
+    assert (dst["B2"].value, dst["B3"].value) == (None, None)
+    assert (dst["C2"].value, dst["C3"].value) == (5, 6)
+
+
+def test_cached_formula_date_is_used_without_force_date():
+    wb = _formula_date_workbook(date(2025, 11, 24))
+    counts = {}
+    copy_by_mapping_openpyxl(wb, wb, TASKS, counts=counts)
+    assert counts["dates"] == [date(2025, 11, 24)]
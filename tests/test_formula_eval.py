@@ -0,0 +1,134 @@
+# tests/test_formula_eval.py
+from datetime import datetime
+
+import openpyxl
+import pytest
+
+from formula_eval import FormulaEvaluator
+
+
+@pytest.fixture
+def wb():
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "日統計模板"
+    day = wb.create_sheet("DAY1")
+    day["A4"] = "統計日期: 2025/11/25"
+    day["A5"] = "2025/11/26"
+    day["C10"] = 21
+    for ws_ in (ws, day):
+        ws_.cached_values = {}
+    return wb
+
+
+def _eval(wb, formula, cached=None, date_format=False):
+    ws = wb["日統計模板"]
+    ws["Z1"] = formula
+    if date_format:
+        ws["Z1"].number_format = "yyyy-mm-dd"
+    if cached is not None:
+        ws.cached_values[(1, 26)] = cached
+    ev = FormulaEvaluator(wb)
+    return ev.value(ws, 1, 26), ev
+
+
+@pytest.mark.parametrize("formula, expected", [
+    ("=1+2*3", 7),
+    ("=(1+2)*3", 9),
+    ("=-2^2", 4),
+    ("=10/4", 2.5),
+    ("=DAY1!C10*2", 42),
+    ("='DAY1'!$C$10+1", 22),
+    ('="a"&"b"', "ab"),
+    ("=SUM(DAY1!C9:C11,1)", 22),
+    ('=VALUE("1,234")', 1234),
+    ('=LEN(TRIM("  a  b "))', 3),
+])
+def test_arithmetic_text_and_references(wb, formula, expected):
+    value, ev = _eval(wb, formula)
+    assert value == expected
+    assert ev.stats["evaluated"] == 1
+
+
+def test_datevalue_with_year_on_date_cell_returns_datetime(wb):
+    value, _ = _eval(wb, "=DATEVALUE(DAY1!A5)", date_format=True)
+    assert value == datetime(2025, 11, 26)
+
+
+def test_datevalue_without_year_uses_cached_value_when_precedents_unchanged(wb):
+    # RIGHT(...,5) 只取出 "11/25"，年份不明時不自行推測
+    cached = datetime(2024, 11, 25)
+    value, ev = _eval(wb, "=DATEVALUE(RIGHT('DAY1'!$A4,5))", cached=cached, date_format=True)
+    assert value == cached
+    assert ev.stats["cached"] == 1
+
+
+def test_cached_value_is_stale_after_precedent_edit(wb):
+    ws = wb["日統計模板"]
+    ws["Z1"] = "=DATEVALUE(RIGHT('DAY1'!$A4,5))"
+    ws.cached_values[(1, 26)] = datetime(2025, 11, 24)
+    ev = FormulaEvaluator(wb, edited={"DAY1": {(4, 1)}})
+    assert ev.is_stale(ws, 1, 26)
+    assert ev.value(ws, 1, 26, fallback=False) is None
+    assert ev.value(ws, 1, 26) == "=DATEVALUE(RIGHT('DAY1'!$A4,5))"
+    assert ev.stats == {"evaluated": 0, "cached": 0, "failed": 0, "stale": 1}
+
+
+def test_staleness_follows_intermediate_formulas(wb):
+    ws = wb["日統計模板"]
+    ws["A1"] = "=NOSUCHFUNC(DAY1!C10)"
+    ws["A2"] = "=A1*2"
+    ws.cached_values[(2, 1)] = 8
+    assert FormulaEvaluator(wb, edited={"DAY1": {(10, 3)}}).value(ws, 2, 1) == "=A1*2"
+    # 改寫的是其他格時，快取值仍然有效
+    assert FormulaEvaluator(wb, edited={"DAY1": {(11, 3)}}).value(ws, 2, 1) == 8
+
+
+def test_failure_without_cache_returns_formula_text(wb):
+    value, ev = _eval(wb, "=NOSUCHFUNC(1)")
+    assert value == "=NOSUCHFUNC(1)"
+    assert ev.stats["failed"] == 1
+
+
+@pytest.mark.parametrize("formula, expected", [
+    ('=IF(DAY1!B1=0,"zero",1/DAY1!B1)', "zero"),
+    ("=IF(1,2,1/0)", 2),
+    ("=IF(0,1/0,IF(TRUE,SUM(1,2),#N/A))", 3),
+    ("=IF(0,1)", False),
+])
+def test_if_only_evaluates_the_branch_taken(wb, formula, expected):
+    value, ev = _eval(wb, formula)
+    assert value == expected
+    assert ev.stats["failed"] == 0
+
+
+def test_thousands_separators_must_be_grouped(wb):
+    value, ev = _eval(wb, '=VALUE("1,2,3")')
+    assert ev.stats["failed"] == 1
+
+
+def test_circular_reference_falls_back_to_cache(wb):
+    ws = wb["日統計模板"]
+    ws["A1"] = "=B1+1"
+    ws["B1"] = "=A1+1"
+    ws.cached_values[(1, 1)] = 5
+    ev = FormulaEvaluator(wb)
+    assert ev.value(ws, 1, 1) == 5
+
+
+def test_reference_into_skipped_sheet_uses_cache(wb):
+    # 只解析部分工作表時，未載入的工作表不能當作空白格計算
+    wb.skipped_sheets = ["DAY1"]
+    value, ev = _eval(wb, "=DAY1!C10*2", cached=99)
+    assert value == 99
+    assert ev.stats == {"evaluated": 0, "cached": 1, "failed": 0, "stale": 0}
+
+
+def test_results_are_memoized_per_cell(wb):
+    ws = wb["日統計模板"]
+    ws["A1"] = "=DAY1!C10+1"
+    ws["A2"] = "=A1+A1"
+    ev = FormulaEvaluator(wb)
+    assert ev.value(ws, 2, 1) == 44
+    assert ev.value(ws, 1, 1) == 22
+    assert ev.stats["evaluated"] == 2
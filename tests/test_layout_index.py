@@ -0,0 +1,108 @@
+# tests/test_layout_index.py
+import openpyxl
+import pytest
+
+import layout_index
+import task_plan
+
+
+def _task(label, key_row, dst_key_row):
+    return {
+        "src_sheet": "來源",
+        "dst_sheet": "目的",
+        "src_key_label": label,
+        "src_key_cell": f"A{key_row}",
+        "src_date_cell": f"B{key_row}",
+        "src_value_range": f"B{key_row + 1}:B{key_row + 3}",
+        "dst_key_cell": f"A{dst_key_row}",
+        "dst_date_row": dst_key_row + 1,
+        "dst_value_start_offset_row": 1,
+        "dst_value_start_offset_col": 0,
+    }
+
+TASKS = [_task("新裝申請數(ALL)", 1, 1), _task("退租申請數(ALL)", 6, 10)]
+
+
+def _sheets(labels):
+    """labels: {列: 標籤}，回傳 (來源工作表 dict, 目的工作表 dict)"""
+    wb = openpyxl.Workbook()
+    src = wb.active
+    src.title = "來源"
+    for row, label in labels.items():
+        src.cell(row=row, column=1, value=label)
+    dst = wb.create_sheet("目的")
+    return {"來源": src}, {"目的": dst}
+
+
+def test_labels_at_configured_rows_keep_plan():
+    plan = task_plan.compile_tasks(TASKS)
+    src, dst = _sheets({1: "新裝申請數(ALL)", 6: "退租申請數(ALL)"})
+    resolved, logs = layout_index.resolve_plan(plan, src, dst)
+    assert resolved.tasks == plan.tasks
+    assert logs == []
+
+
+def test_inserted_rows_move_the_whole_block():
+    plan = task_plan.compile_tasks(TASKS)
+    src, dst = _sheets({1: "新裝申請數(ALL)", 8: "退租申請數(ALL)"})
+    resolved, logs = layout_index.resolve_plan(plan, src, dst)
+    moved = resolved.tasks[1]
+    assert (moved.src_key_row, moved.src_date_row, moved.src_min_row, moved.src_max_row) == (8, 8, 9, 11)
+    # 目的側沒有設定標籤，不移動
+    assert moved.dst_date_row == plan.tasks[1].dst_date_row
+    assert resolved.tasks[0] == plan.tasks[0]
+    assert len(logs) == 1 and "第 6 列移到第 8 列" in logs[0]
+
+
+def test_labels_match_ignoring_spacing_and_width():
+    plan = task_plan.compile_tasks(TASKS)
+    src, dst = _sheets({1: " 新裝申請數（ALL） ", 6: "退租申請數(ALL)"})
+    resolved, _ = layout_index.resolve_plan(plan, src, dst)
+    assert resolved.tasks[0].src_key_row == 1
+
+
+def test_missing_label_raises():
+    plan = task_plan.compile_tasks(TASKS)
+    src, dst = _sheets({1: "新裝申請數(ALL)", 6: "退租竣工數(ALL)"})
+    with pytest.raises(ValueError, match="找不到標籤"):
+        layout_index.resolve_plan(plan, src, dst)
+
+
+def test_duplicate_label_raises():
+    plan = task_plan.compile_tasks(TASKS)
+    src, dst = _sheets({1: "新裝申請數(ALL)", 6: "退租申請數(ALL)", 20: "退租申請數(ALL)"})
+    with pytest.raises(ValueError, match="多列"):
+        layout_index.resolve_plan(plan, src, dst)
+
+
+def test_two_tasks_on_the_same_block_raise():
+    tasks = [TASKS[0], dict(TASKS[1], src_key_label="新裝申請數(ALL)")]
+    plan = task_plan.compile_tasks(tasks)
+    src, dst = _sheets({1: "新裝申請數(ALL)", 6: "退租申請數(ALL)"})
+    with pytest.raises(ValueError, match="同一個區塊"):
+        layout_index.resolve_plan(plan, src, dst)
+
+
+
+def test_mismatched_destination_label_is_reported():
+    plan = task_plan.compile_tasks(TASKS)
+    src, dst = _sheets({1: "新裝申請數(ALL)", 6: "退租申請數(ALL)"})
+    dst["目的"]["A1"] = "新裝申請數（ALL）"
+    dst["目的"]["A10"] = "新裝竣工數(ALL)"
+    dst["目的"]["A12"] = "退租申請數(ALL)"
+    resolved, logs = layout_index.resolve_plan(plan, src, dst)
+    # 目的區塊不移動，只提示標籤不同的任務
+    assert resolved.tasks == plan.tasks
+    assert len(logs) == 1
+    assert "Task 2" in logs[0] and "第 10 列的標籤是 '新裝竣工數(ALL)'" in logs[0]
+    assert "'退租申請數(ALL)' 位於第 12 列" in logs[0]
+
+
+def test_configured_destination_label_moves_the_block():
+    tasks = [TASKS[0], dict(TASKS[1], dst_key_label="退租申請數(ALL)")]
+    plan = task_plan.compile_tasks(tasks)
+    src, dst = _sheets({1: "新裝申請數(ALL)", 6: "退租申請數(ALL)"})
+    dst["目的"]["A12"] = "退租申請數(ALL)"
+    resolved, logs = layout_index.resolve_plan(plan, src, dst)
+    assert (resolved.tasks[1].dst_key_row, resolved.tasks[1].dst_date_row) == (12, 13)
+    assert logs == ["📍 Task 2: '退租申請數(ALL)' 在目的工作表 '目的' 已由第 10 列移到第 12 列"]
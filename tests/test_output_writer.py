@@ -0,0 +1,49 @@
+# tests/test_output_writer.py
+import io
+import zipfile
+
+import openpyxl
+import pytest
+
+import output_writer
+
+
+def _workbook(rows):
+    wb = openpyxl.Workbook()
+    for r in range(rows):
+        wb.active.append([f"列{r}-{c}" for c in range(20)])
+    return wb
+
+
+@pytest.mark.parametrize("name, level", [("fast", 1), ("balanced", 6), ("smallest", 9), ("0", 0), (9, 9)])
+def test_compress_level(name, level):
+    assert output_writer.compress_level(name) == level
+
+
+@pytest.mark.parametrize("name", ["10", "-1", "fastest"])
+def test_invalid_compress_level(name):
+    with pytest.raises(ValueError):
+        output_writer.compress_level(name)
+
+
+def test_small_output_stays_in_memory():
+    buf = output_writer.new_buffer()
+    output_writer.save_workbook(_workbook(10), buf)
+    assert not output_writer.on_disk(buf)
+    assert "暫存至磁碟" not in output_writer.report_line(buf, 0.1, "balanced")
+
+
+def test_large_output_spools_to_disk_and_downloads_lazily():
+    buf = output_writer.new_buffer(threshold=1024)
+    output_writer.save_workbook(_workbook(200), buf, compression="fast")
+    assert output_writer.on_disk(buf)
+    assert "暫存至磁碟" in output_writer.report_line(buf, 0.1, "fast")
+
+    size = output_writer.size_of(buf)
+    data = output_writer.download(buf)()
+    assert len(data) == size
+    # 下載函式可重複呼叫 (每次都從頭讀出)
+    assert output_writer.download(buf)() == data
+    assert zipfile.ZipFile(io.BytesIO(data)).testzip() is None
+    assert output_writer.read_bytes(buf) == data
+    assert buf.closed
@@ -0,0 +1,60 @@
+# tests/test_pipeline.py
+import io
+from datetime import date
+
+import openpyxl
+import pytest
+
+import benchmark
+import daily_single_1
+import pipeline
+
+TARGET = date(2025, 11, 25)
+
+
+@pytest.fixture(scope="module")
+def files():
+    """模板公式改為參照 Step 1 的目的工作表 (Step 2 的值取決於 Step 1 本次寫入的資料)"""
+    src_name, src_bytes = benchmark.make_source(120)
+    wb = openpyxl.load_workbook(io.BytesIO(benchmark.make_template(date_cols=366)))
+    target = f"'{daily_single_1.TARGET_SHEET}'!"
+    for name in ("日統計模板", "無上網日統計模板"):
+        for row in wb[name].iter_rows():
+            for cell in row:
+                if isinstance(cell.value, str) and cell.value.startswith("="):
+                    cell.value = cell.value.replace("'DAY1'!", target)
+    buf = io.BytesIO()
+    wb.save(buf)
+    return src_name, src_bytes, buf.getvalue()
+
+
+def _changed(before, after, sheets):
+    """兩個活頁簿在 sheets 中值不同的儲存格 {(工作表, row, col): 新值}"""
+    out = {}
+    for name in sheets:
+        a, b = before[name], after[name]
+        coords = set(a._cells) | set(b._cells)
+        for row, col in coords:
+            old = a._cells[(row, col)].value if (row, col) in a._cells else None
+            new = b._cells[(row, col)].value if (row, col) in b._cells else None
+            if old != new:
+                out[(name, row, col)] = new
+    return out
+
+
+def test_plan_matches_a_real_run(files):
+    src_name, src_bytes, tpl_bytes = files
+    ok, plan, _ = pipeline.plan_daily(src_bytes, src_name, tpl_bytes, TARGET)
+    assert ok
+    planned = {(sheet, row, col): new
+               for (sheet, _), items in plan.changes.items() for row, col, _, new in items}
+    step2 = {key: v for key, v in planned.items() if key[0] in ("日統計", "無上網日統計")}
+    # Step 2 的值來自 Step 1 剛寫入的資料 (不是模板原本的空白)
+    assert step2 and any(v not in (None, 0, "") for v in step2.values())
+
+    ok, data, _ = pipeline.run_daily(src_bytes, src_name, tpl_bytes, TARGET)
+    assert ok
+    before = openpyxl.load_workbook(io.BytesIO(tpl_bytes))
+    after = openpyxl.load_workbook(io.BytesIO(data))
+    sheets = sorted({sheet for sheet, _, _ in planned})
+    assert _changed(before, after, sheets) == planned
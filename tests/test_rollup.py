@@ -0,0 +1,179 @@
+# tests/test_rollup.py
+import io
+import random
+from datetime import date, datetime, timedelta
+
+import openpyxl
+import pytest
+
+import rollup
+import task_plan
+
+START = date(2025, 9, 20)
+DAYS = 60
+HEIGHT = 3
+
+
+def _task(label, key_row):
+    return {
+        "src_sheet": "來源",
+        "dst_sheet": "目的",
+        "src_key_label": label,
+        "src_key_cell": f"A{key_row}",
+        "src_date_cell": f"B{key_row}",
+        "src_value_range": f"B{key_row + 1}:B{key_row + HEIGHT}",
+        "dst_key_cell": f"A{key_row}",
+        "dst_date_row": key_row + 1,
+        "dst_value_start_offset_row": 1,
+        "dst_value_start_offset_col": 0,
+    }
+
+# 一個存量 (累計) 區塊、一個流量區塊
+TASKS = [_task("累計客戶數", 1), _task("新裝申請數", 10)]
+
+
+def _cell(day, key_row, offset):
+    """某日某區塊第 offset 列的儲存格 (列, 欄)"""
+    return key_row + 2 + offset, 2 + (day - START).days
+
+
+def _workbook(seed=0, last_day=START + timedelta(days=DAYS - 1)):
+    rnd = random.Random(seed)
+    wb = openpyxl.Workbook()
+    src = wb.active
+    src.title = "來源"
+    dst = wb.create_sheet("目的")
+    for t in TASKS:
+        key_row = int(t["src_key_cell"][1:])
+        src.cell(row=key_row, column=1).value = t["src_key_label"]
+        dst.cell(row=key_row, column=1).value = t["src_key_label"]
+        for k in range(DAYS):
+            day = START + timedelta(days=k)
+            dst.cell(row=key_row + 1, column=2 + k).value = datetime.combine(day, datetime.min.time())
+            if day > last_day:
+                continue
+            for offset in range(HEIGHT):
+                row, col = _cell(day, key_row, offset)
+                dst.cell(row=row, column=col).value = rnd.randint(0, 50)
+    return wb
+
+def _copy(wb):
+    buf = io.BytesIO()
+    wb.save(buf)
+    return openpyxl.load_workbook(io.BytesIO(buf.getvalue()))
+
+def _values(wb):
+    ws = wb[rollup.ROLLUP_SHEET]
+    return {(c.row, c.column): c.value for row in ws.iter_rows() for c in row if c.value is not None}
+
+def _edit(wb, day, value, tasks=TASKS):
+    ws = wb["目的"]
+    for t in tasks:
+        for offset in range(HEIGHT):
+            row, col = _cell(day, int(t["dst_key_cell"][1:]), offset)
+            ws.cell(row=row, column=col).value = value
+
+def _check(wb, days):
+    """wb 已有前一次的彙總結果；增量更新 days 的結果必須與全部重算相同"""
+    full = _copy(wb)
+    ok, msg = rollup.run_step(wb, days, tasks=TASKS)
+    assert ok, msg
+    assert "增量更新" in msg
+    ok, msg = rollup.run_step(full, None, tasks=TASKS)
+    assert ok, msg
+    assert _values(wb) == _values(full)
+    return wb
+
+
+@pytest.fixture
+def summarized():
+    wb = _workbook(last_day=START + timedelta(days=50))
+    ok, msg = rollup.run_step(wb, None, tasks=TASKS)
+    assert ok and "全部重算" in msg
+    return wb
+
+
+def test_full_run_sums_flows_and_keeps_last_stock_value():
+    wb = _workbook(last_day=START + timedelta(days=50))
+    rollup.run_step(wb, None, tasks=TASKS)
+    ws = wb[rollup.ROLLUP_SHEET]
+    dst = wb["目的"]
+    assert ws["A1"].value == rollup.MARKER
+
+    end = START + timedelta(days=50)
+    assert ws.cell(row=1, column=rollup.ROLLING_COL).value == rollup.rolling_label(end)
+    window = [end - timedelta(days=k) for k in range(rollup.ROLLING_DAYS)]
+    # 存量取期間最後一天；流量取加總
+    blocks = rollup.layout(task_plan.compile_tasks(TASKS))
+    stock = blocks[0]
+    row, col = _cell(end, 1, 0)
+    assert ws.cell(row=stock.header_row + 1, column=rollup.ROLLING_COL).value == dst.cell(row=row, column=col).value
+    flow = blocks[1]
+    expected = sum(dst.cell(*_cell(d, 10, 0)).value for d in window)
+    assert ws.cell(row=flow.header_row + 1, column=rollup.ROLLING_COL).value == expected
+
+
+def test_no_written_dates_skips(summarized):
+    before = _values(summarized)
+    ok, msg = rollup.run_step(summarized, [], tasks=TASKS)
+    assert ok and "略過" in msg
+    assert _values(summarized) == before
+
+
+def test_mid_month_edit(summarized):
+    day = START + timedelta(days=20)
+    _edit(summarized, day, 999)
+    _check(summarized, [day])
+
+
+def test_new_day_after_the_last_one(summarized):
+    day = START + timedelta(days=51)
+    _edit(summarized, day, 7)
+    _check(summarized, [day])
+
+
+def test_new_day_in_a_new_month(summarized):
+    days = [START + timedelta(days=k) for k in range(51, DAYS)]
+    for d in days:
+        _edit(summarized, d, 3)
+    _check(summarized, days)
+
+
+def test_clearing_the_latest_day_moves_the_window_back(summarized):
+    day = START + timedelta(days=50)
+    _edit(summarized, day, None)
+    _check(summarized, [day])
+    ws = summarized[rollup.ROLLUP_SHEET]
+    assert ws.cell(row=1, column=rollup.ROLLING_COL).value == rollup.rolling_label(day - timedelta(days=1))
+
+
+def test_clearing_the_whole_last_week(summarized):
+    days = [START + timedelta(days=k) for k in range(40, 51)]
+    for d in days:
+        _edit(summarized, d, None)
+    _check(summarized, days)
+
+
+def test_backfilling_an_old_day(summarized):
+    day = START + timedelta(days=2)
+    _edit(summarized, day, 123)
+    _check(summarized, [day])
+
+
+def test_clearing_everything(summarized):
+    days = [START + timedelta(days=k) for k in range(DAYS)]
+    for d in days:
+        _edit(summarized, d, None)
+    _check(summarized, days)
+    ws = summarized[rollup.ROLLUP_SHEET]
+    assert ws.cell(row=1, column=rollup.ROLLING_COL).value is None
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_edits_match_full_recompute(summarized, seed):
+    rnd = random.Random(seed)
+    for _ in range(4):
+        days = sorted({START + timedelta(days=rnd.randrange(DAYS)) for _ in range(rnd.randint(1, 4))})
+        for d in days:
+            _edit(summarized, d, rnd.choice([None, 0, rnd.randint(1, 99)]), tasks=rnd.sample(TASKS, 1))
+        _check(summarized, days)
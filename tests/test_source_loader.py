@@ -0,0 +1,63 @@
+# tests/test_source_loader.py
+import io
+
+import openpyxl
+import pytest
+
+import source_loader
+
+
+def _csv(rows, encoding="utf-8"):
+    return "\n".join(",".join(r) for r in rows).encode(encoding)
+
+
+def test_window_is_decoded_once(monkeypatch):
+    calls = []
+    original = source_loader.iter_csv_window
+
+    def counting(*args, **kwargs):
+        calls.append(kwargs.get("encoding"))
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(source_loader, "iter_csv_window", counting)
+    wb = source_loader.load_csv(_csv([["a", "b", "c"]] * 50, "big5"), max_row=10, max_col=2)
+    ws = wb.worksheets[0]
+    assert (ws.max_row, ws.max_column) == (10, 2)
+    rows = list(ws.iter_rows(min_row=1, max_row=12, min_col=1, max_col=2))
+    # 超出視窗的部分不讀取
+    assert rows == [("a", "b")] * 10
+    list(ws.iter_rows(min_row=2, max_row=3, min_col=2, max_col=2))
+    assert len(calls) == 1
+
+
+def test_short_csv_is_padded_to_the_window():
+    ws = source_loader.load_csv(_csv([["a", "b"]] * 2), max_row=10, max_col=3).worksheets[0]
+    rows = list(ws.iter_rows(min_row=1, max_row=4, min_col=1, max_col=3))
+    assert rows == [("a", "b", None), ("a", "b", None), (None, None, None), (None, None, None)]
+
+
+def test_encoding_is_retried_beyond_the_probe(monkeypatch):
+    # 開頭只有 ASCII (判斷為 utf-8)，視窗後段才出現 Big5 文字
+    monkeypatch.setattr(source_loader, "ENCODING_PROBE_BYTES", 16)
+    data = _csv([["1", "2"]] * 20 + [["台北", "3"]], "big5")
+    ws = source_loader.load_csv(data, max_row=30, max_col=2).worksheets[0]
+    assert ws.encoding == "utf-8-sig"
+    rows = list(ws.iter_rows(min_row=1, max_row=21, min_col=1, max_col=2))
+    assert ws.encoding == "big5"
+    assert rows[-1] == ("台北", "3")
+
+
+def test_undecodable_csv_raises():
+    ws = source_loader.load_csv(b"\xff\xff\xff\n", max_row=5, max_col=2).worksheets[0]
+    with pytest.raises(ValueError, match="無法以"):
+        list(ws.iter_rows(min_row=1, max_row=5, min_col=1, max_col=2))
+
+
+def test_short_xlsx_is_padded_to_the_window():
+    wb = openpyxl.Workbook()
+    wb.active.append([1, 2])
+    buf = io.BytesIO()
+    wb.save(buf)
+    ws = source_loader.load_source(io.BytesIO(buf.getvalue()), "a.xlsx").worksheets[0]
+    rows = list(ws.iter_rows(min_row=1, max_row=3, min_col=1, max_col=3))
+    assert rows == [(1, 2, None), (None, None, None), (None, None, None)]
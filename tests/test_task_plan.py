@@ -0,0 +1,75 @@
+# tests/test_task_plan.py
+import pytest
+
+import task_plan
+
+
+def _task(key_row, dst_sheet="目的", dst_date_row=None, src_col="B", col_offset=0):
+    return {
+        "src_sheet": "來源",
+        "dst_sheet": dst_sheet,
+        "src_key_cell": f"A{key_row}",
+        "src_date_cell": f"{src_col}{key_row}",
+        "src_value_range": f"{src_col}{key_row + 1}:{src_col}{key_row + 3}",
+        "dst_key_cell": f"A{key_row}",
+        "dst_date_row": dst_date_row if dst_date_row is not None else key_row + 1,
+        "dst_value_start_offset_row": 1,
+        "dst_value_start_offset_col": col_offset,
+    }
+
+
+def test_compiled_task_fields():
+    ct = task_plan.compile_tasks([dict(_task(5, dst_date_row=20, src_col="C", col_offset=2),
+                                       src_key_label="新裝申請數(ALL)")]).tasks[0]
+    assert ct.index == 0
+    assert (ct.src_date_row, ct.src_date_col) == (5, 3)
+    assert (ct.src_min_row, ct.src_max_row, ct.src_col) == (6, 8, 3)
+    assert (ct.dst_date_row, ct.dst_row_offset, ct.dst_col_offset) == (20, 1, 2)
+    assert (ct.src_key_row, ct.src_key_col, ct.dst_key_row, ct.dst_key_col) == (5, 1, 5, 1)
+    assert ct.src_key_label == "新裝申請數(ALL)" and ct.dst_key_label is None
+    assert task_plan.dst_rows(ct) == (21, 23)
+
+
+def test_groups_keep_task_order_by_destination_date_row():
+    # 兩個任務共用目的日期列 (欄位移不同)，第三個任務在另一個工作表
+    tasks = [_task(1, dst_date_row=2), _task(10, dst_sheet="其他"), _task(1, dst_date_row=2, src_col="C", col_offset=1)]
+    plan = task_plan.compile_tasks(tasks)
+    assert [ct.index for ct in plan.tasks] == [0, 1, 2]
+    assert [(key, [ct.index for ct in items]) for key, items in plan.groups] == [
+        (("目的", 2), [0, 2]),
+        (("其他", 11), [1]),
+    ]
+    assert plan.src_sheets == ("來源",)
+    assert plan.dst_sheets == ("目的", "其他")
+
+
+def test_plans_are_cached_by_definition_hash():
+    tasks = [_task(1), _task(10)]
+    plan = task_plan.compile_tasks(tasks)
+    assert task_plan.compile_tasks([dict(t) for t in tasks]) is plan
+    assert plan.version == task_plan.plan_hash(tasks)
+    assert task_plan.compile_tasks([_task(1), _task(20)]).version != plan.version
+
+
+def test_shift_moves_source_and_destination_independently():
+    ct = task_plan.compile_tasks([_task(5)]).tasks[0]
+    assert task_plan.shift(ct) is ct
+    moved = task_plan.shift(ct, src_rows=2, dst_rows=-1)
+    assert (moved.src_date_cell, moved.src_min_row, moved.src_max_row, moved.src_key_row) == ("B7", 8, 10, 7)
+    assert (moved.dst_date_row, moved.dst_key_row) == (5, 4)
+
+
+@pytest.mark.parametrize("tasks, message", [
+    ([dict(_task(1), src_value_range="B2:C4")], "必須是單一欄"),
+    ([_task(1, dst_date_row=0)], "超出工作表範圍"),
+    ([_task(1, dst_date_row=2), dict(_task(10), dst_value_start_offset_row=-7)], "寫入範圍重疊"),
+    ([_task(1, dst_date_row=2), _task(10, dst_date_row=4)], "蓋到 '目的' 的日期列 4"),
+    ([_task(1), dict(_task(3), dst_date_row=20)], "重疊的來源範圍"),
+])
+def test_invalid_plans_are_rejected(tasks, message):
+    with pytest.raises(ValueError, match=message):
+        task_plan.compile_tasks(tasks)
+
+
+def test_different_column_offsets_do_not_overlap():
+    task_plan.compile_tasks([_task(1, dst_date_row=2), _task(10, dst_date_row=2, src_col="C", col_offset=1)])
@@ -0,0 +1,57 @@
+# tests/test_template_loader.py
+import hashlib
+import inspect
+import io
+import zipfile
+
+import openpyxl
+from openpyxl.reader.excel import ExcelReader
+
+import template_loader
+
+# openpyxl 3.1.5 的 ExcelReader.read_worksheets 原始碼雜湊；不同時表示 _DualViewReader 的複製版本需要重新比對
+UPSTREAM_READ_WORKSHEETS = "005967c253472812"
+
+
+def test_openpyxl_matches_the_copied_reader():
+    assert openpyxl.__version__ == template_loader.OPENPYXL_VERSION
+    source = inspect.getsource(ExcelReader.read_worksheets)
+    assert hashlib.sha256(source.encode()).hexdigest()[:16] == UPSTREAM_READ_WORKSHEETS
+
+
+def _template():
+    """公式格帶有 Excel 的快取值 (openpyxl 存檔時不寫 <v>，因此直接改寫 XML)"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "日統計模板"
+    ws["A1"] = 3
+    ws["B1"] = "=A1*2"
+    wb.create_sheet("封存")["A1"] = 1
+    buf = io.BytesIO()
+    wb.save(buf)
+
+    src = zipfile.ZipFile(io.BytesIO(buf.getvalue()))
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w") as zout:
+        for item in src.infolist():
+            data = src.read(item)
+            if item.filename == "xl/worksheets/sheet1.xml":
+                data = data.replace(b"<f>A1*2</f><v />", b"<f>A1*2</f><v>6</v>")
+            zout.writestr(item, data)
+    return out.getvalue()
+
+
+def test_load_full_keeps_formulas_and_cached_values():
+    wb = template_loader.load_full(_template())
+    ws = wb["日統計模板"]
+    assert ws["B1"].value == "=A1*2"
+    assert ws.cached_values == {(1, 2): 6}
+    assert wb["封存"]["A1"].value == 1
+
+
+def test_load_selected_leaves_placeholders():
+    wb = template_loader.load_selected(_template(), ["日統計模板"])
+    assert wb.sheetnames == ["日統計模板", "封存"]
+    assert wb.skipped_sheets == ["封存"]
+    assert wb["封存"]["A1"].value is None
+    assert wb["日統計模板"].cached_values == {(1, 2): 6}
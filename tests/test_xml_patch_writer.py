@@ -0,0 +1,121 @@
+# tests/test_xml_patch_writer.py
+import io
+import re
+from datetime import date, datetime
+
+import openpyxl
+import pytest
+
+import xml_patch_writer
+from xml_patch_writer import PatchError, _StringTable, _StyleTable, patch_sheet
+
+NS = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+STYLES = (f'<styleSheet {NS}><numFmts count="1"><numFmt numFmtId="177" formatCode="m/d"/></numFmts>'
+          '<cellXfs count="3"><xf numFmtId="0" fontId="0"/><xf numFmtId="177" fontId="1"/>'
+          '<xf numFmtId="3" fontId="2" applyNumberFormat="1"/></cellXfs></styleSheet>').encode()
+
+
+def _sheet(rows_xml):
+    return (f'<?xml version="1.0" encoding="UTF-8"?><worksheet {NS}><dimension ref="A1:C3"/>'
+            f'<sheetData>{rows_xml}</sheetData><pageMargins left="0.7"/></worksheet>').encode()
+
+def _patch(sheet_xml, edits, existing_strings=0, styles=None):
+    out = io.BytesIO()
+    strings = _StringTable(existing_strings, enabled=True)
+    styles = styles or _StyleTable(STYLES)
+    patch_sheet(io.BytesIO(sheet_xml), out, edits, strings, styles)
+    return out.getvalue().decode(), strings, styles
+
+def _cells(xml, row):
+    m = re.search(rf'<row r="{row}"[^>]*>(.*?)</row>', xml)
+    return m.group(1) if m else None
+
+
+SHEET = _sheet('<row r="1" spans="1:3"><c r="A1" s="2"><v>1</v></c><c r="C1"><v>3</v></c></row>'
+               '<row r="3"><c r="A3" t="s"><v>0</v></c></row>')
+
+
+def test_untouched_rows_are_copied_verbatim():
+    xml, _, _ = _patch(SHEET, {1: {1: 10}})
+    assert '<row r="3"><c r="A3" t="s"><v>0</v></c></row>' in xml
+    assert xml.endswith('<pageMargins left="0.7"/></worksheet>')
+
+
+def test_existing_cell_keeps_style_and_new_cell_is_inserted_in_order():
+    xml, _, _ = _patch(SHEET, {1: {1: 10, 2: 2.5}})
+    assert _cells(xml, 1) == '<c r="A1" s="2"><v>10</v></c><c r="B1"><v>2.5</v></c><c r="C1"><v>3</v></c>'
+    # 新增儲存格後 spans 可能不正確，因此移除
+    assert "spans" not in xml
+
+
+def test_new_rows_are_inserted_between_and_after_existing_rows():
+    xml, _, _ = _patch(SHEET, {2: {1: 1}, 5: {2: True}})
+    rows = re.findall(r'<row r="(\d+)"', xml)
+    assert rows == ["1", "2", "3", "5"]
+    assert _cells(xml, 5) == '<c r="B5" t="b"><v>1</v></c>'
+    assert '<dimension ref="A1:C5"/>' in xml
+
+
+def test_none_clears_the_value_but_keeps_the_style():
+    xml, _, _ = _patch(SHEET, {1: {1: None}})
+    assert '<c r="A1" s="2"/>' in xml
+
+
+def test_strings_are_appended_to_the_shared_string_table():
+    xml, strings, _ = _patch(SHEET, {1: {2: "新", 3: "新"}}, existing_strings=4)
+    assert '<c r="B1" t="s"><v>4</v></c><c r="C1" t="s"><v>4</v></c>' in xml
+    assert strings.new_strings == {"新": 4} and strings.refs == 2
+
+
+def test_formulas_are_written_without_cached_value():
+    xml, _, _ = _patch(SHEET, {3: {2: "=A1+1"}})
+    assert '<c r="B3"><f>A1+1</f></c>' in xml
+
+
+def test_dates_get_a_date_format():
+    xml, _, styles = _patch(SHEET, {1: {1: datetime(2025, 11, 25, 12)}, 2: {1: date(2025, 11, 25)}})
+    # 原樣式 2 (千分位數字) 複製成日期格式的新樣式 3；沒有樣式的新格以樣式 0 為基礎
+    assert '<c r="A1" s="3"><v>45986.5</v></c>' in xml
+    assert '<c r="A2" s="4"><v>45986.0</v></c>' in xml
+    assert styles.new_fmts == {"yyyy-mm-dd h:mm:ss": 178, "yyyy-mm-dd": 179}
+    assert b'numFmtId="178" fontId="2" applyNumberFormat="1"' in styles.new_xfs[0]
+
+
+def test_dates_keep_an_existing_date_format():
+    sheet = _sheet('<row r="1"><c r="A1" s="1"><v>1</v></c></row>')
+    xml, _, styles = _patch(sheet, {1: {1: date(2025, 11, 25)}})
+    assert '<c r="A1" s="1"><v>45986.0</v></c>' in xml
+    assert styles.new_xfs == []
+
+
+def test_shared_formula_master_is_not_patched():
+    sheet = _sheet('<row r="1"><c r="A1"><f t="shared" ref="A1:A3" si="0">B1</f><v>1</v></c></row>')
+    with pytest.raises(PatchError):
+        _patch(sheet, {1: {1: 5}})
+
+
+def test_empty_sheet_data_is_expanded():
+    sheet = _sheet("").replace(b"<sheetData></sheetData>", b"<sheetData/>")
+    xml, _, _ = _patch(sheet, {2: {2: 7}})
+    assert '<sheetData><row r="2"><c r="B2"><v>7</v></c></row></sheetData>' in xml
+
+
+def test_write_patched_round_trip_adds_new_sheet():
+    wb = openpyxl.Workbook()
+    wb.active.title = "日統計"
+    wb.active["A1"] = "標籤"
+    buf = io.BytesIO()
+    wb.save(buf)
+
+    out = io.BytesIO()
+    edits = {"日統計": {2: {2: 5}}, "週月統計": {1: {1: "標記", 2: date(2025, 11, 25)}}}
+    info = xml_patch_writer.write_patched(io.BytesIO(buf.getvalue()), edits, out)
+    assert info["new_sheets"] == 1
+
+    result = openpyxl.load_workbook(io.BytesIO(out.getvalue()))
+    assert result.sheetnames == ["日統計", "週月統計"]
+    assert result["日統計"]["A1"].value == "標籤"
+    assert result["日統計"]["B2"].value == 5
+    assert result["週月統計"]["A1"].value == "標記"
+    assert result["週月統計"]["B1"].value == datetime(2025, 11, 25)
+    assert result["週月統計"]["B1"].number_format == "yyyy-mm-dd"
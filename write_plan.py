@@ -0,0 +1,104 @@
+# write_plan.py
+from collections import OrderedDict
+from datetime import datetime, date
+
+from openpyxl.utils import get_column_letter
+
+# 差異表格預設最多顯示的列數
+DEFAULT_TABLE_LIMIT = 500
+
+
+def _is_empty(v):
+    return v is None or v == ""
+
+def same_value(old, new):
+    """
+    值與型別都相同才視為未變動 (1 與 1.0、1 與 "1" 視為不同)
+    空字串與空白格 (None) 在 Excel 中看起來相同，視為未變動 (CSV 來源的空欄位為 "")
+    """
+    if _is_empty(old) and _is_empty(new):
+        return True
+    return old == new and type(old) is type(new)
+
+def _show(v):
+    if v is None:
+        return ""
+    if isinstance(v, datetime) and not (v.hour or v.minute or v.second):
+        return v.date().isoformat()
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    return str(v)
+
+
+class WritePlan:
+    """
+    試算模式 (dry-run)：記錄每個將寫入的儲存格 舊值 → 新值，不修改活頁簿
+    依 (工作表, 任務) 分組；合併儲存格的略過另外列出
+    """
+
+    def __init__(self):
+        self.changes = OrderedDict()    # (工作表, 任務) -> [(row, col, 舊值, 新值)]
+        self.skipped = OrderedDict()    # (工作表, 任務) -> [(row, col, 新值)]
+        self.unchanged = 0
+
+    def write(self, sheet, task, row, col, old, new):
+        """記錄一次寫入；值未變動時只計數，回傳是否有變動"""
+        if same_value(old, new):
+            self.unchanged += 1
+            return False
+        self.changes.setdefault((sheet, task), []).append((row, col, old, new))
+        return True
+
+    def skip(self, sheet, task, row, col, new):
+        """記錄因合併儲存格而略過的寫入"""
+        self.skipped.setdefault((sheet, task), []).append((row, col, new))
+
+    def apply(self, wb, dirty=None):
+        """
+        把目前記錄的變動寫入 wb (試算時讓後續步驟看到前一步的結果；wb 必須是不會存檔的工作副本)
+        dirty: 若提供 dict，會把寫入的 (row, col) 記錄到 dirty[工作表名稱]
+        """
+        for (sheet, _), items in self.changes.items():
+            ws = wb[sheet]
+            written = dirty.setdefault(sheet, set()) if dirty is not None else None
+            for row, col, _, new in items:
+                # ws.cell(value=None) 不會清空格子，必須直接指定 .value
+                ws.cell(row=row, column=col).value = new
+                if written is not None:
+                    written.add((row, col))
+
+    def change_count(self):
+        return sum(len(v) for v in self.changes.values())
+
+    def skip_count(self):
+        return sum(len(v) for v in self.skipped.values())
+
+    def summary(self):
+        """每組一列：[{"工作表", "任務", "變動格數", "合併略過"}]"""
+        keys = list(self.changes) + [k for k in self.skipped if k not in self.changes]
+        return [{"工作表": sheet, "任務": task,
+                 "變動格數": len(self.changes.get((sheet, task), ())),
+                 "合併略過": len(self.skipped.get((sheet, task), ()))}
+                for sheet, task in keys]
+
+    def table(self, limit=DEFAULT_TABLE_LIMIT):
+        """
+        逐格差異表：[{"工作表", "任務", "儲存格", "舊值", "新值", "備註"}]
+        值一律轉為文字 (混合型別的欄位才能直接顯示)；超過 limit 列時截斷
+        """
+        rows = []
+        for (sheet, task), items in self.skipped.items():
+            for row, col, new in items:
+                rows.append({"工作表": sheet, "任務": task, "儲存格": f"{get_column_letter(col)}{row}",
+                             "舊值": "", "新值": _show(new), "備註": "⚠️ 合併儲存格，略過"})
+        for (sheet, task), items in self.changes.items():
+            for row, col, old, new in items:
+                if len(rows) >= limit:
+                    return rows
+                rows.append({"工作表": sheet, "任務": task, "儲存格": f"{get_column_letter(col)}{row}",
+                             "舊值": _show(old), "新值": _show(new), "備註": ""})
+        return rows[:limit]
+
+    def summary_line(self):
+        return (f"🔍 試算結果：將變動 {self.change_count()} 格，未變動 {self.unchanged} 格，"
+                f"合併儲存格略過 {self.skip_count()} 格 (未寫入、未存檔)")
@@ -0,0 +1,633 @@
+# xml_patch_writer.py
+import io
+import re
+import shutil
+import tempfile
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+from datetime import datetime, date, time
+from xml.sax.saxutils import escape, quoteattr, unescape
+
+from openpyxl.styles import numbers
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.cell import coordinate_from_string, column_index_from_string, range_boundaries
+from openpyxl.utils.datetime import to_excel
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+REL_WORKSHEET = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"
+CT_WORKSHEET = "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"
+
+# 新增工作表 (例如第一次產生的週月統計) 的起始內容，儲存格由 patch_sheet 填入
+_EMPTY_SHEET = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                f'<worksheet xmlns="{NS_MAIN}" xmlns:r="{NS_REL}"><dimension ref="A1"/>'
+                f'<sheetData/></worksheet>').encode()
+
+# 串流讀取 zip 成員時的區塊大小
+CHUNK_SIZE = 1024 * 1024
+
+_ROW_RE = re.compile(rb"<row\b[^>]*?(?:/>|>.*?</row>)", re.S)
+_CELL_RE = re.compile(rb"<c\b[^>]*?(?:/>|>.*?</c>)", re.S)
+_ATTR_R_RE = re.compile(rb'\br="([^"]+)"')
+_ATTR_S_RE = re.compile(rb'\bs="(\d+)"')
+_SPANS_RE = re.compile(rb'\sspans="[^"]*"')
+_DIMENSION_RE = re.compile(rb'<dimension ref="([^"]+)"')
+_SHARED_MASTER_RE = re.compile(rb'<f\b(?=[^>]*\bt="(?:shared|array|dataTable)")(?=[^>]*\bref=")')
+_SI_RE = re.compile(rb"<si[\s>/]")
+_ILLEGAL_XML_RE = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+_NUM_FMT_RE = re.compile(rb"<numFmt\b[^>]*/>")
+_CELL_XFS_RE = re.compile(rb"<cellXfs\b[^>]*>(.*?)</cellXfs>", re.S)
+_XF_RE = re.compile(rb"<xf\b[^>]*?(?:/>|>.*?</xf>)", re.S)
+_SHEET_ID_RE = re.compile(rb'<sheet\b[^>]*\bsheetId="(\d+)"')
+_REL_ID_RE = re.compile(rb'<Relationship\b[^>]*\bId="([^"]+)"')
+
+
+class PatchError(Exception):
+    """模板結構不適合局部修補 (呼叫端應改用 openpyxl 完整存檔)"""
+
+
+def collect_edits(wb, dirty):
+    """
+    依 dirty ({工作表名稱: {(row, col), ...}}) 從活頁簿取出要寫入的值
+    回傳 {工作表名稱: {row: {col: value}}}
+    """
+    edits = {}
+    for title, cells in dirty.items():
+        if not cells:
+            continue
+        existing = wb[title]._cells
+        rows = edits.setdefault(title, {})
+        for row, col in cells:
+            cell = existing.get((row, col))
+            rows.setdefault(row, {})[col] = cell.value if cell is not None else None
+    return edits
+
+
+# -----------------
+# 套件結構 (workbook.xml / rels)
+# -----------------
+def _resolve_target(base_dir, target):
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join(base_dir, target))
+
+def _workbook_parts(zin):
+    """回傳 ({關聯 Id: 成員路徑}, {關聯類型 (例如 "styles"): 成員路徑})"""
+    rels_root = ET.fromstring(zin.read("xl/_rels/workbook.xml.rels"))
+    targets = {}
+    parts = {}
+    for rel in rels_root.iter(f"{{{NS_PKG_REL}}}Relationship"):
+        path = _resolve_target("xl", rel.get("Target"))
+        targets[rel.get("Id")] = path
+        parts.setdefault(rel.get("Type", "").rsplit("/", 1)[-1], path)
+    return targets, parts
+
+def read_package(zin):
+    """回傳 ({工作表名稱: 成員路徑}, sharedStrings 路徑或 None, calcChain 路徑或 None)"""
+    targets, parts = _workbook_parts(zin)
+    shared_strings = parts.get("sharedStrings")
+    calc_chain = parts.get("calcChain")
+
+    wb_root = ET.fromstring(zin.read("xl/workbook.xml"))
+    sheets = {}
+    for sheet in wb_root.iter(f"{{{NS_MAIN}}}sheet"):
+        rid = sheet.get(f"{{{NS_REL}}}id")
+        if rid in targets:
+            sheets[sheet.get("name")] = targets[rid]
+    return sheets, shared_strings, calc_chain
+
+
+# -----------------
+# 儲存格 XML
+# -----------------
+class _StringTable:
+    """新增的共用字串 (接在既有 sharedStrings 之後)；沒有 sharedStrings 時改用 inline string"""
+
+    def __init__(self, existing_count, enabled):
+        self.existing_count = existing_count
+        self.enabled = enabled
+        self.new_strings = {}
+        self.refs = 0
+
+    def index(self, text):
+        self.refs += 1
+        if text not in self.new_strings:
+            self.new_strings[text] = self.existing_count + len(self.new_strings)
+        return self.new_strings[text]
+
+def _date_format(value):
+    """日期型別對應的數字格式 (與 openpyxl 指定日期值時相同；datetime 是 date 的子類別，須先判斷)"""
+    if isinstance(value, datetime):
+        return numbers.FORMAT_DATE_DATETIME
+    if isinstance(value, date):
+        return numbers.FORMAT_DATE_YYYYMMDD2
+    return numbers.FORMAT_DATE_TIME6
+
+def _set_attr(tag, name, value):
+    """設定 XML 開頭標籤的屬性 (bytes)"""
+    pattern = rb"\s" + name + rb'="[^"]*"'
+    new = b" " + name + b'="' + value + b'"'
+    if re.search(pattern, tag):
+        return re.sub(pattern, lambda _: new, tag, count=1)
+    end = re.match(rb"<[\w:]+", tag).end()
+    return tag[:end] + new + tag[end:]
+
+class _StyleTable:
+    """
+    寫入日期值時使用的儲存格樣式：原樣式的數字格式不是日期格式時，複製一份 <xf> 改用日期格式
+    (與 openpyxl 指定日期值時自動設定 number_format 相同)，新樣式接在 cellXfs 之後
+    """
+
+    def __init__(self, styles_xml):
+        self.enabled = styles_xml is not None
+        self.num_fmts = {}
+        self.xfs = []
+        if self.enabled:
+            for tag in _NUM_FMT_RE.findall(styles_xml):
+                fmt_id = re.search(rb'numFmtId="(\d+)"', tag)
+                code = re.search(rb'formatCode="([^"]*)"', tag)
+                if fmt_id and code:
+                    self.num_fmts[int(fmt_id.group(1))] = unescape(code.group(1).decode("utf-8"), {"&quot;": '"'})
+            m = _CELL_XFS_RE.search(styles_xml)
+            self.xfs = _XF_RE.findall(m.group(1)) if m else []
+        self.new_fmts = {}     # {格式字串: numFmtId}
+        self.new_xfs = []
+        self._memo = {}
+
+    def _format_code(self, fmt_id):
+        return self.num_fmts.get(fmt_id) or numbers.BUILTIN_FORMATS.get(fmt_id, "General")
+
+    def _format_id(self, code):
+        if code in numbers.BUILTIN_FORMATS_REVERSE:
+            return numbers.BUILTIN_FORMATS_REVERSE[code]
+        for fmt_id, existing in self.num_fmts.items():
+            if existing == code:
+                return fmt_id
+        if code not in self.new_fmts:
+            used = list(self.num_fmts) + list(self.new_fmts.values())
+            self.new_fmts[code] = max(used + [163]) + 1
+        return self.new_fmts[code]
+
+    def date_style(self, style, value):
+        """回傳寫入日期值時使用的樣式索引 (bytes)"""
+        index = int(style) if style else 0
+        code = _date_format(value)
+        key = (index, code)
+        if key not in self._memo:
+            if not self.enabled or index >= len(self.xfs):
+                raise PatchError("模板的樣式表 (styles.xml) 不完整，無法寫入日期格式")
+            xf = self.xfs[index]
+            open_end = xf.index(b">") + 1
+            tag, rest = xf[:open_end], xf[open_end:]
+            fmt_m = re.search(rb'numFmtId="(\d+)"', tag)
+            if numbers.is_date_format(self._format_code(int(fmt_m.group(1)) if fmt_m else 0)):
+                self._memo[key] = str(index).encode()
+            else:
+                close = b"/>" if tag.endswith(b"/>") else b">"
+                tag = _set_attr(tag[:-len(close)], b"numFmtId", str(self._format_id(code)).encode())
+                tag = _set_attr(tag, b"applyNumberFormat", b"1")
+                self.new_xfs.append(tag + close + rest)
+                self._memo[key] = str(len(self.xfs) + len(self.new_xfs) - 1).encode()
+        return self._memo[key]
+
+def _text_xml(text):
+    if _ILLEGAL_XML_RE.search(text):
+        raise PatchError("字串含有 XML 不允許的控制字元")
+    space = ' xml:space="preserve"' if text != text.strip() else ""
+    return f"<t{space}>{escape(text)}</t>"
+
+def _cell_xml(ref, style, value, strings, styles=None):
+    if isinstance(value, (datetime, date, time)):
+        if styles is None:
+            raise PatchError(f"{ref}: 沒有樣式表，無法寫入日期")
+        style = styles.date_style(style, value)
+    s = f' s="{style.decode()}"' if style else ""
+    if value is None:
+        return f'<c r="{ref}"{s}/>'
+    if isinstance(value, bool):
+        return f'<c r="{ref}"{s} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        if value != value or value in (float("inf"), float("-inf")):
+            raise PatchError(f"{ref}: 無法寫入非有限數值")
+        return f'<c r="{ref}"{s}><v>{value!r}</v></c>'
+    if isinstance(value, (datetime, date, time)):
+        return f'<c r="{ref}"{s}><v>{to_excel(value)!r}</v></c>'
+    if isinstance(value, str):
+        if value.startswith("=") and len(value) > 1:
+            if _ILLEGAL_XML_RE.search(value):
+                raise PatchError(f"{ref}: 公式含有 XML 不允許的控制字元")
+            return f'<c r="{ref}"{s}><f>{escape(value[1:])}</f></c>'
+        if strings.enabled:
+            _text_xml(value)
+            return f'<c r="{ref}"{s} t="s"><v>{strings.index(value)}</v></c>'
+        return f'<c r="{ref}"{s} t="inlineStr"><is>{_text_xml(value)}</is></c>'
+    raise PatchError(f"{ref}: 不支援的值型別 {type(value).__name__}")
+
+
+# -----------------
+# 工作表串流修補
+# -----------------
+def _patch_row(row_xml, row_idx, cell_edits, strings, styles=None):
+    if row_xml.endswith(b"/>"):
+        open_tag, body, close = row_xml[:-2] + b">", b"", b"</row>"
+    else:
+        end = row_xml.index(b">") + 1
+        open_tag, body, close = row_xml[:end], row_xml[end:-len(b"</row>")], b"</row>"
+
+    # spans 只是提示，新增儲存格後可能不正確，直接移除
+    open_tag = _SPANS_RE.sub(b"", open_tag)
+
+    cells = []
+    last = 0
+    for m in _CELL_RE.finditer(body):
+        cell = m.group(0)
+        ref_m = _ATTR_R_RE.search(cell[:cell.index(b">")])
+        if ref_m is None:
+            raise PatchError(f"第 {row_idx} 列有缺少座標的儲存格")
+        col = column_index_from_string(coordinate_from_string(ref_m.group(1).decode())[0])
+        cells.append((col, cell))
+        last = m.end()
+    tail = body[last:]   # 例如 extLst
+
+    pending = dict(cell_edits)
+    out = []
+    for col, cell in cells:
+        if col in pending:
+            if _SHARED_MASTER_RE.search(cell):
+                raise PatchError(f"第 {row_idx} 列第 {col} 欄是共用/陣列公式的起始格")
+            style_m = _ATTR_S_RE.search(cell[:cell.index(b">")])
+            ref = f"{get_column_letter(col)}{row_idx}"
+            cell = _cell_xml(ref, style_m.group(1) if style_m else None, pending.pop(col), strings,
+                             styles).encode("utf-8")
+        out.append((col, cell))
+
+    for col, value in pending.items():
+        ref = f"{get_column_letter(col)}{row_idx}"
+        out.append((col, _cell_xml(ref, None, value, strings, styles).encode("utf-8")))
+    out.sort(key=lambda x: x[0])
+
+    return open_tag + b"".join(c for _, c in out) + tail + close
+
+def _new_row(row_idx, cell_edits, strings, styles=None):
+    return _patch_row(f'<row r="{row_idx}"/>'.encode(), row_idx, cell_edits, strings, styles)
+
+def _patch_dimension(head, edits):
+    m = _DIMENSION_RE.search(head)
+    if m is None or not edits:
+        return head
+    min_row, max_row = min(edits), max(edits)
+    cols = [c for row in edits.values() for c in row]
+    min_col, max_col = min(cols), max(cols)
+    ref = m.group(1).decode()
+    try:
+        if ":" not in ref:
+            ref = f"{ref}:{ref}"
+        d_min_col, d_min_row, d_max_col, d_max_row = range_boundaries(ref)
+        min_col, min_row = min(min_col, d_min_col), min(min_row, d_min_row)
+        max_col, max_row = max(max_col, d_max_col), max(max_row, d_max_row)
+    except (TypeError, ValueError):
+        pass
+    new_ref = f"{get_column_letter(min_col)}{min_row}:{get_column_letter(max_col)}{max_row}"
+    return head[:m.start(1)] + new_ref.encode() + head[m.end(1):]
+
+def _iter_chunks(fp):
+    while True:
+        chunk = fp.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+def patch_sheet(src_fp, dst_fp, edits, strings, styles=None):
+    """
+    串流修補工作表 XML：未修改的 <row> 原樣輸出，只重寫有異動的列
+    edits: {row: {col: value}}
+    styles: _StyleTable (寫入日期值時需要)
+    """
+    chunks = _iter_chunks(src_fp)
+    pending_rows = sorted(edits)
+    buf = b""
+
+    # 1. <sheetData> 之前的部分 (同時修正 dimension)
+    while True:
+        start = buf.find(b"<sheetData")
+        if start != -1 and buf.find(b">", start) != -1:
+            break
+        chunk = next(chunks, None)
+        if chunk is None:
+            raise PatchError("找不到 <sheetData>")
+        buf += chunk
+
+    tag_end = buf.index(b">", start) + 1
+    head = _patch_dimension(buf[:start], edits)
+    if buf[tag_end - 2:tag_end] == b"/>":
+        # 空白工作表：<sheetData/> → 展開後寫入新列
+        dst_fp.write(head + b"<sheetData>")
+        for r in pending_rows:
+            dst_fp.write(_new_row(r, edits[r], strings, styles))
+        dst_fp.write(b"</sheetData>" + buf[tag_end:])
+        for chunk in chunks:
+            dst_fp.write(chunk)
+        return
+
+    dst_fp.write(head + buf[start:tag_end])
+    buf = buf[tag_end:]
+    pos = 0
+    prev_row = 0
+    p = 0
+
+    # 2. 逐列處理 <row>
+    eof = False
+    while True:
+        while pos < len(buf) and buf[pos:pos + 1].isspace():
+            pos += 1
+
+        # 緩衝區剩餘太短時先補資料，避免 </sheetData> 被切斷
+        if len(buf) - pos < len(b"</sheetData>") and not eof:
+            chunk = next(chunks, None)
+            if chunk is None:
+                eof = True
+            else:
+                buf = buf[pos:] + chunk
+                pos = 0
+            continue
+
+        if buf.startswith(b"</sheetData>", pos):
+            while p < len(pending_rows):
+                dst_fp.write(_new_row(pending_rows[p], edits[pending_rows[p]], strings, styles))
+                p += 1
+            dst_fp.write(buf[pos:])
+            break
+
+        m = _ROW_RE.match(buf, pos)
+        if m is None:
+            chunk = None if eof else next(chunks, None)
+            if chunk is None:
+                raise PatchError("工作表 XML 不完整或格式不支援")
+            buf = buf[pos:] + chunk
+            pos = 0
+            continue
+
+        row_xml = m.group(0)
+        open_end = row_xml.index(b">")
+        r_m = _ATTR_R_RE.search(row_xml[:open_end])
+        row_idx = int(r_m.group(1)) if r_m else prev_row + 1
+        prev_row = row_idx
+
+        # 插入位於此列之前、原本不存在的新列
+        while p < len(pending_rows) and pending_rows[p] < row_idx:
+            dst_fp.write(_new_row(pending_rows[p], edits[pending_rows[p]], strings, styles))
+            p += 1
+
+        if p < len(pending_rows) and pending_rows[p] == row_idx:
+            dst_fp.write(_patch_row(row_xml, row_idx, edits[row_idx], strings, styles))
+            p += 1
+        else:
+            dst_fp.write(row_xml)
+        pos = m.end()
+
+    # 3. </sheetData> 之後的部分原樣輸出
+    for chunk in chunks:
+        dst_fp.write(chunk)
+
+
+# -----------------
+# sharedStrings / workbook / content types
+# -----------------
+def count_shared_strings(fp):
+    """串流計算既有 <si> 數量 (每段保留 4 位元組避免標籤被切斷)"""
+    count = 0
+    carry = b""
+    for chunk in _iter_chunks(fp):
+        data = carry + chunk
+        count += len(_SI_RE.findall(data))
+        # 保留的尾端不足以構成完整標籤，因此不會重複計算
+        carry = data[-3:]
+    return count
+
+def patch_shared_strings(src_fp, dst_fp, strings):
+    """在 </sst> 前附加新字串，並更新 count / uniqueCount"""
+    items = b"".join(f"<si>{_text_xml(text)}</si>".encode("utf-8") for text in strings.new_strings)
+    total = strings.existing_count + len(strings.new_strings)
+
+    buf = b""
+    head_done = False
+    for chunk in _iter_chunks(src_fp):
+        buf += chunk
+        if not head_done:
+            start = buf.find(b"<sst")
+            end = buf.find(b">", start) if start != -1 else -1
+            if end == -1:
+                continue
+            tag = buf[start:end]
+            tag = re.sub(rb'\suniqueCount="\d+"', f' uniqueCount="{total}"'.encode(), tag)
+            m = re.search(rb'\scount="(\d+)"', tag)
+            if m:
+                tag = tag[:m.start()] + f' count="{int(m.group(1)) + strings.refs}"'.encode() + tag[m.end():]
+            buf = buf[:start] + tag + buf[end:]
+            head_done = True
+        # 保留尾端以便最後插入 </sst>
+        if len(buf) > 64:
+            dst_fp.write(buf[:-64])
+            buf = buf[-64:]
+
+    idx = buf.rfind(b"</sst>")
+    if idx == -1:
+        raise PatchError("sharedStrings.xml 不完整")
+    dst_fp.write(buf[:idx] + items + buf[idx:])
+
+def _set_count(tag, count):
+    return _set_attr(tag, b"count", str(count).encode())
+
+def patch_styles(data, styles):
+    """附加 _StyleTable 新增的數字格式與 <xf>，並更新 count"""
+    if styles.new_fmts:
+        fmts = b"".join(f'<numFmt numFmtId="{fmt_id}" formatCode={quoteattr(code)}/>'.encode("utf-8")
+                        for code, fmt_id in styles.new_fmts.items())
+        total = len(styles.num_fmts) + len(styles.new_fmts)
+        m = re.search(rb"<numFmts\b[^>]*?(/?)>", data)
+        if m and m.group(1):
+            # 沒有自訂格式時 openpyxl 會寫出空的 <numFmts count="0"/>
+            tag = _set_count(m.group(0)[:-2].rstrip(), total) + b">"
+            data = data[:m.start()] + tag + fmts + b"</numFmts>" + data[m.end():]
+        elif m:
+            idx = data.index(b"</numFmts>")
+            tag = _set_count(m.group(0)[:-1], total) + b">"
+            data = data[:m.start()] + tag + data[m.end():idx] + fmts + data[idx:]
+        else:
+            # numFmts 必須是 styleSheet 的第一個子元素
+            m = re.search(rb"<styleSheet\b[^>]*>", data)
+            data = data[:m.end()] + f'<numFmts count="{total}">'.encode() + fmts + b"</numFmts>" + data[m.end():]
+    if styles.new_xfs:
+        m = re.search(rb"<cellXfs\b[^>]*>", data)
+        idx = data.index(b"</cellXfs>")
+        tag = _set_count(m.group(0)[:-1], len(styles.xfs) + len(styles.new_xfs)) + b">"
+        data = data[:m.start()] + tag + data[m.end():idx] + b"".join(styles.new_xfs) + data[idx:]
+    return data
+
+def _patch_workbook_xml(data):
+    """設定 fullCalcOnLoad，讓 Excel 開檔時重新計算公式"""
+    m = re.search(rb"<calcPr\b[^>]*?/?>", data)
+    if m:
+        tag = m.group(0)
+        if b"fullCalcOnLoad=" in tag:
+            tag = re.sub(rb'fullCalcOnLoad="[^"]*"', b'fullCalcOnLoad="1"', tag)
+        else:
+            tag = tag.replace(b"<calcPr", b'<calcPr fullCalcOnLoad="1"', 1)
+        return data[:m.start()] + tag + data[m.end():]
+    for anchor in (b"</definedNames>", b"</externalReferences>", b"</sheets>"):
+        idx = data.find(anchor)
+        if idx != -1:
+            idx += len(anchor)
+            return data[:idx] + b'<calcPr fullCalcOnLoad="1"/>' + data[idx:]
+    return data
+
+def _remove_calc_chain_refs(name, data, calc_chain):
+    """calcChain 可能指向已被覆寫成數值的公式格，因此移除讓 Excel 自行重建"""
+    if name == "[Content_Types].xml":
+        part = re.escape(("/" + calc_chain).encode())
+        return re.sub(rb'<Override\b[^>]*PartName="' + part + rb'"[^>]*/>', b"", data)
+    if name == "xl/_rels/workbook.xml.rels":
+        return re.sub(rb'<Relationship\b[^>]*Type="[^"]*/calcChain"[^>]*/>', b"", data)
+    return data
+
+
+def _add_sheet_parts(name, data, new_sheets):
+    """
+    在 workbook.xml / rels / [Content_Types].xml 登記新增的工作表
+    new_sheets: [(工作表名稱, 成員路徑, 關聯 Id)]
+    """
+    if name == "xl/workbook.xml":
+        next_id = max([int(i) for i in _SHEET_ID_RE.findall(data)] + [0]) + 1
+        items = b"".join(f'<sheet xmlns:r="{NS_REL}" name={quoteattr(title)} sheetId="{next_id + k}" '
+                         f'r:id="{rid}"/>'.encode("utf-8")
+                         for k, (title, _, rid) in enumerate(new_sheets))
+        anchor = b"</sheets>"
+    elif name == "xl/_rels/workbook.xml.rels":
+        items = b"".join(f'<Relationship Id="{rid}" Type="{REL_WORKSHEET}" '
+                         f'Target="/{path}"/>'.encode("utf-8") for _, path, rid in new_sheets)
+        anchor = b"</Relationships>"
+    else:
+        items = b"".join(f'<Override PartName="/{path}" ContentType="{CT_WORKSHEET}"/>'.encode("utf-8")
+                         for _, path, _ in new_sheets)
+        anchor = b"</Types>"
+    idx = data.rfind(anchor)
+    if idx == -1:
+        raise PatchError(f"{name} 格式不支援，無法新增工作表")
+    return data[:idx] + items + data[idx:]
+
+def _plan_new_sheets(zin, titles):
+    """替模板沒有的工作表配置成員路徑與關聯 Id"""
+    names = set(zin.namelist())
+    rel_ids = {rid.decode() for rid in _REL_ID_RE.findall(zin.read("xl/_rels/workbook.xml.rels"))}
+    new_sheets = []
+    n = rid = 1
+    for title in titles:
+        while f"xl/worksheets/sheet{n}.xml" in names:
+            n += 1
+        while f"rId{rid}" in rel_ids:
+            rid += 1
+        path = f"xl/worksheets/sheet{n}.xml"
+        names.add(path)
+        rel_ids.add(f"rId{rid}")
+        new_sheets.append((title, path, f"rId{rid}"))
+    return new_sheets
+
+
+# -----------------
+# zip 輸出
+# -----------------
+def write_patched(template_file, edits, out, compresslevel=None):
+    """
+    以模板原始檔為基礎輸出結果：
+    - 未修改的 zip 成員逐段解壓後寫入 (只使用 zipfile 的公開介面)
+    - 只串流重寫有異動的工作表 XML，並視需要附加 sharedStrings / 日期樣式
+    - 模板沒有的工作表 (例如第一次產生的週月統計) 會新增
+    edits: collect_edits() 的結果
+    out: 可寫入的二進位檔案物件
+    compresslevel: zip 成員使用的 deflate 等級 (None 為預設)
+    """
+    with zipfile.ZipFile(template_file) as zin:
+        sheets, shared_strings, calc_chain = read_package(zin)
+        _, parts = _workbook_parts(zin)
+        styles_part = parts.get("styles")
+
+        new_sheets = _plan_new_sheets(zin, [title for title, rows in edits.items()
+                                            if rows and title not in sheets])
+        sheet_edits = {sheets[title]: rows for title, rows in edits.items() if rows and title in sheets}
+
+        if shared_strings:
+            with zin.open(shared_strings) as fp:
+                strings = _StringTable(count_shared_strings(fp), enabled=True)
+        else:
+            strings = _StringTable(0, enabled=False)
+        styles = _StyleTable(zin.read(styles_part) if styles_part else None)
+
+        # 先修補工作表，才知道需要新增哪些共用字串與樣式
+        patched = {}
+        for name, rows in sheet_edits.items():
+            tmp = _SpooledBuffer()
+            with zin.open(name) as src:
+                patch_sheet(src, tmp, rows, strings, styles)
+            patched[name] = tmp
+        for title, path, _ in new_sheets:
+            tmp = _SpooledBuffer()
+            patch_sheet(io.BytesIO(_EMPTY_SHEET), tmp, edits[title], strings, styles)
+            patched[path] = tmp
+
+        registry = ("xl/workbook.xml", "xl/_rels/workbook.xml.rels", "[Content_Types].xml")
+        with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED, compresslevel=compresslevel) as zout:
+            for info in zin.infolist():
+                name = info.filename
+                if calc_chain and name == calc_chain:
+                    continue
+
+                if name in patched:
+                    with zout.open(name, "w") as dst:
+                        patched.pop(name).copy_to(dst)
+                elif name == shared_strings and strings.new_strings:
+                    with zin.open(name) as src, zout.open(name, "w") as dst:
+                        patch_shared_strings(src, dst, strings)
+                elif name == styles_part and (styles.new_xfs or styles.new_fmts):
+                    zout.writestr(name, patch_styles(zin.read(name), styles))
+                elif name in registry:
+                    data = zin.read(name)
+                    if name == "xl/workbook.xml":
+                        data = _patch_workbook_xml(data)
+                    elif calc_chain:
+                        data = _remove_calc_chain_refs(name, data, calc_chain)
+                    if new_sheets:
+                        data = _add_sheet_parts(name, data, new_sheets)
+                    zout.writestr(name, data)
+                else:
+                    with zin.open(name) as src, zout.open(name, "w") as dst:
+                        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+            # 新增的工作表接在最後
+            for name, tmp in patched.items():
+                with zout.open(name, "w") as dst:
+                    tmp.copy_to(dst)
+
+    return {"sheets": len(sheet_edits) + len(new_sheets), "new_sheets": len(new_sheets),
+            "new_strings": len(strings.new_strings)}
+
+
+class _SpooledBuffer:
+    """暫存修補後的工作表 XML，超過門檻時改寫入暫存檔"""
+
+    def __init__(self, max_size=16 * 1024 * 1024):
+        self._buf = tempfile.SpooledTemporaryFile(max_size=max_size)
+
+    def write(self, data):
+        self._buf.write(data)
+
+    def copy_to(self, dst):
+        """寫出內容後關閉暫存"""
+        self._buf.seek(0)
+        shutil.copyfileobj(self._buf, dst, CHUNK_SIZE)
+        self._buf.close()
+
+    def close(self):
+        self._buf.close()